@@ -1,30 +1,60 @@
 from __future__ import annotations
 from pathlib import Path
 import os
-import sys
 import json
+import hashlib
+import threading
+import time
 from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, ConfigDict
 
+from classify_engine import estimate_tokens, map_ordered
+from llm_resilience import call_with_failover, ProviderUnavailableError, LLM_TIMEOUT_SECONDS
+from llm_cache import get_llm_cache, cache_key
+
 load_dotenv(Path(__file__).parent.parent / ".env")
 
 # Support both Anthropic (Claude) and OpenAI backends
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "anthropic")  # "anthropic" or "openai"
 
-if LLM_PROVIDER == "anthropic":
-    import anthropic
-    if not os.getenv("ANTHROPIC_API_KEY"):
-        print("No ANTHROPIC_API_KEY")
-        sys.exit(1)
-    client = anthropic.Anthropic()
-else:
-    from openai import OpenAI
-    if not os.getenv("OPENAI_API_KEY"):
-        print("No OPENAI_API_KEY")
-        sys.exit(1)
-    client = OpenAI()
+API_KEY_ENV = {"anthropic": "ANTHROPIC_API_KEY", "openai": "OPENAI_API_KEY"}
+# On transient errors or an open circuit, retry on the other provider if its key is set
+LLM_FAILOVER = os.getenv("LLM_FAILOVER", "1") == "1"
+
+# The SDK is imported and the client built on first use, so commands that
+# never classify (pull, startup) don't pay for it or need an API key
+_clients = {}
+_client_lock = threading.Lock()
+
+
+def get_client(provider=None):
+    """Provider client, created on the first call and reused (with its connection pool) afterwards."""
+    provider = provider or LLM_PROVIDER
+    with _client_lock:
+        client = _clients.get(provider)
+        if client is None:
+            if not os.getenv(API_KEY_ENV[provider]):
+                raise ProviderUnavailableError(f"No {API_KEY_ENV[provider]}")
+            # llm_resilience does the retrying; the SDKs' own retries would multiply it
+            if provider == "anthropic":
+                import anthropic
+                client = anthropic.Anthropic(timeout=LLM_TIMEOUT_SECONDS, max_retries=0)
+            else:
+                from openai import OpenAI
+                client = OpenAI(timeout=LLM_TIMEOUT_SECONDS, max_retries=0)
+            _clients[provider] = client
+    return client
+
+
+def providers():
+    """Providers to try, primary first."""
+    order = [LLM_PROVIDER]
+    other = "openai" if LLM_PROVIDER == "anthropic" else "anthropic"
+    if LLM_FAILOVER and os.getenv(API_KEY_ENV[other]):
+        order.append(other)
+    return order
 
 Stage = Literal[
     "applied",
@@ -187,19 +217,51 @@ def sanitize_body_text(text: str) -> str:
     
     return text.strip()
 
-def build_prompt(from_: str, subject: str, company: str, received_utc: str, body: str) -> str:
-    body = sanitize_body_text(body)
-    return f"""
+SYSTEM_PROMPT = f"""
 You are an email triage classifier for job applications.
 
 Output must be a single JSON object that matches the provided JSON schema exactly:
 - Use only the schema fields.
 - Do not add any extra keys.
-- Use only the email metadata and body below.
+- Use only the email metadata and body in the user message.
 - Do not invent facts, deadlines, or times not present in the email.
 - next_action must be one of: reply, schedule, submit_materials, complete_assessment, sign_offer, follow_up, archive, ignore, escalate.
 - company: infer employer name from sender domain/signature/subject/body; if provided company looks reliable, keep it; if unsure, use empty string.
+- A "Thread context" section, when present, describes earlier messages of the same conversation. Classify the state
+  of the whole process as of this latest email; use the context only to interpret it, and let this email win on conflicts.
+
+## stage
+{STAGE_DESCRIPTION}
+
+## priority
+{PRIORITY_DESCRIPTION}
+
+## next_action
+{NEXT_ACTION_DESCRIPTION}
+
+## summary
+{SUMMARY_DESCRIPTION}
+""".strip()
+
+
+def _tool_schema() -> dict:
+    schema = LLMResult.model_json_schema()
+    # Remove pydantic metadata that Anthropic doesn't need
+    schema.pop("title", None)
+    schema.pop("$defs", None)
+    return schema
+
 
+# Built once: the schema and system prompt are identical for every email,
+# which is what lets the provider cache them as a prompt prefix
+TOOL_SCHEMA = _tool_schema()
+
+
+def build_prompt(from_: str, subject: str, company: str, received_utc: str, body: str, thread: str = "") -> str:
+    """Per-email part of the prompt; the instructions live in SYSTEM_PROMPT. thread is a thread_state digest."""
+    body = sanitize_body_text(body)
+    context = f"Thread context:\n{thread.strip()}\n\n" if thread and thread.strip() else ""
+    return context + f"""
 Email metadata:
 from: {from_}
 subject: {subject}
@@ -210,52 +272,405 @@ Email body:
 {body}
 """.strip()
 
-def _call_anthropic(prompt: str) -> dict:
-    """Call Claude API with tool_use for structured output."""
-    model = os.getenv("ANTHROPIC_MODEL", "claude-3-5-haiku-20241022")
 
-    # Define the schema as a tool so Claude returns structured JSON
-    tool_schema = LLMResult.model_json_schema()
-    # Remove pydantic metadata that Anthropic doesn't need
-    tool_schema.pop("title", None)
-    tool_schema.pop("$defs", None)
+def current_model(provider=None) -> str:
+    if (provider or LLM_PROVIDER) == "anthropic":
+        return os.getenv("ANTHROPIC_MODEL", "claude-3-5-haiku-20241022")
+    return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
-    response = client.messages.create(
-        model=model,
-        max_tokens=1024,
-        tools=[{
+
+# Changes whenever the prompt wording or the LLMResult schema changes,
+# which invalidates every cached classification
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + build_prompt("", "", "", "", "") + json.dumps(LLMResult.model_json_schema(), sort_keys=True)).encode("utf-8")
+).hexdigest()[:16]
+
+
+class UsageStats:
+    """
+    Token usage and latency of LLM calls, to show what prompt caching saves.
+
+    input_tokens counts uncached input only; cache_read_tokens and
+    cache_write_tokens are the cached-prefix tokens read or written.
+    With LLM_USAGE_LOG set, every call is also appended there as JSON.
+    """
+
+    FIELDS = ("calls", "input_tokens", "cache_read_tokens", "cache_write_tokens", "output_tokens",
+              "timed_calls", "latency_s")
+
+    def __init__(self, log_path=None):
+        self.lock = threading.Lock()
+        self.log_path = log_path
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+
+    def record(self, latency_s=None, input_tokens=0, output_tokens=0, cache_read_tokens=0, cache_write_tokens=0,
+               provider=None):
+        """latency_s is None for batch results, which have no per-request latency."""
+        entry = {
+            "calls": 1,
+            "input_tokens": input_tokens or 0,
+            "cache_read_tokens": cache_read_tokens or 0,
+            "cache_write_tokens": cache_write_tokens or 0,
+            "output_tokens": output_tokens or 0,
+            "timed_calls": 0 if latency_s is None else 1,
+            "latency_s": latency_s or 0.0,
+        }
+        with self.lock:
+            for k in self.FIELDS:
+                self.totals[k] += entry[k]
+            if self.log_path:
+                provider = provider or LLM_PROVIDER
+                entry.update(provider=provider, model=current_model(provider), ts=time.time())
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.totals)
+
+    @staticmethod
+    def summary(stats: dict) -> str:
+        prompt_tokens = stats["input_tokens"] + stats["cache_read_tokens"] + stats["cache_write_tokens"]
+        hit = stats["cache_read_tokens"] / prompt_tokens if prompt_tokens else 0.0
+        text = (f"{stats['calls']} call(s), {prompt_tokens} prompt tokens "
+                f"({stats['cache_read_tokens']} cache read = {hit:.0%}, {stats['cache_write_tokens']} cache write), "
+                f"{stats['output_tokens']} output tokens")
+        if stats["timed_calls"]:
+            text += f", {stats['latency_s'] / stats['timed_calls']:.2f}s avg latency"
+        return text
+
+
+usage = UsageStats(os.getenv("LLM_USAGE_LOG") or None)
+
+
+def record_anthropic_usage(u, latency_s=None):
+    if u is not None:
+        usage.record(latency_s, u.input_tokens, u.output_tokens,
+                     getattr(u, "cache_read_input_tokens", 0), getattr(u, "cache_creation_input_tokens", 0),
+                     provider="anthropic")
+
+
+def anthropic_params(prompt: str) -> dict:
+    """Messages API parameters for one classification; shared by direct and batch calls."""
+    return {
+        "model": current_model("anthropic"),
+        "max_tokens": 1024,
+        # Define the schema as a tool so Claude returns structured JSON
+        "tools": [{
             "name": "classify_email",
             "description": "Classify a job application email into structured fields.",
-            "input_schema": tool_schema,
+            "input_schema": TOOL_SCHEMA,
         }],
-        tool_choice={"type": "tool", "name": "classify_email"},
-        messages=[{"role": "user", "content": prompt}],
-    )
+        "tool_choice": {"type": "tool", "name": "classify_email"},
+        # Breakpoint after the static prefix: tools + system are cached together
+        "system": [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": prompt}],
+    }
 
-    # Extract tool use result
-    for block in response.content:
+
+def parse_anthropic_content(content) -> dict:
+    """Validate the classify_email tool_use block of a Claude response."""
+    for block in content:
         if block.type == "tool_use":
-            result = block.input
             # Validate with Pydantic
-            obj = LLMResult(**result)
-            return obj.model_dump()
-
+            return LLMResult(**block.input).model_dump()
     raise ValueError("Claude did not return tool_use output")
 
 
+def _call_anthropic(prompt: str) -> dict:
+    """Call Claude API with tool_use for structured output."""
+    start = time.monotonic()
+    response = get_client("anthropic").messages.create(**anthropic_params(prompt))
+    record_anthropic_usage(response.usage, time.monotonic() - start)
+    return parse_anthropic_content(response.content)
+
+
+def openai_batch_body(prompt: str) -> dict:
+    """Chat Completions body for one classification in an OpenAI batch file."""
+    return {
+        "model": current_model("openai"),
+        # Static system message first so OpenAI's automatic prefix cache applies
+        "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "JobApplicationEmailTriage", "schema": LLMResult.model_json_schema()},
+        },
+    }
+
+
+def record_openai_usage(u, latency_s=None):
+    """Responses (input/output_tokens) or Chat Completions (prompt/completion_tokens) usage."""
+    if u is None:
+        return
+    if isinstance(u, dict):
+        prompt_tokens = u.get("input_tokens", u.get("prompt_tokens", 0))
+        output_tokens = u.get("output_tokens", u.get("completion_tokens", 0))
+        details = u.get("input_tokens_details") or u.get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens", 0)
+    else:
+        prompt_tokens, output_tokens = u.input_tokens, u.output_tokens
+        cached = getattr(getattr(u, "input_tokens_details", None), "cached_tokens", 0) or 0
+    usage.record(latency_s, prompt_tokens - cached, output_tokens, cached, provider="openai")
+
+
 def _call_openai(prompt: str) -> dict:
     """Call OpenAI API with structured output."""
-    r = client.responses.parse(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+    start = time.monotonic()
+    r = get_client("openai").responses.parse(
+        model=current_model("openai"),
+        instructions=SYSTEM_PROMPT,
         input=prompt,
         text_format=LLMResult,
     )
+    record_openai_usage(r.usage, time.monotonic() - start)
     obj: LLMResult = r.output_parsed
     return obj.model_dump()
 
 
+_SINGLE_CALLS = {"anthropic": _call_anthropic, "openai": _call_openai}
+
+
+def _call_llm_answered(prompt: str) -> tuple:
+    """(provider that answered, result); after a failover that is not LLM_PROVIDER."""
+    # Rate limits, retries, hedging and failover are shared across worker threads
+    return call_with_failover(
+        [(p, lambda p=p: (p, _SINGLE_CALLS[p](prompt))) for p in providers()],
+        estimate_tokens(prompt),
+    )
+
+
 def call_llm_structured(prompt: str) -> dict:
-    if LLM_PROVIDER == "anthropic":
-        return _call_anthropic(prompt)
-    else:
-        return _call_openai(prompt)
+    return _call_llm_answered(prompt)[1]
+
+
+# --- Several emails per request ---
+
+# classify_rows default: pack several emails into each request
+LLM_MULTI_EMAIL = os.getenv("LLM_MULTI_EMAIL", "0") == "1"
+# Emails per multi-email request, and the estimated input-token budget for
+# their combined per-email prompts
+MULTI_MAX_ITEMS = int(os.getenv("LLM_MULTI_MAX_ITEMS", "8"))
+MULTI_TOKEN_BUDGET = int(os.getenv("LLM_MULTI_TOKEN_BUDGET", "6000"))
+MULTI_OUTPUT_TOKENS_PER_ITEM = 300
+
+MULTI_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+The user message contains several emails, each starting with a line "### Email <index>".
+Classify every email independently; never let one email's content influence another's result.
+Return exactly one item per email in "results", with "index" set to that email's index.
+""".rstrip()
+
+
+class IndexedLLMResult(LLMResult):
+    index: int = Field(description="Index of the email this result belongs to, from its '### Email <index>' heading.")
+
+
+class LLMResultList(BaseModel):
+    results: list[IndexedLLMResult]
+
+
+MULTI_TOOL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                **TOOL_SCHEMA,
+                "properties": {
+                    "index": IndexedLLMResult.model_json_schema()["properties"]["index"],
+                    **TOOL_SCHEMA["properties"],
+                },
+                "required": ["index"] + TOOL_SCHEMA.get("required", []),
+            },
+        },
+    },
+    "required": ["results"],
+}
+
+
+def build_multi_prompt(prompts: list) -> str:
+    return "\n\n".join(f"### Email {i}\n{prompt}" for i, prompt in enumerate(prompts))
+
+
+def plan_multi_groups(prompts: list, budget: int = None, max_items: int = None) -> list:
+    """Split prompt indexes into consecutive groups that fit the token budget and item cap."""
+    budget = budget or MULTI_TOKEN_BUDGET
+    max_items = max_items or MULTI_MAX_ITEMS
+    groups, current, used = [], [], 0
+    for i, prompt in enumerate(prompts):
+        tokens = estimate_tokens(prompt)
+        if current and (used + tokens > budget or len(current) >= max_items):
+            groups.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _call_anthropic_multi(prompt: str, count: int) -> list:
+    start = time.monotonic()
+    response = get_client("anthropic").messages.create(
+        model=current_model("anthropic"),
+        max_tokens=min(8192, 256 + MULTI_OUTPUT_TOKENS_PER_ITEM * count),
+        tools=[{
+            "name": "classify_emails",
+            "description": "Classify each job application email in the message into structured fields.",
+            "input_schema": MULTI_TOOL_SCHEMA,
+        }],
+        tool_choice={"type": "tool", "name": "classify_emails"},
+        system=[{"type": "text", "text": MULTI_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}],
+        messages=[{"role": "user", "content": prompt}],
+    )
+    record_anthropic_usage(response.usage, time.monotonic() - start)
+    for block in response.content:
+        if block.type == "tool_use":
+            return list(block.input.get("results") or [])
+    raise ValueError("Claude did not return tool_use output")
+
+
+def _call_openai_multi(prompt: str, count: int) -> list:
+    start = time.monotonic()
+    r = get_client("openai").responses.parse(
+        model=current_model("openai"),
+        instructions=MULTI_SYSTEM_PROMPT,
+        input=prompt,
+        text_format=LLMResultList,
+    )
+    record_openai_usage(r.usage, time.monotonic() - start)
+    return [item.model_dump() for item in r.output_parsed.results]
+
+
+def _call_llm_multi_answered(prompts: list) -> list:
+    """call_llm_structured_multi, with each entry as (provider that answered, result or Exception)."""
+    if len(prompts) == 1:
+        try:
+            return [_call_llm_answered(prompts[0])]
+        except Exception as e:
+            return [(None, e)]
+
+    prompt = build_multi_prompt(prompts)
+    calls = {"anthropic": _call_anthropic_multi, "openai": _call_openai_multi}
+    try:
+        provider, items = call_with_failover(
+            [(p, lambda p=p: (p, calls[p](prompt, len(prompts)))) for p in providers()],
+            estimate_tokens(prompt),
+        )
+    except Exception as e:
+        print(f"  [LLM] multi-email call failed ({e}); falling back to single calls")
+        provider, items = None, []
+
+    out = [None] * len(prompts)
+    for item in items:
+        index = item.pop("index", None) if isinstance(item, dict) else None
+        if not isinstance(index, int) or not 0 <= index < len(prompts) or out[index] is not None:
+            continue
+        try:
+            out[index] = (provider, LLMResult(**item).model_dump())
+        except Exception:
+            pass
+
+    for i, answered in enumerate(out):
+        if answered is None:
+            try:
+                out[i] = _call_llm_answered(prompts[i])
+            except Exception as e:
+                out[i] = (None, e)
+    return out
+
+
+def call_llm_structured_multi(prompts: list) -> list:
+    """
+    Classify several per-email prompts in one request.
+
+    Returns one entry per prompt, in order: the validated result dict, or
+    the Exception if it could not be classified. Items that are missing or
+    fail validation are retried as single-email calls.
+    """
+    return [result for _, result in _call_llm_multi_answered(prompts)]
+
+
+# Cache keys currently being classified, so concurrent duplicates wait for one call
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def email_cache_key(from_: str, subject: str, company: str, received_utc: str, body: str, thread: str = "",
+                    provider: str = None) -> str:
+    provider = provider or LLM_PROVIDER
+    return cache_key(PROMPT_VERSION, provider, current_model(provider), from_, subject, company, received_utc, body, thread)
+
+
+def classify_email(from_: str, subject: str, company: str, received_utc: str, body: str, thread: str = "") -> dict:
+    """
+    Classify one email, answering from the on-disk cache when the same
+    content was already classified with this provider, model and prompt version.
+    """
+    cache = get_llm_cache(PROMPT_VERSION)
+    if cache is None:
+        return call_llm_structured(build_prompt(from_, subject, company, received_utc, body, thread))
+
+    key = email_cache_key(from_, subject, company, received_utc, body, thread)
+    while True:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        with _inflight_lock:
+            pending = _inflight.get(key)
+            if pending is None:
+                _inflight[key] = threading.Event()
+                break
+        # Same email already in flight on another worker; reuse its answer
+        pending.wait()
+
+    try:
+        provider, result = _call_llm_answered(build_prompt(from_, subject, company, received_utc, body, thread))
+        answered_key = key if provider == LLM_PROVIDER else email_cache_key(
+            from_, subject, company, received_utc, body, thread, provider=provider)
+        cache.put(answered_key, provider, current_model(provider), result)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key).set()
+
+
+def classify_emails(emails: list, concurrency: int = None) -> list:
+    """
+    Classify many emails with several per request (see call_llm_structured_multi).
+
+    emails: dicts with from_, subject, company, received_utc, body and
+    optionally thread. Returns one result dict or Exception per email, in
+    order. Cached emails and duplicates within the list are not sent.
+    """
+    cache = get_llm_cache(PROMPT_VERSION)
+    out = [None] * len(emails)
+    keys = [email_cache_key(**e) for e in emails]
+    todo = {}
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            out[i] = cached
+        else:
+            todo.setdefault(key, []).append(i)
+
+    unique = list(todo)
+    prompts = [build_prompt(**emails[todo[key][0]]) for key in unique]
+    groups = plan_multi_groups(prompts)
+    work = lambda group: _call_llm_multi_answered([prompts[j] for j in group])
+    for group, answered, error in map_ordered(work, groups, concurrency):
+        for j, (provider, result) in zip(group, answered if error is None else [(None, error)] * len(group)):
+            key = unique[j]
+            if cache is not None and not isinstance(result, Exception):
+                # Under the provider that answered, so a failover answer is never served as LLM_PROVIDER's
+                answered_key = key if provider == LLM_PROVIDER else email_cache_key(
+                    **emails[todo[key][0]], provider=provider)
+                cache.put(answered_key, provider, current_model(provider), result)
+            for i in todo[key]:
+                out[i] = result
+    return out
+
+
+def cache_stats() -> Optional[dict]:
+    cache = get_llm_cache(PROMPT_VERSION)
+    return cache.stats() if cache is not None else None
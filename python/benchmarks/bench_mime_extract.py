@@ -0,0 +1,114 @@
+"""
+Micro-benchmark: legacy two-walk MIME body extraction vs mime_text.extract_body.
+
+Builds a synthetic corpus of large messages (HTML-only newsletters with
+inline CSS/scripts, long plain-text threads, and messages carrying big
+attachments) and times both extractors over it.
+
+Usage:
+  cd python
+  python benchmarks/bench_mime_extract.py [--messages=60] [--budget=5000]
+"""
+
+import email
+import re
+import sys
+import time
+from email.message import EmailMessage
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mime_text import extract_body  # noqa: E402
+
+
+def legacy_extract_body(msg):
+    """The pre-mime_text gmail_source._extract_body, for comparison."""
+    if msg.is_multipart():
+        for part in msg.walk():
+            ct = part.get_content_type()
+            cd = str(part.get("Content-Disposition", ""))
+            if ct == "text/plain" and "attachment" not in cd:
+                payload = part.get_payload(decode=True)
+                if payload:
+                    charset = part.get_content_charset() or "utf-8"
+                    return payload.decode(charset, errors="replace")
+        for part in msg.walk():
+            ct = part.get_content_type()
+            if ct == "text/html":
+                payload = part.get_payload(decode=True)
+                if payload:
+                    charset = part.get_content_charset() or "utf-8"
+                    html = payload.decode(charset, errors="replace")
+                    return re.sub(r"<[^>]+>", "", html).strip()
+    else:
+        payload = msg.get_payload(decode=True)
+        if payload:
+            charset = msg.get_content_charset() or "utf-8"
+            return payload.decode(charset, errors="replace")
+    return ""
+
+
+def build_corpus(n):
+    css = "<style>" + ".c{color:#333;margin:0 auto;}" * 400 + "</style>"
+    script = "<script>" + "var x=1;" * 2000 + "</script>"
+    row = "<tr><td>Senior Engineer &mdash; Acme &amp; Co</td><td>&nbsp;Apply now</td></tr>"
+    # Newsletter-style HTML: long job table plus inline data-URI images
+    image = '<img src="data:image/png;base64,' + "iVBORw0KGgo" * 60000 + '">'
+    html = f"<html><head>{css}</head><body>{script}<table>{row * 4000}</table>{image * 2}</body></html>"
+    plain = "Thanks for your application. We'd like to schedule a call.\n> quoted line\n" * 20000
+    attachment = b"%PDF-1.4 " + bytes(range(256)) * 12000
+
+    raws = []
+    for i in range(n):
+        m = EmailMessage()
+        m["From"] = f"jobs{i}@example.com"
+        m["Subject"] = f"Message {i}"
+        kind = i % 3
+        if kind == 0:
+            m.set_content(html, subtype="html", cte="base64")
+        elif kind == 1:
+            m.set_content(plain, cte="quoted-printable")
+            m.add_attachment(attachment, maintype="application", subtype="pdf", filename="cv.pdf")
+        else:
+            m.set_content("See attached.")
+            m.add_alternative(html, subtype="html", cte="quoted-printable")
+            m.add_attachment(attachment, maintype="application", subtype="pdf", filename="offer.pdf")
+        raws.append(m.as_bytes())
+    return raws
+
+
+def bench(fn, msgs, budget=None):
+    start = time.perf_counter()
+    total = 0
+    for msg in msgs:
+        body = fn(msg)
+        if budget:
+            body = body[:budget]
+        total += len(body)
+    return time.perf_counter() - start, total
+
+
+def main():
+    n, budget = 60, 5000
+    for arg in sys.argv[1:]:
+        if arg.startswith("--messages="):
+            n = int(arg.split("=")[1])
+        elif arg.startswith("--budget="):
+            budget = int(arg.split("=")[1])
+
+    raws = build_corpus(n)
+    size_mb = sum(len(r) for r in raws) / 1e6
+    print(f"Corpus: {n} messages, {size_mb:.1f} MB")
+
+    # Parse separately for each run so neither side benefits from cached payloads
+    legacy_s, legacy_chars = bench(legacy_extract_body, [email.message_from_bytes(r) for r in raws], budget)
+    new_s, new_chars = bench(lambda m: extract_body(m, budget), [email.message_from_bytes(r) for r in raws])
+
+    print(f"legacy  : {legacy_s * 1000:8.1f} ms  ({legacy_chars} chars kept)")
+    print(f"one-pass: {new_s * 1000:8.1f} ms  ({new_chars} chars kept)")
+    print(f"speedup : {legacy_s / new_s:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Classification Engine — concurrent LLM calls with provider rate limits.
+
+map_ordered runs a function over a stream of items on a bounded thread
+pool and yields results in input order, so callers can keep their
+row-by-row loops while several LLM requests are in flight. Items that
+share a key run one after another.
+
+Each provider gets a RateLimiter holding two token buckets, one for
+requests/minute and one for tokens/minute. call_llm_structured acquires
+from it before every request, so the limits hold however many workers run.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+# LLM requests in flight at once; 1 restores the old serial behaviour
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+
+# Per-provider limits (0 = unlimited); defaults match the entry API tiers
+RATE_LIMIT_DEFAULTS = {
+    "anthropic": {"rpm": 50, "tpm": 50000},
+    "openai": {"rpm": 500, "tpm": 200000},
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at per_minute / 60 per
+    second, holding up to `capacity` tokens (default: a minute's worth).
+    pause() empties it and blocks every acquire for a while.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.capacity = float(max(1, per_minute if capacity is None else capacity))
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, n=1):
+        """Block until n tokens are available, then take them. Returns seconds waited."""
+        if not self.rate:
+            return 0.0
+        # A single oversized request must still be able to go through
+        n = min(float(n), self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self._refill()
+                    if self.tokens >= n:
+                        self.tokens -= n
+                        return waited
+                    delay = (n - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter:
+    """Requests/minute and tokens/minute limits for one provider."""
+
+    def __init__(self, rpm=0, tpm=0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, tokens=0):
+        waited = 0.0
+        if self.requests:
+            waited += self.requests.acquire(1)
+        if self.tokens and tokens:
+            waited += self.tokens.acquire(tokens)
+        if waited:
+            with self.lock:
+                self.waited += waited
+        return waited
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    """Process-wide RateLimiter for a provider, configured by <PROVIDER>_RPM / <PROVIDER>_TPM."""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            defaults = RATE_LIMIT_DEFAULTS.get(provider, {"rpm": 0, "tpm": 0})
+            prefix = provider.upper()
+            limiter = RateLimiter(
+                rpm=int(os.getenv(f"{prefix}_RPM", str(defaults["rpm"]))),
+                tpm=int(os.getenv(f"{prefix}_TPM", str(defaults["tpm"]))),
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def estimate_tokens(text):
+    """Rough input-token count (~4 characters per token) for rate limiting."""
+    return len(text or "") // 4 + 1
+
+
+def _settle(item, future):
+    try:
+        return item, future.result(), None
+    except Exception as e:
+        return item, None, e
+
+
+def map_ordered(fn, items, concurrency=None, key=None, name="classify"):
+    """
+    Yield (item, result, error) for fn(item) over items, in input order.
+
+    At most `concurrency` calls run at once and at most twice that many
+    items are read ahead, so a streaming input is never drained into memory.
+    Items with the same key(item) never run at once (None means no key).
+    Exceptions from fn are returned as `error` instead of being raised.
+    """
+    concurrency = concurrency or LLM_CONCURRENCY
+    if concurrency <= 1:
+        for item in items:
+            try:
+                yield item, fn(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    locks = {}
+    locks_lock = threading.Lock()
+
+    def run(item):
+        k = key(item) if key else None
+        if k is None:
+            lock = nullcontext()
+        else:
+            with locks_lock:
+                lock = locks.setdefault(k, threading.Lock())
+        with lock:
+            return fn(item)
+
+    window = deque()
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=name)
+    try:
+        for item in items:
+            window.append((item, pool.submit(run, item)))
+            if len(window) >= concurrency * 2:
+                yield _settle(*window.popleft())
+            # Hand out finished results before waiting on a slow input
+            while window and window[0][1].done():
+                yield _settle(*window.popleft())
+        while window:
+            yield _settle(*window.popleft())
+    finally:
+        # Consumer stopped early: drop queued calls, let running ones finish
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,161 @@
+"""
+Body Condensation — shrink an email body to what the classifier needs.
+
+Runs between fetch and build_prompt: drops quoted reply history,
+signatures and legal/marketing footers, collapses long tracking URLs, and
+enforces a token budget (LLM_BODY_TOKEN_BUDGET) instead of a fixed
+character cut. The head and the tail of an over-budget body are kept,
+since deadlines and asks often sit at the end.
+
+Only the prompt text is condensed; the row's body (and the Notion page)
+keep the original.
+"""
+
+import os
+import re
+import threading
+from collections import namedtuple
+from pathlib import Path
+from dotenv import load_dotenv
+
+from classify_engine import estimate_tokens
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+BODY_TOKEN_BUDGET = int(os.getenv("LLM_BODY_TOKEN_BUDGET", "1200"))
+# URLs longer than this are reduced to their host
+URL_MAX_CHARS = 60
+
+Condensed = namedtuple("Condensed", "text tokens_before tokens_after")
+
+# Start of quoted history in a reply; everything from here on is dropped
+_REPLY_HEADER = re.compile(
+    r"^(?:On\b[^\n]{0,200}(?:\n[^\n]{0,200})?\bwrote:[ \t]*$"
+    r"|Le\b[^\n]{0,200}(?:\n[^\n]{0,200})?a écrit ?:[ \t]*$"
+    r"|Am\b[^\n]{0,200}(?:\n[^\n]{0,200})?schrieb[^\n]{0,100}:[ \t]*$"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|From:[^\n]+\n(?:(?:Sent|Date):[^\n]+\n)(?:(?:To|Cc|Subject):[^\n]*\n?){1,4})",
+    re.MULTILINE | re.IGNORECASE,
+)
+_QUOTED_LINE = re.compile(r"^[ \t]*>.*(?:\n|$)", re.MULTILINE)
+# "-- " signature delimiter and mobile client taglines
+_SIGNATURE = re.compile(r"^(?:-- ?|__)[ \t]*$", re.MULTILINE)
+_TAGLINE = re.compile(r"^[ \t]*(?:Sent from my [\w ]+|Get Outlook for \w+|Sent via [\w ]+)[ \t]*$", re.MULTILINE | re.IGNORECASE)
+# Boilerplate paragraphs; only stripped from the end of the message, after the last paragraph of content
+_FOOTER = re.compile(
+    r"\b(?:confidentiality notice|this (?:e-?mail|message|communication)(?: and any (?:files|attachments)[^.]{0,40})? "
+    r"(?:is|are|may (?:be|contain)|contains?) (?:strictly )?(?:confidential|privileged)|"
+    r"intended (?:solely |only )?for the (?:use of the )?(?:named |intended )?(?:recipient|addressee)|"
+    r"if you (?:have )?received this (?:e-?mail|message) in error|"
+    r"(?:click here |here )?to unsubscribe|unsubscribe (?:here|from (?:these|this|our|all))|unsubscribe\W{0,5}<?https?://|"
+    r"https?://\S*unsubscribe|manage (?:your )?(?:email |subscription |notification )?preferences|"
+    r"(?:read|see|view) our privacy (?:policy|notice)|privacy (?:policy|notice)\s*(?:[|·•]|<?https?://)|"
+    r"equal (?:opportunity|employment opportunity) employer|all rights reserved|"
+    r"view (?:this email )?in (?:your )?browser|this (?:e-?mail|message) was sent (?:to|by)|"
+    r"do not reply to this (?:e-?mail|message))",
+    re.IGNORECASE,
+)
+_URL = re.compile(r"<?https?://([^/\s<>\"')\]]+)[^\s<>\"')\]]*>?")
+
+
+class CondenseStats:
+    """Running token totals before and after condensation."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.emails = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def record(self, before, after):
+        with self.lock:
+            self.emails += 1
+            self.tokens_before += before
+            self.tokens_after += after
+
+    def snapshot(self):
+        with self.lock:
+            return {"emails": self.emails, "tokens_before": self.tokens_before, "tokens_after": self.tokens_after}
+
+
+stats = CondenseStats()
+
+
+def _strip_quotes(text):
+    match = _REPLY_HEADER.search(text)
+    kept = text[:match.start()] if match else text
+    kept = _QUOTED_LINE.sub("", kept)
+    if len(kept.strip()) >= 20:
+        return kept
+    # Nothing but quoted history (e.g. "see below"): keep the quote, unquoted
+    return re.sub(r"^[ \t]*>+ ?", "", text, flags=re.MULTILINE)
+
+
+def _strip_signature(text):
+    match = _SIGNATURE.search(text)
+    if match and len(text[:match.start()].strip()) >= 20:
+        text = text[:match.start()]
+    return _TAGLINE.sub("", text)
+
+
+def _strip_footers(text):
+    paragraphs = re.split(r"\n[ \t]*\n", text)
+    # Walk back from the end; the first paragraph is always content
+    end = len(paragraphs)
+    while end > 1 and (not paragraphs[end - 1].strip() or _FOOTER.search(paragraphs[end - 1])):
+        end -= 1
+    return "\n\n".join(paragraphs[:end])
+
+
+def _collapse_url(match):
+    url = match.group(0)
+    if len(url) <= URL_MAX_CHARS:
+        return url
+    return f"[link: {match.group(1).lower()}]"
+
+
+def _enforce_budget(text, budget):
+    if estimate_tokens(text) <= budget:
+        return text
+    # estimate_tokens is ~4 chars/token; 3/4 of the budget goes to the head
+    chars = budget * 4
+    head_chars = chars * 3 // 4
+    tail_chars = chars - head_chars
+    head = text[:head_chars]
+    tail = text[-tail_chars:]
+    # Cut on line breaks where possible so sentences aren't split mid-word
+    nl = head.rfind("\n")
+    if nl > head_chars // 2:
+        head = head[:nl]
+    nl = tail.find("\n")
+    if 0 <= nl < tail_chars // 2:
+        tail = tail[nl + 1:]
+    omitted = estimate_tokens(text) - estimate_tokens(head) - estimate_tokens(tail)
+    return f"{head.rstrip()}\n[… {omitted} tokens omitted …]\n{tail.lstrip()}"
+
+
+def condense(body, budget=None):
+    """Condense an email body; returns Condensed(text, tokens_before, tokens_after)."""
+    budget = budget or BODY_TOKEN_BUDGET
+    text = str(body or "").replace("\r\n", "\n").replace("_x000D_", "").replace("_x000A_", "\n")
+    before = estimate_tokens(text)
+    text = _strip_quotes(text)
+    text = _strip_signature(text)
+    text = _strip_footers(text)
+    text = _URL.sub(_collapse_url, text)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    text = _enforce_budget(text, budget)
+    after = estimate_tokens(text)
+    stats.record(before, after)
+    return Condensed(text, before, after)
+
+
+def condense_row(row):
+    """Copy of a row with prompt_body set to the condensed body and the token counts recorded."""
+    result = condense(row.get("body", ""))
+    row = dict(row)
+    row["prompt_body"] = result.text
+    row["body_tokens"] = result.tokens_after
+    row["body_tokens_saved"] = result.tokens_before - result.tokens_after
+    return row
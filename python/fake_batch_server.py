@@ -0,0 +1,374 @@
+"""
+Fake Batch Server — offline stand-in for the provider batch APIs.
+
+Implements just enough of the Anthropic Messages and Message Batches APIs
+and the OpenAI Files + Batch API for `main.py push` and `push --batch` to
+run without network access or API cost. Usage reports simulate prompt
+caching: the first request with a given system prompt writes the cache,
+later ones read it. Batches report in_progress until --delay seconds have passed.
+Each email is then answered by simple keyword rules, and a subject
+containing "[fake-error]" comes back as a failed request. Multi-email
+requests leave out any email containing "[fake-drop]".
+
+Faults for exercising retries and failover on direct calls:
+  [fake-overloaded]      the first request for the prompt gets 529 + retry-after: 1
+  [fake-slow]            the first request for the prompt takes 3s (hedging)
+  [fake-anthropic-down]  /v1/messages always answers 529
+The OpenAI Responses API (/v1/responses) is served too, so a failover
+from Anthropic can be followed end to end.
+
+Usage:
+  python fake_batch_server.py --port=8765 --delay=2
+  ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=fake python main.py push [--batch]
+  LLM_PROVIDER=openai OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python main.py push --batch
+  # set both to let Anthropic fail over to OpenAI
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RULES = [
+    ("unfortunately|not moving forward|other candidates", ("rejected", "low", "archive", 0.2)),
+    ("offer letter|pleased to offer", ("offer", "high", "sign_offer", 0.95)),
+    ("schedule|availability|interview", ("needs_action", "high", "schedule", 0.8)),
+    ("assessment|take-home|coding test", ("needs_action", "medium", "complete_assessment", 0.7)),
+    ("application (was )?received|thank you for applying", ("applied", "low", "archive", 0.3)),
+]
+
+
+def classify(prompt):
+    """Keyword classification of a build_prompt() prompt; returns an LLMResult-shaped dict."""
+    subject = re.search(r"^subject: (.*)$", prompt, re.M)
+    company = re.search(r"^company_hint: (.*)$", prompt, re.M)
+    subject = subject.group(1) if subject else ""
+    text = prompt.lower()
+    stage, priority, action, score = "other", "low", "ignore", 0.1
+    for pattern, labels in RULES:
+        if re.search(pattern, text):
+            stage, priority, action, score = labels
+            break
+    return {
+        "stage": stage,
+        "priority": priority,
+        "next_action": action,
+        "importance_score": score,
+        "summary": f"[fake] {subject}".strip(),
+        "company": company.group(1).strip() if company else "",
+        "due_date": None,
+    }
+
+
+def _now_iso():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class State:
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.batches = {}
+        self.files = {}
+        self.cached_prefixes = set()
+        self.seen = {}
+
+    def first_time(self, kind, prompt):
+        """True the first time a fault marker is hit for this prompt."""
+        with self.lock:
+            n = self.seen.get((kind, prompt), 0)
+            self.seen[(kind, prompt)] = n + 1
+        return n == 0
+
+    def usage(self, prefix, prompt):
+        """Anthropic-style usage with simulated prefix caching."""
+        prefix_tokens = len(prefix) // 4
+        with self.lock:
+            hit = prefix in self.cached_prefixes
+            self.cached_prefixes.add(prefix)
+        return {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": 60,
+            "cache_read_input_tokens": prefix_tokens if hit else 0,
+            "cache_creation_input_tokens": 0 if hit else prefix_tokens,
+        }
+
+
+def _anthropic_prefix(params):
+    system = params.get("system") or ""
+    if isinstance(system, list):
+        system = "\n".join(b.get("text", "") for b in system)
+    return json.dumps(params.get("tools")) + system
+
+
+def _user_text(params):
+    prompt = params["messages"][-1]["content"]
+    if isinstance(prompt, list):
+        prompt = "\n".join(b.get("text", "") for b in prompt)
+    return prompt
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, code, body, content_type="application/json", headers=None):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _ended(self, batch):
+            return time.time() - batch["created"] >= state.delay
+
+        # --- Anthropic ---
+
+        def _anthropic_batch(self, batch):
+            ended = self._ended(batch)
+            n = len(batch["requests"])
+            failed = sum(1 for r in batch["requests"] if "[fake-error]" in json.dumps(r["params"]))
+            return {
+                "id": batch["id"],
+                "type": "message_batch",
+                "processing_status": "ended" if ended else "in_progress",
+                "request_counts": {
+                    "processing": 0 if ended else n,
+                    "succeeded": n - failed if ended else 0,
+                    "errored": failed if ended else 0,
+                    "canceled": 0,
+                    "expired": 0,
+                },
+                "created_at": batch["created_at"],
+                "expires_at": batch["created_at"],
+                "ended_at": _now_iso() if ended else None,
+                "archived_at": None,
+                "cancel_initiated_at": None,
+                "results_url": f"http://{self.headers['Host']}/v1/messages/batches/{batch['id']}/results" if ended else None,
+            }
+
+        def _anthropic_message(self, params):
+            prompt = _user_text(params)
+            tool = params["tools"][0]["name"] if params.get("tools") else "classify_email"
+            if tool == "classify_emails":
+                parts = re.split(r"^### Email (\d+)\n", prompt, flags=re.M)[1:]
+                tool_input = {"results": [dict(classify(text), index=int(idx))
+                                          for idx, text in zip(parts[::2], parts[1::2])
+                                          if "[fake-drop]" not in text]}
+            else:
+                tool_input = classify(prompt)
+            return {
+                "id": f"msg_{uuid.uuid4().hex[:12]}",
+                "type": "message",
+                "role": "assistant",
+                "model": params.get("model", "fake"),
+                "content": [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}",
+                             "name": tool, "input": tool_input}],
+                "stop_reason": "tool_use",
+                "stop_sequence": None,
+                "usage": state.usage(_anthropic_prefix(params), prompt),
+            }
+
+        def _fault(self, prompt, provider):
+            """(status, body, headers) for an injected failure, or None. May sleep for [fake-slow]."""
+            overloaded = (529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+                          {"retry-after": "1"})
+            if provider == "anthropic" and "[fake-anthropic-down]" in prompt:
+                return overloaded
+            if "[fake-overloaded]" in prompt and state.first_time("overloaded", prompt):
+                return overloaded
+            if "[fake-slow]" in prompt and state.first_time("slow", prompt):
+                time.sleep(3)
+            return None
+
+        def _openai_response(self, req):
+            prompt = req["input"] if isinstance(req["input"], str) else json.dumps(req["input"])
+            parts = re.split(r"^### Email (\d+)\n", prompt, flags=re.M)[1:]
+            if parts:
+                out = {"results": [dict(classify(text), index=int(idx))
+                                   for idx, text in zip(parts[::2], parts[1::2]) if "[fake-drop]" not in text]}
+            else:
+                out = classify(prompt)
+            usage = state.usage(req.get("instructions") or "", prompt)
+            return {
+                "id": f"resp_{uuid.uuid4().hex[:12]}",
+                "object": "response",
+                "created_at": time.time(),
+                "model": req.get("model", "fake"),
+                "status": "completed",
+                "output": [{"type": "message", "id": f"msg_{uuid.uuid4().hex[:12]}", "role": "assistant",
+                            "status": "completed",
+                            "content": [{"type": "output_text", "text": json.dumps(out), "annotations": []}]}],
+                "parallel_tool_calls": False,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {
+                    "input_tokens": usage["input_tokens"] + usage["cache_read_input_tokens"],
+                    "input_tokens_details": {"cached_tokens": usage["cache_read_input_tokens"]},
+                    "output_tokens": usage["output_tokens"],
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                    "total_tokens": usage["input_tokens"] + usage["output_tokens"],
+                },
+            }
+
+        def _anthropic_results(self, batch):
+            lines = []
+            for r in batch["requests"]:
+                if "[fake-error]" in _user_text(r["params"]):
+                    result = {"type": "errored", "error": {"type": "error", "error": {
+                        "type": "invalid_request_error", "message": "fake failure"}}}
+                else:
+                    result = {"type": "succeeded", "message": self._anthropic_message(r["params"])}
+                lines.append(json.dumps({"custom_id": r["custom_id"], "result": result}))
+            return ("\n".join(lines) + "\n").encode("utf-8")
+
+        # --- OpenAI ---
+
+        def _openai_batch(self, batch):
+            ended = self._ended(batch)
+            n = len(batch["requests"])
+            failed = sum(1 for r in batch["requests"] if "[fake-error]" in json.dumps(r["body"]))
+            if ended and "output_file_id" not in batch:
+                ok, bad = [], []
+                for r in batch["requests"]:
+                    prompt = r["body"]["messages"][-1]["content"]
+                    if "[fake-error]" in prompt:
+                        bad.append({"id": uuid.uuid4().hex, "custom_id": r["custom_id"], "response": {
+                            "status_code": 400, "body": {"error": {"message": "fake failure"}}}, "error": None})
+                        continue
+                    u = state.usage(r["body"]["messages"][0]["content"], prompt)
+                    cached = u["cache_read_input_tokens"]
+                    usage = {"prompt_tokens": u["input_tokens"] + cached + u["cache_creation_input_tokens"],
+                             "completion_tokens": u["output_tokens"],
+                             "prompt_tokens_details": {"cached_tokens": cached}}
+                    ok.append({"id": uuid.uuid4().hex, "custom_id": r["custom_id"], "error": None, "response": {
+                        "status_code": 200, "body": {"usage": usage, "choices": [{"index": 0, "message": {
+                            "role": "assistant", "content": json.dumps(classify(prompt))}}]}}})
+                with state.lock:
+                    batch["output_file_id"] = self._store_file("\n".join(map(json.dumps, ok)), "batch_output")
+                    batch["error_file_id"] = self._store_file("\n".join(map(json.dumps, bad)), "batch_output") if bad else None
+            return {
+                "id": batch["id"],
+                "object": "batch",
+                "endpoint": batch["endpoint"],
+                "input_file_id": batch["input_file_id"],
+                "completion_window": "24h",
+                "status": "completed" if ended else "in_progress",
+                "created_at": int(batch["created"]),
+                "output_file_id": batch.get("output_file_id"),
+                "error_file_id": batch.get("error_file_id"),
+                "request_counts": {"total": n, "completed": n - failed if ended else 0, "failed": failed if ended else 0},
+            }
+
+        def _store_file(self, text, purpose):
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            state.files[file_id] = {"data": text.encode("utf-8"), "purpose": purpose}
+            return file_id
+
+        def _file_object(self, file_id):
+            f = state.files[file_id]
+            return {"id": file_id, "object": "file", "bytes": len(f["data"]), "created_at": int(time.time()),
+                    "filename": f"{file_id}.jsonl", "purpose": f["purpose"], "status": "processed"}
+
+        def _multipart_file(self, body):
+            boundary = re.search(r"boundary=([^;]+)", self.headers["Content-Type"]).group(1).strip('"').encode()
+            purpose = "batch"
+            data = b""
+            for part in body.split(b"--" + boundary):
+                head, _, payload = part.partition(b"\r\n\r\n")
+                payload = payload.rsplit(b"\r\n", 1)[0]
+                if b'name="file"' in head:
+                    data = payload
+                elif b'name="purpose"' in head:
+                    purpose = payload.decode().strip()
+            return data.decode("utf-8"), purpose
+
+        # --- routing ---
+
+        def do_POST(self):
+            body = self._body()
+            path = self.path.split("?")[0]
+            if path == "/v1/messages":
+                params = json.loads(body)
+                if "[fake-error]" in _user_text(params):
+                    return self._send(400, {"type": "error", "error": {
+                        "type": "invalid_request_error", "message": "fake failure"}})
+                fault = self._fault(_user_text(params), "anthropic")
+                if fault:
+                    return self._send(fault[0], fault[1], headers=fault[2])
+                return self._send(200, self._anthropic_message(params))
+            if path == "/v1/responses":
+                req = json.loads(body)
+                fault = self._fault(json.dumps(req["input"]), "openai")
+                if fault:
+                    return self._send(fault[0], fault[1], headers=fault[2])
+                return self._send(200, self._openai_response(req))
+            with state.lock:
+                if path == "/v1/messages/batches":
+                    req = json.loads(body)
+                    batch_id = f"msgbatch_{uuid.uuid4().hex[:12]}"
+                    state.batches[batch_id] = {"id": batch_id, "requests": req["requests"],
+                                               "created": time.time(), "created_at": _now_iso()}
+                    return self._send(200, self._anthropic_batch(state.batches[batch_id]))
+                if path == "/v1/files":
+                    text, purpose = self._multipart_file(body)
+                    return self._send(200, self._file_object(self._store_file(text, purpose)))
+                if path == "/v1/batches":
+                    req = json.loads(body)
+                    requests = [json.loads(line) for line in
+                                state.files[req["input_file_id"]]["data"].decode().splitlines() if line.strip()]
+                    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+                    state.batches[batch_id] = {"id": batch_id, "requests": requests, "created": time.time(),
+                                               "endpoint": req["endpoint"], "input_file_id": req["input_file_id"]}
+            if path == "/v1/batches":
+                return self._send(200, self._openai_batch(state.batches[batch_id]))
+            self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            m = re.fullmatch(r"/v1/messages/batches/([\w-]+)(/results)?", path)
+            if m and m.group(1) in state.batches:
+                batch = state.batches[m.group(1)]
+                if m.group(2):
+                    return self._send(200, self._anthropic_results(batch), "application/binary")
+                return self._send(200, self._anthropic_batch(batch))
+            m = re.fullmatch(r"/v1/batches/([\w-]+)", path)
+            if m and m.group(1) in state.batches:
+                return self._send(200, self._openai_batch(state.batches[m.group(1)]))
+            m = re.fullmatch(r"/v1/files/([\w-]+)(/content)?", path)
+            if m and m.group(1) in state.files:
+                if m.group(2):
+                    return self._send(200, state.files[m.group(1)]["data"], "application/octet-stream")
+                return self._send(200, self._file_object(m.group(1)))
+            self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+    return Handler
+
+
+def serve(port=0, delay=2.0):
+    """Start the server in a background thread; returns (server, port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(State(delay)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+if __name__ == "__main__":
+    port, delay = 8765, 2.0
+    for arg in sys.argv[1:]:
+        if arg.startswith("--port="):
+            port = int(arg.split("=")[1])
+        elif arg.startswith("--delay="):
+            delay = float(arg.split("=")[1])
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(State(delay)))
+    print(f"[FAKE-BATCH] Listening on http://127.0.0.1:{port} (batches end after {delay}s)")
+    server.serve_forever()
@@ -0,0 +1,248 @@
+"""
+Fake IMAP Server — offline stand-in for Gmail IMAP.
+
+Implements just enough of IMAP4rev1 plus Gmail's X-GM-EXT-1 for
+gmail_source to run without network access: LOGIN, SELECT/EXAMINE,
+UID SEARCH (ALL, UID ranges; date and X-GM-RAW criteria match
+everything), UID FETCH of UID, X-GM-THRID, X-GM-MSGID, RFC822.SIZE,
+BODYSTRUCTURE, BODY.PEEK[HEADER.FIELDS (...)], BODY.PEEK[n]<start.len>
+and RFC822, and IDLE. Messages are added with Mailbox.add(); UIDs count
+up from 1 per folder.
+
+Mailbox.header_echo changes how a HEADER.FIELDS item is echoed back:
+"same" (as requested), "quoted" (field names quoted, as some servers do)
+or "none" (no header literal at all).
+
+IDLE reports mail added since the connection's SELECT in the same write
+as the "+ idling" continuation, as real servers often do, then polls for
+more until the client sends DONE.
+
+Usage:
+  python fake_imap_server.py --port=1143 --messages=20
+  IMAP_HOST=127.0.0.1 IMAP_PORT=1143 IMAP_SSL=0 FROM_EMAIL=me@example.com GMAIL_APP_PASSWORD=fake python main.py push
+"""
+
+import email
+import re
+import select
+import socketserver
+import sys
+import threading
+from email.message import EmailMessage
+
+CAPABILITIES = "IMAP4rev1 IDLE X-GM-EXT-1"
+
+
+class Mailbox:
+    """Folders of messages ({uid, raw, thread_id, gm_msgid}) shared by every connection."""
+
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.folders = {"INBOX": []}
+        self.lock = threading.Lock()
+        self.commands = []
+        self.header_echo = "same"
+
+    def add(self, raw, folder="INBOX", thread_id=None):
+        with self.lock:
+            messages = self.folders.setdefault(folder, [])
+            uid = messages[-1]["uid"] + 1 if messages else 1
+            messages.append({"uid": uid, "raw": raw, "thread_id": thread_id or 1000 + uid, "gm_msgid": 5000 + uid})
+            return uid
+
+    def messages(self, folder):
+        with self.lock:
+            return list(self.folders.get(folder, []))
+
+
+def make_message(n, sender="recruiter@acme.com", subject=None, body=None, references=None):
+    """A small plain-text email; Message-ID <m{n}@example.com>."""
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = "me@example.com"
+    msg["Subject"] = subject or f"Message {n}"
+    msg["Date"] = "Mon, 05 Oct 2026 10:00:00 +0000"
+    msg["Message-ID"] = f"<m{n}@example.com>"
+    if references:
+        msg["References"] = references
+    msg.set_content(body or f"Hello, this is message {n}.")
+    return msg.as_bytes()
+
+
+def _bodystructure(msg):
+    if msg.is_multipart():
+        inner = "".join(_bodystructure(part) for part in msg.get_payload())
+        return f'({inner} "{msg.get_content_subtype().upper()}" ("BOUNDARY" "x") NIL NIL)'
+    maintype, subtype = msg.get_content_type().upper().split("/")
+    charset = msg.get_content_charset() or "us-ascii"
+    encoding = (msg.get("Content-Transfer-Encoding") or "7BIT").upper()
+    payload = msg.get_payload(decode=False)
+    size = len(payload.encode() if isinstance(payload, str) else payload)
+    disposition = '("attachment" NIL)' if "attachment" in (msg.get("Content-Disposition") or "") else "NIL"
+    lines = f" {payload.count(chr(10))}" if maintype == "TEXT" else ""
+    return f'("{maintype}" "{subtype}" ("CHARSET" "{charset}") NIL NIL "{encoding}" {size}{lines} NIL {disposition} NIL)'
+
+
+def _section(msg, path):
+    part = msg
+    for n in path:
+        if part.is_multipart():
+            part = part.get_payload()[n - 1]
+        elif n != 1:
+            return b""
+    payload = part.get_payload(decode=False)
+    return payload.encode() if isinstance(payload, str) else payload
+
+
+def _in_set(spec, n):
+    for piece in spec.split(","):
+        lo, _, hi = piece.partition(":")
+        lo = 10 ** 9 if lo == "*" else int(lo)
+        hi = lo if not hi else 10 ** 9 if hi == "*" else int(hi)
+        if min(lo, hi) <= n <= max(lo, hi):
+            return True
+    return False
+
+
+def make_handler(mailbox):
+    class Handler(socketserver.StreamRequestHandler):
+        def send(self, line):
+            self.wfile.write((line.encode() if isinstance(line, str) else line) + b"\r\n")
+
+        def handle(self):
+            self.folder = None
+            self.send("* OK fake IMAP ready")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+                command, _, args = rest.partition(" ")
+                command = command.upper()
+                uid = command == "UID"
+                if uid:
+                    command, _, args = args.partition(" ")
+                    command = command.upper()
+                mailbox.commands.append((command, args))
+                if command == "LOGOUT":
+                    self.send("* BYE")
+                    self.send(f"{tag} OK bye")
+                    return
+                self.dispatch(tag, command, args, uid)
+
+        def dispatch(self, tag, command, args, uid):
+            if command == "CAPABILITY":
+                self.send(f"* CAPABILITY {CAPABILITIES}")
+            elif command == "LOGIN":
+                pass
+            elif command in ("SELECT", "EXAMINE"):
+                folder = args.strip('"')
+                if folder not in mailbox.folders:
+                    return self.send(f"{tag} NO no such folder")
+                self.folder = folder
+                self.exists = len(mailbox.messages(folder))
+                self.send(f"* {self.exists} EXISTS")
+                self.send(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] ok")
+            elif command == "SEARCH":
+                self.search(args, uid)
+            elif command == "IDLE":
+                self.idle()
+            elif command == "FETCH":
+                spec, _, items = args.partition(" ")
+                for seq, message in enumerate(mailbox.messages(self.folder), 1):
+                    if _in_set(spec, message["uid"] if uid else seq):
+                        self.fetch(seq, message, items)
+            elif command != "NOOP":
+                return self.send(f"{tag} BAD unknown command {command}")
+            self.send(f"{tag} OK done")
+
+        def idle(self):
+            out = b"+ idling\r\n"
+            while True:
+                count = len(mailbox.messages(self.folder))
+                if count > self.exists:
+                    self.exists = count
+                    out += f"* {count} EXISTS\r\n".encode()
+                if out:
+                    self.wfile.write(out)
+                    out = b""
+                readable, _, _ = select.select([self.rfile], [], [], 0.05)
+                if readable:
+                    self.rfile.readline()
+                    return
+
+        def search(self, args, uid):
+            # Only UID ranges narrow the result; everything else matches
+            ranges = re.findall(r"\bUID ([\d:*,]+)", args, re.I)
+            found = []
+            for seq, message in enumerate(mailbox.messages(self.folder), 1):
+                if all(_in_set(spec, message["uid"]) for spec in ranges):
+                    found.append(str(message["uid"] if uid else seq))
+            if ranges and not found and mailbox.messages(self.folder):
+                # "n:*" always matches the highest UID
+                found.append(str(mailbox.messages(self.folder)[-1]["uid"]))
+            self.send(" ".join(["* SEARCH"] + found))
+
+        def fetch(self, seq, message, items):
+            msg = email.message_from_bytes(message["raw"])
+            head = [f"UID {message['uid']}"]
+            if "X-GM-THRID" in items.upper():
+                head.append(f"X-GM-THRID {message['thread_id']}")
+            if "X-GM-MSGID" in items.upper():
+                head.append(f"X-GM-MSGID {message['gm_msgid']}")
+            if "RFC822.SIZE" in items.upper():
+                head.append(f"RFC822.SIZE {len(message['raw'])}")
+            if "BODYSTRUCTURE" in items.upper():
+                head.append(f"BODYSTRUCTURE {_bodystructure(msg)}")
+            literals = []
+            fields = re.search(r"BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]", items, re.I)
+            if fields and mailbox.header_echo != "none":
+                names = fields.group(1).split()
+                data = b"".join(f"{name}: {msg[name]}\r\n".encode() for name in names if msg[name] is not None)
+                if mailbox.header_echo == "quoted":
+                    names = [f'"{name}"' for name in names]
+                literals.append((f"BODY[HEADER.FIELDS ({' '.join(names)})]", data + b"\r\n"))
+            for number, start, length in re.findall(r"BODY\.PEEK\[([\d.]+)\](?:<(\d+)\.(\d+)>)?", items, re.I):
+                data = _section(msg, [int(n) for n in number.split(".")])
+                label = f"BODY[{number}]"
+                if start:
+                    data = data[int(start):int(start) + int(length)]
+                    label += f"<{start}>"
+                literals.append((label, data))
+            if re.search(r"\bRFC822\b(?!\.)", items, re.I):
+                literals.append(("RFC822", message["raw"]))
+            out = f"* {seq} FETCH ({' '.join(head)}".encode()
+            for label, data in literals:
+                out += f" {label} {{{len(data)}}}\r\n".encode() + data
+            self.wfile.write(out + b")\r\n")
+
+    return Handler
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve(mailbox=None, port=0):
+    """Start the server in a background thread; returns (server, port). server.mailbox holds the messages."""
+    mailbox = mailbox or Mailbox()
+    server = _Server(("127.0.0.1", port), make_handler(mailbox))
+    server.mailbox = mailbox
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+if __name__ == "__main__":
+    port, count = 1143, 20
+    for arg in sys.argv[1:]:
+        if arg.startswith("--port="):
+            port = int(arg.split("=")[1])
+        elif arg.startswith("--messages="):
+            count = int(arg.split("=")[1])
+    mailbox = Mailbox()
+    for n in range(1, count + 1):
+        mailbox.add(make_message(n))
+    server = _Server(("127.0.0.1", port), make_handler(mailbox))
+    print(f"[FAKE-IMAP] Listening on 127.0.0.1:{port} ({count} messages in INBOX)")
+    server.serve_forever()
@@ -7,20 +7,231 @@ with the existing LLM + Notion sync pipeline.
 
 import imaplib
 import email
+import select
+import ssl
+import time
 from email.header import decode_header
+from email.message import Message
 from datetime import datetime, timezone
 import os
 import re
 import hashlib
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 
+from raw_store import get_raw_store
+from mime_text import extract_body, decode_section
+
 load_dotenv(Path(__file__).parent.parent / ".env")
 
 IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
 IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
 IMAP_USER = os.getenv("FROM_EMAIL", "")
 IMAP_PASS = os.getenv("GMAIL_APP_PASSWORD", "")
+# Set IMAP_SSL=0 to talk plain IMAP (e.g. to a local test server)
+IMAP_SSL = os.getenv("IMAP_SSL", "1") != "0"
+# Servers may drop IDLE after 30 min (RFC 2177); re-issue well before that
+IDLE_TIMEOUT = int(os.getenv("IMAP_IDLE_TIMEOUT", "1500"))
+# Number of contact addresses combined into one OR FROM search
+CONTACT_SEARCH_BATCH = int(os.getenv("IMAP_CONTACT_BATCH", "20"))
+# Body characters kept per email; decoding stops once this many are produced.
+# The prompt is trimmed by token budget later (condense.py), so this is generous
+BODY_MAX_CHARS = int(os.getenv("IMAP_BODY_MAX_CHARS", "20000"))
+# UIDs requested per FETCH command
+FETCH_CHUNK_SIZE = int(os.getenv("IMAP_FETCH_CHUNK", "50"))
+# Use X-GM-THRID as conversation_id when the server supports X-GM-EXT-1
+GMAIL_THREAD_IDS = os.getenv("IMAP_GMAIL_THREAD_IDS", "1") != "0"
+# UIDVALIDITY + last-seen UID per account/folder for incremental sync
+IMAP_STATE_PATH = os.getenv("IMAP_STATE_PATH", str(Path(__file__).parent / ".imap_state.json"))
+# JSON list of (account, folder) sources, inline or a path to a .json file; see load_sources
+IMAP_SOURCES = os.getenv("IMAP_SOURCES", "")
+# Sources fetched at once; each gets its own IMAP connection
+IMAP_SOURCE_WORKERS = int(os.getenv("IMAP_SOURCE_WORKERS", "4"))
+# A message whose classification or sync keeps failing is given up after this many runs
+IMAP_RETRY_MAX_ATTEMPTS = int(os.getenv("IMAP_RETRY_MAX_ATTEMPTS", "5"))
+
+
+class ImapSession:
+    """
+    Long-lived IMAP connection shared by fetch_emails / fetch_recent /
+    fetch_from_contacts.
+
+    Logs in lazily on first use, keeps the selected folder between calls,
+    and reconnects once if the server drops the connection mid-command.
+    """
+
+    def __init__(self, host=None, port=None, user=None, password=None, ssl=None):
+        self.host = host or IMAP_HOST
+        self.port = port or IMAP_PORT
+        self.user = user if user is not None else IMAP_USER
+        self.password = password if password is not None else IMAP_PASS
+        self.ssl = IMAP_SSL if ssl is None else ssl
+        self.conn = None
+        self.folder = None
+        self.uidvalidity = None
+        self.capabilities = set()
+
+    def connect(self):
+        if not self.user or not self.password:
+            raise ValueError("FROM_EMAIL and GMAIL_APP_PASSWORD required in .env")
+        if self.ssl:
+            self.conn = imaplib.IMAP4_SSL(self.host, self.port)
+        else:
+            self.conn = imaplib.IMAP4(self.host, self.port)
+        self.conn.login(self.user, self.password)
+        # Capabilities can change after LOGIN, so ask again
+        _, caps = self.conn.capability()
+        self.capabilities = set(caps[0].decode().upper().split()) if caps and caps[0] else set()
+        self.folder = None
+        return self.conn
+
+    def has_capability(self, name):
+        if self.conn is None:
+            self.connect()
+        return name.upper() in self.capabilities
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.logout()
+            except Exception:
+                pass
+        self.conn = None
+        self.folder = None
+
+    def select(self, folder="INBOX"):
+        if self.conn is None:
+            self.connect()
+        if self.folder != folder:
+            typ, data = self.conn.select(_quote_mailbox(folder), readonly=True)
+            if typ != "OK":
+                raise imaplib.IMAP4.error(f"SELECT {folder} failed: {data}")
+            _, validity = self.conn.response("UIDVALIDITY")
+            self.uidvalidity = int(validity[0]) if validity and validity[0] else None
+            self.folder = folder
+        return self.conn
+
+    def run(self, folder, fn):
+        """Run fn(conn) against the selected folder, reconnecting once on a dropped connection."""
+        for attempt in range(2):
+            try:
+                return fn(self.select(folder))
+            except (imaplib.IMAP4.abort, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def search(self, folder, criteria):
+        """UID SEARCH; returns a list of UIDs as bytes."""
+        def do(conn):
+            _, data = conn.uid("SEARCH", criteria)
+            return data[0].split() if data and data[0] else []
+        return self.run(folder, do)
+
+    def fetch(self, folder, uid_set, parts):
+        """UID FETCH; returns the raw imaplib response list."""
+        return self.run(folder, lambda conn: conn.uid("FETCH", uid_set, parts)[1])
+
+    def get_uidvalidity(self, folder):
+        self.run(folder, lambda conn: None)
+        return self.uidvalidity
+
+    def idle(self, folder="INBOX", timeout=None):
+        """
+        Block in IMAP IDLE until the server reports new mail or timeout expires.
+
+        Returns the list of untagged EXISTS/RECENT lines received (empty on
+        timeout). Always ends IDLE with DONE, so the session can be used for
+        normal commands afterwards.
+        """
+        timeout = timeout or IDLE_TIMEOUT
+        conn = self.select(folder)
+        tag = conn._new_tag()
+        conn.send(tag + b" IDLE\r\n")
+        line = conn.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+        events = []
+        deadline = time.monotonic() + timeout
+        try:
+            while not events:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not _has_buffered_input(conn):
+                    readable, _, _ = select.select([conn.sock], [], [], min(remaining, 60))
+                    if not readable:
+                        continue
+                line = conn.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                if line.startswith(b"*") and (b"EXISTS" in line or b"RECENT" in line):
+                    events.append(line.strip())
+        finally:
+            conn.send(b"DONE\r\n")
+            while True:
+                line = conn.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed ending IDLE")
+                if line.startswith(tag):
+                    break
+                if line.startswith(b"*") and b"EXISTS" in line:
+                    events.append(line.strip())
+        return events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _has_buffered_input(conn):
+    """
+    True when response data is already read but not yet consumed.
+
+    imaplib reads through a buffered file, so an untagged EXISTS that came
+    in the same packet as the "+ idling" continuation (or sits in the TLS
+    layer) is invisible to select() on the socket. Peek without blocking.
+    """
+    timeout = conn.sock.gettimeout()
+    conn.sock.settimeout(0)
+    try:
+        return bool(conn.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        conn.sock.settimeout(timeout)
+
+
+def _quote_mailbox(folder):
+    """imaplib sends mailbox names verbatim; names like "[Gmail]/All Mail" need quoting."""
+    if folder.startswith('"') or not re.search(r'[\s"()\[\]{}%*\\]', folder):
+        return folder
+    return '"' + folder.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+_session = None
+
+
+def get_session():
+    """Return the process-wide shared ImapSession."""
+    global _session
+    if _session is None:
+        _session = ImapSession()
+    return _session
+
+
+def close_session():
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
 
 
 def _decode_str(raw):
@@ -37,34 +248,6 @@ def _decode_str(raw):
     return " ".join(decoded).strip()
 
 
-def _extract_body(msg):
-    """Extract plain text body from email message."""
-    if msg.is_multipart():
-        for part in msg.walk():
-            ct = part.get_content_type()
-            cd = str(part.get("Content-Disposition", ""))
-            if ct == "text/plain" and "attachment" not in cd:
-                payload = part.get_payload(decode=True)
-                if payload:
-                    charset = part.get_content_charset() or "utf-8"
-                    return payload.decode(charset, errors="replace")
-        # Fallback to HTML
-        for part in msg.walk():
-            ct = part.get_content_type()
-            if ct == "text/html":
-                payload = part.get_payload(decode=True)
-                if payload:
-                    charset = part.get_content_charset() or "utf-8"
-                    html = payload.decode(charset, errors="replace")
-                    return re.sub(r"<[^>]+>", "", html).strip()
-    else:
-        payload = msg.get_payload(decode=True)
-        if payload:
-            charset = msg.get_content_charset() or "utf-8"
-            return payload.decode(charset, errors="replace")
-    return ""
-
-
 def _extract_company(from_addr, subject):
     """Guess company name from email domain or subject."""
     match = re.search(r"@([\w.-]+)", from_addr)
@@ -95,7 +278,143 @@ def _make_conversation_id(msg):
     return ""
 
 
-def fetch_emails(folder="INBOX", search_criteria="UNSEEN", limit=50):
+def _or_criteria(terms):
+    """Combine IMAP search keys with the prefix OR operator: OR a OR b c."""
+    if len(terms) == 1:
+        return terms[0]
+    return f"OR {terms[0]} {_or_criteria(terms[1:])}"
+
+
+def _from_criteria(addrs):
+    terms = [f'FROM "{a.replace(chr(34), "")}"' for a in addrs]
+    return f"({_or_criteria(terms)})"
+
+
+def _gmail_raw(query):
+    return f'X-GM-RAW "{query.replace(chr(34), "")}"'
+
+
+def _use_gmail_ext(session):
+    return GMAIL_THREAD_IDS and session.has_capability("X-GM-EXT-1")
+
+
+def _since_criteria(days):
+    from datetime import timedelta
+    since = (datetime.now() - timedelta(days=days)).strftime("%d-%b-%Y")
+    return f'(SINCE "{since}")'
+
+
+# Sources running in parallel share one state file
+_state_lock = threading.Lock()
+
+
+def load_sync_state(path=None):
+    try:
+        with open(path or IMAP_STATE_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_sync_state(state, path=None):
+    path = path or IMAP_STATE_PATH
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class SyncCheckpoint:
+    """
+    Progress of incremental fetches, committed as the consumer finishes rows.
+
+    fetch_new_iter registers the UIDs it is about to fetch; the consumer
+    calls settle(row, ok) once the row is synced or has failed. The saved
+    high-water mark only moves past settled UIDs, so a row still being
+    classified or synced when the run stops is fetched again. Failed rows
+    go on the source's retry list and are fetched first next time (served
+    from the raw store), up to IMAP_RETRY_MAX_ATTEMPTS runs each.
+    """
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.sources = {}
+        self.saved = {}
+
+    def begin(self, key, validity, last_uid, high, uids, retry):
+        with self.lock:
+            self.sources[key] = {
+                "uidvalidity": validity, "last_uid": last_uid, "high": high,
+                "pending": {int(u) for u in uids}, "retry": dict(retry),
+            }
+
+    def settle(self, row, ok=True):
+        """Record the outcome of a row from fetch_new_iter; other rows are ignored."""
+        if row.get("imap_key") is not None:
+            self._settle(row["imap_key"], [row["imap_uid"]], ok)
+
+    def skip(self, key, uids):
+        """UIDs that produced no row (filtered out or deleted) count as done."""
+        self._settle(key, uids, True)
+
+    def _settle(self, key, uids, ok):
+        with self.lock:
+            source = self.sources.get(key)
+            if source is None:
+                return
+            for uid in uids:
+                uid = int(uid)
+                if uid not in source["pending"]:
+                    continue
+                source["pending"].discard(uid)
+                attempts = source["retry"].pop(uid, 0) + 1
+                if ok:
+                    continue
+                if attempts < IMAP_RETRY_MAX_ATTEMPTS:
+                    source["retry"][uid] = attempts
+                else:
+                    print(f"[IMAP] Giving up on UID {uid} in {key} after {attempts} attempts")
+
+    def _entry(self, source):
+        last_uid = source["last_uid"]
+        fresh = [uid for uid in source["pending"] if uid > last_uid]
+        mark = min(fresh) - 1 if fresh else source["high"]
+        entry = {"uidvalidity": source["uidvalidity"], "last_uid": max(last_uid, mark)}
+        if source["retry"]:
+            entry["retry"] = {str(uid): n for uid, n in sorted(source["retry"].items())}
+        return entry
+
+    def save(self):
+        """Write the sources whose entry changed since the last save; cheap enough to call per row."""
+        with _state_lock, self.lock:
+            entries = {key: self._entry(source) for key, source in self.sources.items()}
+            changed = {key: entry for key, entry in entries.items() if self.saved.get(key) != entry}
+            if not changed:
+                return
+            # Re-read: other sources may have saved their marks meanwhile
+            state = load_sync_state(self.state_path)
+            state.update(changed)
+            save_sync_state(state, self.state_path)
+            self.saved.update(changed)
+
+
+def fetch_emails_iter(folder="INBOX", search_criteria="UNSEEN", limit=50, session=None, chunk_size=None, header_filter=None):
+    """
+    Generator form of fetch_emails: yields each row as soon as its message
+    is parsed, so downstream stages can start before the whole batch is
+    downloaded and memory stays bounded by one FETCH chunk.
+    """
+    session = session or get_session()
+    uids = session.search(folder, search_criteria)
+
+    if limit:
+        uids = uids[-limit:]
+
+    yield from _iter_uids(session, folder, uids, chunk_size, header_filter)
+
+
+def fetch_emails(folder="INBOX", search_criteria="UNSEEN", limit=50, session=None, chunk_size=None, header_filter=None):
     """
     Fetch emails from Gmail IMAP and return as list of dicts
     compatible with the email_to_notion pipeline.
@@ -103,82 +422,547 @@ def fetch_emails(folder="INBOX", search_criteria="UNSEEN", limit=50):
     Each dict has keys matching the expected schema:
     - message_id, conversation_id, from, subject, company,
       received_utc, body, llm_status
+
+    Uses the shared ImapSession unless one is passed in. Messages are
+    fetched chunk_size UIDs per FETCH (IMAP_FETCH_CHUNK, default 50).
+
+    With header_filter set (e.g. HeaderFilter()), only headers are fetched
+    first and just the text part of matching messages is downloaded.
     """
-    if not IMAP_USER or not IMAP_PASS:
-        raise ValueError("FROM_EMAIL and GMAIL_APP_PASSWORD required in .env")
+    return list(fetch_emails_iter(folder, search_criteria, limit, session, chunk_size, header_filter))
 
-    conn = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT)
-    conn.login(IMAP_USER, IMAP_PASS)
-    conn.select(folder, readonly=True)
 
-    _, data = conn.search(None, search_criteria)
-    uids = data[0].split()
+def _uid_set(uids):
+    """Compress UIDs into an IMAP sequence set, e.g. [1,2,3,7] -> "1:3,7"."""
+    nums = sorted({int(u) for u in uids})
+    ranges = []
+    for n in nums:
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+
+class _Literal(bytes):
+    """Marks a literal payload so it is never mistaken for an atom."""
+
+
+_FETCH_TOKEN = re.compile(
+    rb'\(|\)|"(?:[^"\\]|\\.)*"|(?:BODY|BINARY)(?:\.PEEK)?\[[^\]]*\](?:<\d+>)?|[^\s()"]+',
+    re.IGNORECASE,
+)
+
+
+def _fetch_tokens(data):
+    for item in data or []:
+        if isinstance(item, tuple):
+            head, literal = item
+            for tok in _FETCH_TOKEN.findall(re.sub(rb"\{\d+\}$", b"", head)):
+                yield tok
+            yield _Literal(literal)
+        elif isinstance(item, bytes):
+            for tok in _FETCH_TOKEN.findall(item):
+                yield tok
+
+
+def _read_value(tokens, i):
+    tok = tokens[i]
+    if isinstance(tok, _Literal):
+        return bytes(tok), i + 1
+    if tok == b"(":
+        out = []
+        i += 1
+        while i < len(tokens) and tokens[i] != b")":
+            val, i = _read_value(tokens, i)
+            out.append(val)
+        return out, i + 1
+    if tok.startswith(b'"'):
+        return re.sub(rb"\\(.)", rb"\1", tok[1:-1]).decode("utf-8", errors="replace"), i + 1
+    if tok.upper() == b"NIL":
+        return None, i + 1
+    return tok.decode("utf-8", errors="replace"), i + 1
+
+
+def _parse_fetch(data):
+    """
+    Parse an imaplib FETCH response into {UID: {ITEM: value}}.
+
+    Handles several messages per response, literals anywhere in the item
+    list, and nested lists such as BODYSTRUCTURE. Item names are
+    upper-cased with any .PEEK removed, e.g. "BODY[1]".
+    """
+    tokens = list(_fetch_tokens(data))
+    out = {}
+    i = 0
+    while i < len(tokens):
+        # "<seq> (" starts each message
+        if i + 1 < len(tokens) and tokens[i + 1] == b"(" and not isinstance(tokens[i], _Literal):
+            items, i = _read_value(tokens, i + 1)
+            fields = {}
+            for k in range(0, len(items) - 1, 2):
+                name = str(items[k]).upper().replace(".PEEK", "")
+                fields[name] = items[k + 1]
+            if "UID" in fields:
+                out[int(fields["UID"])] = fields
+        else:
+            i += 1
+    return out
+
+
+def _text_section(structure, prefix=""):
+    """
+    Find the IMAP section number of the best text part in a BODYSTRUCTURE.
+
+    Prefers text/plain over text/html and skips attachments. Returns
+    (section, subtype, encoding, charset) or None.
+    """
+    candidates = []
+
+    def walk(node, path):
+        if not isinstance(node, list) or not node:
+            return
+        if isinstance(node[0], list):
+            children = []
+            for c in node:
+                if not isinstance(c, list):
+                    break
+                children.append(c)
+            for n, child in enumerate(children, start=1):
+                walk(child, f"{path}.{n}" if path else str(n))
+            return
+        ctype = str(node[0] or "").lower()
+        subtype = str(node[1] or "").lower()
+        if ctype != "text" or subtype not in ("plain", "html"):
+            return
+        disposition = node[9] if len(node) > 9 else None
+        if isinstance(disposition, list) and str(disposition[0] or "").lower() == "attachment":
+            return
+        params = node[2] if isinstance(node[2], list) else []
+        charset = "utf-8"
+        for k in range(0, len(params) - 1, 2):
+            if str(params[k]).lower() == "charset" and params[k + 1]:
+                charset = params[k + 1]
+        encoding = str(node[5] or "7bit").lower()
+        candidates.append((path or "1", subtype, encoding, charset))
+
+    walk(structure, prefix)
+    for wanted in ("plain", "html"):
+        for cand in candidates:
+            if cand[1] == wanted:
+                return cand
+    return None
+
+
+def _message_to_row(msg, body=None):
+    """
+    Build a pipeline row dict from a parsed email.message.Message.
+
+    Pass body when only the headers were downloaded (two-phase fetch).
+    """
+    from_addr = _decode_str(msg.get("From", ""))
+    subject = _decode_str(msg.get("Subject", ""))
+    date_str = msg.get("Date", "")
+    message_id = msg.get("Message-ID", "")
+    if body is None:
+        body = extract_body(msg, BODY_MAX_CHARS)
+
+    # Parse date
+    try:
+        dt = email.utils.parsedate_to_datetime(date_str)
+        received_utc = dt.astimezone(timezone.utc).isoformat()
+    except Exception:
+        received_utc = datetime.now(timezone.utc).isoformat()
+
+    conversation_id = _make_conversation_id(msg)
+    company = _extract_company(from_addr, subject)
+
+    return {
+        "message_id": message_id.strip() if message_id else "",
+        "conversation_id": conversation_id,
+        "from": from_addr,
+        "subject": subject,
+        "company": company,
+        "received_utc": received_utc,
+        "body": body[:BODY_MAX_CHARS],
+        "llm_status": "NEW",
+        "error_msg": "",
+        "notion_page_id": "",
+        "stage": "",
+        "priority": "",
+        "next_action": "",
+        "summary": "",
+        "importance_score": "",
+    }
 
-    if limit:
-        uids = uids[-limit:]
 
-    rows = []
-    for uid in uids:
-        _, msg_data = conn.fetch(uid, "(RFC822)")
-        if not msg_data or not msg_data[0]:
+def _iter_uids(session, folder, uids, chunk_size=None, header_filter=None):
+    """
+    Fetch messages in UID-set chunks: one round trip per chunk instead of per message.
+
+    Messages already in the local raw store are parsed from there and
+    only the misses go over IMAP; fetched messages are added to the store.
+    """
+    chunk_size = chunk_size or FETCH_CHUNK_SIZE
+    gm_items = "X-GM-THRID X-GM-MSGID " if _use_gmail_ext(session) else ""
+    store = get_raw_store()
+    source = f"{session.user}:{folder}"
+    for start in range(0, len(uids), chunk_size):
+        chunk = uids[start:start + chunk_size]
+        if header_filter is not None:
+            yield from _iter_chunk_two_phase(session, folder, chunk, header_filter, gm_items)
             continue
+        cached = store.get_by_uid(source, session.uidvalidity, chunk) if store else {}
+        missing = [u for u in chunk if int(u) not in cached]
+        fetched = _parse_fetch(session.fetch(folder, _uid_set(missing), f"(UID {gm_items}RFC822)")) if missing else {}
+        for uid in chunk:
+            if int(uid) in cached:
+                raw, meta = cached[int(uid)]
+                row = _message_to_row(email.message_from_bytes(raw))
+                row["imap_uid"] = int(uid)
+                yield _set_gmail_ids(row, meta.get("thread_id"), meta.get("gm_msgid"))
+                continue
+            fields = fetched.get(int(uid), {})
+            raw = fields.get("RFC822")
+            if not raw:
+                continue
+            row = _apply_gmail_ids(_message_to_row(email.message_from_bytes(raw)), fields)
+            row["imap_uid"] = int(uid)
+            if store:
+                _store_raw(store, raw, row, fields, source, session.uidvalidity, int(uid))
+            yield row
 
-        raw = msg_data[0][1]
-        msg = email.message_from_bytes(raw)
 
-        from_addr = _decode_str(msg.get("From", ""))
-        subject = _decode_str(msg.get("Subject", ""))
-        date_str = msg.get("Date", "")
-        message_id = msg.get("Message-ID", "")
-        body = _extract_body(msg)
+def _store_raw(store, raw, row, fields, source, uidvalidity, uid):
+    store.put(
+        raw, row["message_id"], source, uidvalidity, uid,
+        thread_id=row["conversation_id"] if fields.get("X-GM-THRID") else None,
+        gm_msgid=row.get("gm_msgid"), received_utc=row["received_utc"],
+    )
 
-        # Parse date
-        try:
-            dt = email.utils.parsedate_to_datetime(date_str)
-            received_utc = dt.astimezone(timezone.utc).isoformat()
-        except Exception:
-            received_utc = datetime.now(timezone.utc).isoformat()
-
-        conversation_id = _make_conversation_id(msg)
-        company = _extract_company(from_addr, subject)
-
-        rows.append({
-            "message_id": message_id.strip() if message_id else "",
-            "conversation_id": conversation_id,
-            "from": from_addr,
-            "subject": subject,
-            "company": company,
-            "received_utc": received_utc,
-            "body": body[:5000],  # Truncate very long emails
-            "llm_status": "NEW",
-            "error_msg": "",
-            "notion_page_id": "",
-            "stage": "",
-            "priority": "",
-            "next_action": "",
-            "summary": "",
-            "importance_score": "",
-        })
-
-    conn.logout()
-    return rows
-
-
-def fetch_recent(days=7, limit=50):
+
+def _apply_gmail_ids(row, fields):
+    """
+    Use Gmail's server-side thread/message IDs when they were fetched.
+
+    conversation_id becomes the X-GM-THRID (hex, as in Gmail web URLs),
+    which survives header rewrites that break References-based hashing;
+    the hash is kept as legacy_conversation_id so sync_row can still find
+    pages created before.
+    message_id stays the RFC Message-ID so rows still de-duplicate across
+    accounts; the Gmail message ID is kept as gm_msgid and used for the
+    web link.
+    """
+    thrid = fields.get("X-GM-THRID")
+    msgid = fields.get("X-GM-MSGID")
+    return _set_gmail_ids(
+        row,
+        format(int(thrid), "x") if thrid else None,
+        format(int(msgid), "x") if msgid else None,
+    )
+
+
+def _set_gmail_ids(row, thread_id, gm_msgid):
+    if thread_id:
+        # Pages synced before thread IDs were used are keyed by the References hash
+        if row.get("conversation_id") and row["conversation_id"] != thread_id:
+            row["legacy_conversation_id"] = row["conversation_id"]
+        row["conversation_id"] = thread_id
+    if gm_msgid:
+        row["gm_msgid"] = gm_msgid
+        row["web_link"] = f"https://mail.google.com/mail/u/0/#all/{gm_msgid}"
+    return row
+
+
+def iter_cached_rows(since_utc=None):
+    """
+    Rebuild pipeline rows from the local raw store (no IMAP traffic), for
+    messages received at or after since_utc. Rows come back as NEW.
+    """
+    store = get_raw_store()
+    if store is None:
+        return
+    for raw, meta in store.iter_since(since_utc):
+        row = _message_to_row(email.message_from_bytes(raw))
+        yield _set_gmail_ids(row, meta.get("thread_id"), meta.get("gm_msgid"))
+
+
+# --- Two-phase fetch: headers first, text parts only for relevant mail ---
+
+HEADER_FIELDS = "FROM SUBJECT DATE MESSAGE-ID REFERENCES IN-REPLY-TO"
+# Upper bound on bytes downloaded per text part in phase two
+TEXT_PART_MAX_BYTES = int(os.getenv("IMAP_TEXT_PART_MAX_BYTES", "65536"))
+
+JOB_SUBJECT_KEYWORDS = (
+    "application", "applying", "interview", "offer", "position", "role",
+    "opportunity", "candidate", "candidacy", "recruit", "assessment",
+    "hiring", "next steps", "your background",
+)
+
+
+class HeaderFilter:
+    """
+    Relevance filter for the header-first fetch.
+
+    A message survives when it is under max_size (if set) and matches at
+    least one rule: sender domain, known conversation ID, or subject
+    keyword. With no rules configured, everything under the size cap
+    survives. Any callable taking the same info dict can be used instead.
+    """
+
+    def __init__(self, sender_domains=None, conversation_ids=None, subject_keywords=JOB_SUBJECT_KEYWORDS, max_size=None):
+        self.sender_domains = {d.lower().lstrip("@") for d in (sender_domains or [])}
+        self.conversation_ids = set(conversation_ids or [])
+        self.subject_keywords = [k.lower() for k in (subject_keywords or [])]
+        self.max_size = max_size
+
+    def __call__(self, info):
+        if self.max_size and info.get("size") and info["size"] > self.max_size:
+            return False
+        if not (self.sender_domains or self.conversation_ids or self.subject_keywords):
+            return True
+        domain = info.get("domain", "")
+        if domain and any(domain == d or domain.endswith("." + d) for d in self.sender_domains):
+            return True
+        if {info.get("conversation_id"), info.get("legacy_conversation_id")} & self.conversation_ids:
+            return True
+        subject = info.get("subject", "").lower()
+        return any(k in subject for k in self.subject_keywords)
+
+
+def _header_info(uid, msg, size):
+    from_addr = _decode_str(msg.get("From", ""))
+    match = re.search(r"@([\w.-]+)", from_addr)
+    return {
+        "uid": uid,
+        "from": from_addr,
+        "domain": match.group(1).lower() if match else "",
+        "subject": _decode_str(msg.get("Subject", "")),
+        "message_id": (msg.get("Message-ID") or "").strip(),
+        "conversation_id": _make_conversation_id(msg),
+        "size": int(size) if size else 0,
+    }
+
+
+def _header_bytes(fields):
+    """The header literal however the server spelled the item name, or None if it sent none."""
+    for name, value in fields.items():
+        if name.startswith("BODY[HEADER") and isinstance(value, bytes) and value.strip():
+            return value
+    return None
+
+
+def _partial_raw(msg, body):
+    """Stand-in raw message for the raw store: the fetched headers and the decoded text part."""
+    out = Message()
+    for name, value in msg.items():
+        out[name] = value
+    out.set_payload(body, "utf-8")
+    return out.as_bytes()
+
+
+def _iter_chunk_two_phase(session, folder, chunk, header_filter, gm_items=""):
+    """
+    Phase 1: headers + size + BODYSTRUCTURE for every UID in the chunk.
+    Phase 2: only the text part (capped at TEXT_PART_MAX_BYTES) of messages
+    that pass header_filter; attachments are never downloaded. A message
+    whose headers didn't come back is kept and fetched whole. Survivors go
+    to the raw store, so reclassify sees them (as headers plus text part).
+    """
+    fetched = _parse_fetch(session.fetch(
+        folder, _uid_set(chunk),
+        f"(UID {gm_items}RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])",
+    ))
+    survivors = []
+    whole = []
+    for uid in chunk:
+        fields = fetched.get(int(uid))
+        if not fields:
+            continue
+        headers = _header_bytes(fields)
+        if headers is None:
+            # Can't judge relevance without headers: keep it rather than skip it unseen
+            print(f"[IMAP] No headers for UID {uid} in {folder}; fetching it whole")
+            whole.append(int(uid))
+            survivors.append((int(uid), None, None, fields))
+            continue
+        msg = email.message_from_bytes(headers)
+        info = _header_info(int(uid), msg, fields.get("RFC822.SIZE"))
+        if fields.get("X-GM-THRID"):
+            info["legacy_conversation_id"] = info["conversation_id"]
+            info["conversation_id"] = format(int(fields["X-GM-THRID"]), "x")
+        if header_filter(info):
+            survivors.append((int(uid), msg, _text_section(fields.get("BODYSTRUCTURE")), fields))
+
+    # Survivors already in the raw store need no second round trip
+    store = get_raw_store()
+    cached = {}
+    if store:
+        for uid, msg, _, _ in survivors:
+            message_id = (msg.get("Message-ID") or "").strip() if msg is not None else ""
+            raw = store.get(message_id) if message_id else None
+            if raw:
+                cached[uid] = raw
+
+    # One FETCH per distinct section number (usually just "1" and "1.1")
+    bodies = {}
+    by_section = {}
+    for uid, _, part, _ in survivors:
+        if part and uid not in cached:
+            by_section.setdefault(part[0], []).append(uid)
+    for section, section_uids in by_section.items():
+        fetched = _parse_fetch(session.fetch(
+            folder, _uid_set(section_uids), f"(UID BODY.PEEK[{section}]<0.{TEXT_PART_MAX_BYTES}>)",
+        ))
+        for uid, fields in fetched.items():
+            for name, value in fields.items():
+                if name.startswith(f"BODY[{section}]") and isinstance(value, bytes):
+                    bodies[uid] = value
+
+    full = _parse_fetch(session.fetch(folder, _uid_set(whole), f"(UID {gm_items}RFC822)")) if whole else {}
+
+    source = f"{session.user}:{folder}"
+    for uid, msg, part, fields in survivors:
+        if uid in cached:
+            row = _apply_gmail_ids(_message_to_row(email.message_from_bytes(cached[uid])), fields)
+        elif msg is None:
+            raw = full.get(uid, {}).get("RFC822")
+            if not raw:
+                continue
+            row = _apply_gmail_ids(_message_to_row(email.message_from_bytes(raw)), fields)
+            if store:
+                _store_raw(store, raw, row, fields, source, session.uidvalidity, uid)
+        else:
+            body = ""
+            if part and uid in bodies:
+                _, subtype, encoding, charset = part
+                body = decode_section(bodies[uid], encoding, charset, subtype, BODY_MAX_CHARS)
+            row = _apply_gmail_ids(_message_to_row(msg, body=body), fields)
+            if store:
+                _store_raw(store, _partial_raw(msg, body), row, fields, source, session.uidvalidity, uid)
+        row["imap_uid"] = uid
+        yield row
+
+
+def _window_criteria(session, days):
+    """Last-N-days search: Gmail's newer_than: when available, else SINCE."""
+    if _use_gmail_ext(session):
+        return _gmail_raw(f"newer_than:{days}d")
+    return _since_criteria(days)
+
+
+def fetch_recent(days=7, limit=50, session=None):
     """Fetch emails from the last N days."""
-    from datetime import timedelta
-    since = (datetime.now() - timedelta(days=days)).strftime("%d-%b-%Y")
-    return fetch_emails(search_criteria=f'(SINCE "{since}")', limit=limit)
+    session = session or get_session()
+    return fetch_emails(search_criteria=_window_criteria(session, days), limit=limit, session=session)
+
+
+def fetch_new_iter(folder="INBOX", days=7, limit=50, session=None, state_path=None, chunk_size=None,
+                   header_filter=None, checkpoint=None, backfill=False):
+    """
+    Incremental fetch: only messages with UID above the persisted high-water mark.
+
+    Falls back to the SINCE window of `days` on first run or when the
+    folder's UIDVALIDITY changed. If more than `limit` new messages are
+    pending, the oldest are fetched first and the rest on later cycles.
+    Messages on the retry list (rows that failed last time) come first.
+    backfill=True searches the `days` window even when a mark exists; the
+    mark never moves back, so the next incremental run carries on as before.
+
+    Yields rows as they are parsed, tagged with imap_key/imap_uid. With a
+    `checkpoint` the caller settles each row and saves the state (see
+    SyncCheckpoint); without one, a row counts as done once the next one
+    is requested and the mark is saved when the generator is exhausted.
+    """
+    session = session or get_session()
+    own_checkpoint = checkpoint is None
+    checkpoint = checkpoint or SyncCheckpoint(state_path)
+    state = load_sync_state(state_path)
+    key = f"{session.user}:{folder}"
+    entry = state.get(key) or {}
+
+    validity = session.get_uidvalidity(folder)
+    last_uid = entry.get("last_uid", 0)
+    retry = {}
+
+    if entry and entry.get("uidvalidity") == validity:
+        retry = {int(uid): n for uid, n in (entry.get("retry") or {}).items()}
+    else:
+        last_uid = 0
+
+    if entry and entry.get("uidvalidity") == validity and not backfill:
+        # "n:*" always matches the highest UID, so filter out what we've seen
+        uids = [u for u in session.search(folder, f"UID {last_uid + 1}:*") if int(u) > last_uid]
+        if limit:
+            uids = uids[:limit]
+        high = max([last_uid] + [int(u) for u in uids])
+    else:
+        uids = session.search(folder, _window_criteria(session, days))
+        high = max([last_uid] + [int(u) for u in uids])
+        if limit:
+            uids = uids[-limit:]
+        # The window may cover retry UIDs; fetch those once, as retries
+        uids = [u for u in uids if int(u) not in retry]
+
+    retry_uids = [str(uid).encode() for uid in sorted(retry)]
+    if retry_uids:
+        print(f"[IMAP] Retrying {len(retry_uids)} message(s) in {key} that failed before")
+    checkpoint.begin(key, validity, last_uid, high, retry_uids + uids, retry)
+
+    chunk_size = chunk_size or FETCH_CHUNK_SIZE
+    for batch in (retry_uids, uids):
+        for start in range(0, len(batch), chunk_size):
+            chunk = batch[start:start + chunk_size]
+            produced = set()
+            for row in _iter_uids(session, folder, chunk, chunk_size, header_filter):
+                row["imap_key"] = key
+                produced.add(row["imap_uid"])
+                yield row
+                if own_checkpoint:
+                    checkpoint.settle(row)
+            checkpoint.skip(key, [u for u in chunk if int(u) not in produced])
+
+    if own_checkpoint:
+        checkpoint.save()
+
+
+def fetch_new(folder="INBOX", days=7, limit=50, session=None, state_path=None, chunk_size=None, header_filter=None):
+    """List form of fetch_new_iter; the mark is saved once every row is fetched."""
+    return list(fetch_new_iter(folder, days, limit, session, state_path, chunk_size, header_filter))
 
 
-def fetch_from_contacts(contact_emails, limit=100):
-    """Fetch emails from specific contact email addresses."""
+def fetch_from_contacts(contact_emails, limit=100, session=None, batch_size=None, days=None):
+    """
+    Fetch emails from specific contact email addresses, optionally only
+    from the last `days` days.
+
+    Addresses are combined into searches of batch_size addresses each, all
+    over one shared IMAP session; limit applies per search batch. On Gmail
+    each batch is one X-GM-RAW "from:(a OR b) newer_than:Nd" query,
+    elsewhere an OR FROM search.
+    """
     if not contact_emails:
         return []
 
+    session = session or get_session()
+    batch_size = batch_size or CONTACT_SEARCH_BATCH
+    addrs = [a.strip() for a in contact_emails if a and a.strip()]
+
+    gmail = _use_gmail_ext(session)
+
     all_rows = []
-    for addr in contact_emails:
-        rows = fetch_emails(search_criteria=f'(FROM "{addr}")', limit=limit)
+    for start in range(0, len(addrs), batch_size):
+        batch = addrs[start:start + batch_size]
+        if gmail:
+            query = "from:(" + " OR ".join(batch) + ")"
+            if days:
+                query += f" newer_than:{days}d"
+            criteria = _gmail_raw(query)
+        else:
+            criteria = _from_criteria(batch)
+            if days:
+                criteria = f"{_since_criteria(days)} {criteria}"
+        rows = fetch_emails(search_criteria=criteria, limit=limit, session=session)
         all_rows.extend(rows)
 
     # Deduplicate by message_id
@@ -191,3 +975,140 @@ def fetch_from_contacts(contact_emails, limit=100):
             unique.append(row)
 
     return unique
+
+
+def load_sources(spec=None):
+    """
+    Parse IMAP_SOURCES into a list of source dicts
+    {name, host, port, user, password, folder, ssl}.
+
+    IMAP_SOURCES is JSON, inline or a path to a .json file, e.g.
+      [{"user": "me@gmail.com", "password_env": "GMAIL_APP_PASSWORD",
+        "folders": ["INBOX", "[Gmail]/All Mail"]},
+       {"user": "jobs@alias.dev", "password_env": "ALIAS_APP_PASSWORD"}]
+    host/port/ssl default to IMAP_HOST/IMAP_PORT/IMAP_SSL, folders to INBOX.
+    Without IMAP_SOURCES the single FROM_EMAIL INBOX source is used.
+    """
+    spec = (IMAP_SOURCES if spec is None else spec).strip()
+    if not spec:
+        return [{"name": f"{IMAP_USER}:INBOX", "host": IMAP_HOST, "port": IMAP_PORT,
+                 "user": IMAP_USER, "password": IMAP_PASS, "folder": "INBOX", "ssl": IMAP_SSL}]
+    if not spec.startswith("["):
+        with open(spec) as f:
+            spec = f.read()
+
+    sources = []
+    for account in json.loads(spec):
+        user = account.get("user") or IMAP_USER
+        password = account.get("password")
+        if password is None:
+            password = os.getenv(account.get("password_env") or "GMAIL_APP_PASSWORD", "")
+        folders = account.get("folders") or [account.get("folder") or "INBOX"]
+        for folder in folders:
+            sources.append({
+                "name": f"{user}:{folder}",
+                "host": account.get("host") or IMAP_HOST,
+                "port": int(account.get("port") or IMAP_PORT),
+                "user": user,
+                "password": password,
+                "folder": folder,
+                "ssl": account.get("ssl", IMAP_SSL),
+            })
+    return sources
+
+
+# One long-lived connection per source, reused across push cycles
+_source_sessions = {}
+
+
+def _source_session(source):
+    session = _source_sessions.get(source["name"])
+    if session is None:
+        session = ImapSession(source["host"], source["port"], source["user"], source["password"], source["ssl"])
+        _source_sessions[source["name"]] = session
+    return session
+
+
+def close_source_sessions():
+    for session in _source_sessions.values():
+        session.close()
+    _source_sessions.clear()
+
+
+_DONE = object()
+
+
+def fetch_sources_iter(sources=None, days=7, limit=50, state_path=None, header_filter=None, max_workers=None,
+                       checkpoint=None, backfill=False):
+    """
+    Incremental fetch from every configured (account, folder) source at once.
+
+    Each source runs fetch_new_iter on its own connection in a worker
+    thread; rows are merged into one stream as they arrive and
+    de-duplicated by Message-ID (the same mail is often in INBOX and
+    "[Gmail]/All Mail", or delivered to more than one alias). `limit`
+    applies per source, as does backfill (see fetch_new_iter). A failing
+    source is logged and skipped.
+
+    Workers read ahead of the consumer, so a row handed out here may still
+    be in classification or sync for a while. With a `checkpoint` (see
+    SyncCheckpoint) nothing is committed until the caller settles the rows
+    it receives; dropped duplicates are settled here.
+    """
+    sources = load_sources() if sources is None else sources
+    if not sources:
+        return
+    max_workers = max_workers or IMAP_SOURCE_WORKERS
+    # Bounded so a fast source can't buffer a whole mailbox ahead of the consumer
+    rows = queue.Queue(maxsize=max(FETCH_CHUNK_SIZE, 1) * 2)
+    stop = threading.Event()
+
+    def worker(source):
+        try:
+            session = _source_session(source)
+            for row in fetch_new_iter(source["folder"], days, limit, session, state_path, header_filter=header_filter,
+                                      checkpoint=checkpoint, backfill=backfill):
+                if stop.is_set():
+                    return
+                row["source"] = source["name"]
+                rows.put(row)
+        except Exception as e:
+            print(f"[IMAP] Source {source['name']} failed: {e}")
+            _source_session(source).close()
+        finally:
+            rows.put(_DONE)
+
+    seen = set()
+    pending = len(sources)
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(sources)), thread_name_prefix="imap-source")
+    try:
+        for source in sources:
+            pool.submit(worker, source)
+        while pending:
+            row = rows.get()
+            if row is _DONE:
+                pending -= 1
+                continue
+            mid = row["message_id"]
+            if mid:
+                if mid in seen:
+                    if checkpoint is not None:
+                        checkpoint.settle(row)
+                    continue
+                seen.add(mid)
+            yield row
+    finally:
+        stop.set()
+        # Unblock workers waiting on a full queue if the consumer stopped early
+        while pending:
+            try:
+                if rows.get(timeout=0.1) is _DONE:
+                    pending -= 1
+            except queue.Empty:
+                pass
+        pool.shutdown(wait=True)
+
+
+def fetch_sources(sources=None, days=7, limit=50, state_path=None, header_filter=None, max_workers=None,
+                  checkpoint=None, backfill=False):
+    return list(fetch_sources_iter(sources, days, limit, state_path, header_filter, max_workers, checkpoint, backfill))
@@ -0,0 +1,169 @@
+"""
+LLM Batch Classification — asynchronous batch APIs for large backlogs.
+
+Instead of one synchronous request per email, all pending prompts are
+submitted as one provider batch (Anthropic Message Batches, or the
+OpenAI Batch API), polled until it ends, and the results are matched back
+to their emails by custom_id. Batches are billed at half price and do not
+count against the per-minute limits of the synchronous API.
+
+Results go through the same LLMResult validation and on-disk cache as
+direct calls. Point ANTHROPIC_BASE_URL / OPENAI_BASE_URL at
+fake_batch_server.py to run the whole flow offline.
+"""
+
+import io
+import json
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+import LLM
+from LLM import LLMResult, build_prompt, email_cache_key, PROMPT_VERSION
+from llm_cache import get_llm_cache
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+# Seconds between batch status checks
+BATCH_POLL_INTERVAL = float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+# Give up waiting after this long (batches expire after 24h)
+BATCH_TIMEOUT = float(os.getenv("LLM_BATCH_TIMEOUT_SECONDS", str(24 * 3600)))
+# Requests per submitted batch (Anthropic allows 100k, OpenAI 50k)
+BATCH_MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "10000"))
+
+
+def _wait(retrieve, done, poll_interval, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = retrieve()
+        if done(batch):
+            return batch
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"batch {batch.id} still running after {timeout:.0f}s")
+        time.sleep(poll_interval)
+
+
+def _run_anthropic(prompts, poll_interval, timeout):
+    # Polling a long batch should survive a blip; these calls aren't behind llm_resilience
+    client = LLM.get_client().with_options(max_retries=2)
+    batch = client.messages.batches.create(requests=[
+        {"custom_id": cid, "params": LLM.anthropic_params(prompt)} for cid, prompt in prompts
+    ])
+    print(f"[BATCH] Submitted {batch.id} ({len(prompts)} request(s))")
+
+    def retrieve():
+        b = client.messages.batches.retrieve(batch.id)
+        c = b.request_counts
+        print(f"[BATCH] {b.id}: {b.processing_status} "
+              f"(processing={c.processing}, succeeded={c.succeeded}, errored={c.errored})")
+        return b
+
+    _wait(retrieve, lambda b: b.processing_status == "ended", poll_interval, timeout)
+
+    results = {}
+    for entry in client.messages.batches.results(batch.id):
+        if entry.result.type == "succeeded":
+            LLM.record_anthropic_usage(entry.result.message.usage)
+            try:
+                results[entry.custom_id] = LLM.parse_anthropic_content(entry.result.message.content)
+            except Exception as e:
+                results[entry.custom_id] = e
+        elif entry.result.type == "errored":
+            error = getattr(entry.result.error, "error", None)
+            results[entry.custom_id] = RuntimeError(f"batch request errored: {getattr(error, 'message', error)}")
+        else:
+            results[entry.custom_id] = RuntimeError(f"batch request {entry.result.type}")
+    return results
+
+
+def _run_openai(prompts, poll_interval, timeout):
+    client = LLM.get_client().with_options(max_retries=2)
+    lines = "".join(
+        json.dumps({"custom_id": cid, "method": "POST", "url": "/v1/chat/completions",
+                    "body": LLM.openai_batch_body(prompt)}) + "\n"
+        for cid, prompt in prompts
+    )
+    upload = client.files.create(file=("classify.jsonl", io.BytesIO(lines.encode("utf-8"))), purpose="batch")
+    batch = client.batches.create(input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h")
+    print(f"[BATCH] Submitted {batch.id} ({len(prompts)} request(s))")
+
+    def retrieve():
+        b = client.batches.retrieve(batch.id)
+        c = b.request_counts
+        print(f"[BATCH] {b.id}: {b.status}" + (f" ({c.completed}/{c.total} done, {c.failed} failed)" if c else ""))
+        return b
+
+    final = _wait(retrieve, lambda b: b.status in ("completed", "failed", "expired", "cancelled"),
+                  poll_interval, timeout)
+
+    results = {}
+    for file_id in (final.output_file_id, final.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if entry.get("error") or response.get("status_code") != 200:
+                results[entry["custom_id"]] = RuntimeError(
+                    f"batch request failed: {entry.get('error') or response.get('body')}")
+                continue
+            LLM.record_openai_usage(response["body"].get("usage"))
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+                results[entry["custom_id"]] = LLMResult(**json.loads(content)).model_dump()
+            except Exception as e:
+                results[entry["custom_id"]] = e
+    return results
+
+
+def classify_batch(emails, poll_interval=None, timeout=None):
+    """
+    Classify many emails through the provider's batch API.
+
+    emails: list of dicts with from_, subject, company, received_utc, body (and optionally thread).
+    Returns a list in the same order holding the result dict or the
+    Exception for each email. Cached emails are answered without a request.
+    """
+    poll_interval = BATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+    timeout = BATCH_TIMEOUT if timeout is None else timeout
+    cache = get_llm_cache(PROMPT_VERSION)
+    out = [None] * len(emails)
+
+    # custom_id -> indexes: identical emails share one request
+    pending = {}
+    prompts = []
+    keys = {}
+    for i, e in enumerate(emails):
+        key = email_cache_key(**e)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                out[i] = cached
+                continue
+        # Provider custom_ids allow [A-Za-z0-9_-]{1,64}
+        cid = f"e-{key[:40]}"
+        if cid not in pending:
+            pending[cid] = []
+            keys[cid] = key
+            prompts.append((cid, build_prompt(**e)))
+        pending[cid].append(i)
+
+    if prompts:
+        print(f"[BATCH] {len(prompts)} email(s) to classify, {len(emails) - sum(map(len, pending.values()))} from cache")
+    run = _run_anthropic if LLM.LLM_PROVIDER == "anthropic" else _run_openai
+    for start in range(0, len(prompts), BATCH_MAX_REQUESTS):
+        chunk = prompts[start:start + BATCH_MAX_REQUESTS]
+        try:
+            results = run(chunk, poll_interval, timeout)
+        except Exception as e:
+            results = {cid: e for cid, _ in chunk}
+        for cid, _ in chunk:
+            result = results.get(cid, RuntimeError("no result returned for request"))
+            if cache is not None and not isinstance(result, Exception):
+                cache.put(keys[cid], LLM.LLM_PROVIDER, LLM.current_model(), result)
+            for i in pending[cid]:
+                out[i] = result
+    return out
@@ -0,0 +1,144 @@
+"""
+LLM Classification Cache — on-disk memo of classification results.
+
+The same email reaches the classifier more than once: after an Excel
+refresh resets llm_status, when fetch_from_contacts and fetch_recent both
+return it, or when it arrives through two mail sources. Results are stored
+in SQLite under a hash of the normalized email fields plus the provider,
+model and prompt/schema version, so a changed prompt or schema never
+serves a stale answer.
+
+Entries older than LLM_CACHE_MAX_AGE_DAYS or from an older version are
+dropped on open; beyond LLM_CACHE_MAX_ENTRIES the least recently used go.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+# Empty LLM_CACHE_PATH disables the cache
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(Path(__file__).parent / ".llm_cache.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_MAX_AGE_DAYS = int(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "90"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key          TEXT PRIMARY KEY,
+    version      TEXT NOT NULL,
+    provider     TEXT NOT NULL,
+    model        TEXT NOT NULL,
+    result       TEXT NOT NULL,
+    created_utc  TEXT NOT NULL,
+    accessed_utc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_utc);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def _normalize(text):
+    text = str(text or "").replace("_x000D_", "").replace("_x000A_", "\n")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _normalize_addr(from_):
+    match = re.search(r"[\w.+-]+@[\w.-]+", from_ or "")
+    return match.group(0).lower() if match else _normalize(from_).lower()
+
+
+def cache_key(version, provider, model, from_, subject, company, received_utc, body, thread=""):
+    """sha256 over everything that reaches the prompt, after whitespace/case normalization."""
+    parts = [
+        version, provider, model,
+        _normalize_addr(from_), _normalize(subject), _normalize(company).lower(),
+        _normalize(received_utc), _normalize(body),
+    ]
+    # Only present for the latest message of a thread; keys without it are unchanged
+    if _normalize(thread):
+        parts.append(_normalize(thread))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, version, path=None, max_entries=None, max_age_days=None):
+        self.version = version
+        self.path = path or LLM_CACHE_PATH
+        self.max_entries = LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_age_days = LLM_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._purge()
+
+    def close(self):
+        self.db.close()
+
+    def _purge(self):
+        """Drop entries from other prompt/schema versions and those past max age."""
+        with self.lock:
+            self.db.execute("DELETE FROM results WHERE version != ?", (self.version,))
+            if self.max_age_days:
+                cutoff = (datetime.now(timezone.utc) - timedelta(days=self.max_age_days)).replace(microsecond=0)
+                self.db.execute("DELETE FROM results WHERE created_utc < ?", (cutoff.isoformat(),))
+            self.db.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE results SET accessed_utc = ? WHERE key = ?", (_now(), key))
+            self.db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, provider, model, result):
+        now = _now()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results (key, version, provider, model, result, created_utc, accessed_utc) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, self.version, provider, model, json.dumps(result), now, now),
+            )
+            if self.max_entries:
+                count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                if count > self.max_entries:
+                    self.db.execute(
+                        "DELETE FROM results WHERE key IN "
+                        "(SELECT key FROM results ORDER BY accessed_utc LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {"entries": count, "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache(version):
+    """Process-wide LLMCache for this prompt/schema version, or None when LLM_CACHE_PATH is empty."""
+    global _cache
+    # Called from classification worker threads; create the instance once
+    with _cache_lock:
+        if _cache is None and LLM_CACHE_PATH:
+            _cache = LLMCache(version)
+    return _cache
@@ -0,0 +1,351 @@
+"""
+LLM Resilience — retries, hedging and provider failover around one call.
+
+call_with_failover runs a classification against each provider in
+preference order. Per provider, call_with_retries:
+  - acquires from the provider's RateLimiter before every attempt
+  - retries 408/409/429/5xx/529, timeouts and connection errors with
+    jittered exponential backoff, waiting at least the server's retry-after
+  - optionally (LLM_HEDGE=1) sends a duplicate request when the first has
+    not answered within the provider's observed p95 latency (time waiting
+    on the rate limiter doesn't count), and takes whichever answers first
+  - reports to a CircuitBreaker; after LLM_BREAKER_FAILURES consecutive
+    transient failures the provider is skipped for LLM_BREAKER_COOLDOWN_SECONDS
+    and calls go straight to the next provider; so do calls to a provider
+    with no API key (ProviderUnavailableError)
+
+Per-request timeouts are set on the SDK clients (LLM.get_client), whose own
+retries are disabled so only this layer retries. Successful latencies feed
+a LatencyHistogram per provider.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+from classify_engine import get_limiter, LLM_CONCURRENCY
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+# Also the longest retry-after honoured; a longer one fails over instead
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+# Successful calls observed before hedging starts, and the latency quantile that triggers it
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_QUANTILE = 0.95
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "60"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+# Errors that mean "this provider can't serve us right now", worth trying the other one
+FAILOVER_STATUS = RETRYABLE_STATUS | {401, 403}
+# SDK exception names, matched by name so neither SDK has to be imported here
+TRANSIENT_ERRORS = ("APITimeoutError", "APIConnectionError", "Timeout", "TimeoutException", "ConnectError")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.5, 1, 2, 4, 8, 16, 32, 64)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class ProviderUnavailableError(RuntimeError):
+    """The provider can't be called at all (e.g. no API key); fail over without retrying."""
+
+
+def is_retryable(e):
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(e, (TimeoutError, ConnectionError)) or any(
+        cls.__name__ in TRANSIENT_ERRORS for cls in type(e).__mro__)
+
+
+def should_fail_over(e):
+    if isinstance(e, (CircuitOpenError, ProviderUnavailableError)):
+        return True
+    status = getattr(e, "status_code", None)
+    return status in FAILOVER_STATUS if status is not None else is_retryable(e)
+
+
+def retry_after(e):
+    """Seconds the server asked us to wait (retry-after-ms / retry-after header), or None."""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            when = parsedate_to_datetime(value)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, server_delay=None):
+    """Full-jitter exponential backoff, but never shorter than the server's retry-after."""
+    cap = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    delay = random.uniform(0, cap)
+    if server_delay is not None:
+        delay = max(delay, server_delay + random.uniform(0, LLM_BACKOFF_BASE_SECONDS))
+    return delay
+
+
+def describe(e):
+    status = getattr(e, "status_code", None)
+    return f"{type(e).__name__}" + (f" {status}" if status is not None else "")
+
+
+class LatencyHistogram:
+    """Bucketed latency counts plus a window of recent samples for quantiles."""
+
+    def __init__(self, window=500):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.recent = deque(maxlen=window)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        i = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        with self.lock:
+            self.counts[i] += 1
+            self.recent.append(seconds)
+            self.total += 1
+            self.sum += seconds
+
+    def quantile(self, q, min_samples=1):
+        """q-quantile of the recent samples, or None with fewer than min_samples."""
+        with self.lock:
+            samples = sorted(self.recent)
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self):
+        with self.lock:
+            counts, total, total_s = list(self.counts), self.total, self.sum
+        labels = [f"<={b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        return {
+            "count": total,
+            "mean_s": total_s / total if total else 0.0,
+            "p50_s": self.quantile(0.5),
+            "p95_s": self.quantile(0.95),
+            "p99_s": self.quantile(0.99),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. While open, allow() is
+    False until `cooldown` has passed; then one probe call goes through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, threshold, cooldown):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        with self.lock:
+            return "closed" if self.opened_at is None else "open"
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: this caller probes, everyone else waits another cooldown
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                print(f"  [LLM] {self.name} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.threshold and self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"  [LLM] {self.name} circuit open after {self.failures} failures "
+                          f"(cooldown {self.cooldown:.0f}s)")
+                    stats.record("circuit_opens")
+                self.opened_at = time.monotonic()
+
+
+class ResilienceStats:
+    FIELDS = ("retries", "hedges", "hedge_wins", "failovers", "circuit_opens")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+
+    def record(self, field, n=1):
+        with self.lock:
+            self.totals[field] += n
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.totals)
+
+
+stats = ResilienceStats()
+
+_histograms = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+# Runs hedged attempts; each task is a single request, so it never waits on the pool itself
+_hedge_pool = ThreadPoolExecutor(max_workers=max(4, LLM_CONCURRENCY * 2), thread_name_prefix="hedge")
+
+
+def get_histogram(provider):
+    with _registry_lock:
+        return _histograms.setdefault(provider, LatencyHistogram())
+
+
+def get_breaker(provider):
+    with _registry_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(provider, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)
+        return breaker
+
+
+def _hedged(attempt, threshold, acquire):
+    """attempt() (already rate limited), plus a duplicate once it has run longer than threshold."""
+    first = _hedge_pool.submit(attempt)
+    done, _ = wait([first], timeout=threshold)
+    if done:
+        return first.result()
+    # The hedge is a request like any other; it may not answer the limiter's wait for us
+    acquire()
+    if first.done():
+        return first.result()
+    stats.record("hedges")
+    second = _hedge_pool.submit(attempt)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The slower request is left to finish on its own; its answer is dropped
+                if future is second:
+                    stats.record("hedge_wins")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_with_retries(provider, fn, tokens=0, max_retries=None):
+    """
+    fn() with rate limiting, retries, optional hedging and the provider's
+    circuit breaker. Raises CircuitOpenError when the circuit is open.
+    """
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    limiter = get_limiter(provider)
+    histogram = get_histogram(provider)
+    breaker = get_breaker(provider)
+
+    def attempt():
+        start = time.monotonic()
+        result = fn()
+        histogram.observe(time.monotonic() - start)
+        return result
+
+    for n in range(max_retries + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(f"{provider} circuit open")
+        threshold = histogram.quantile(HEDGE_QUANTILE, LLM_HEDGE_MIN_SAMPLES) if LLM_HEDGE else None
+        try:
+            # Before the hedge clock starts, so time spent throttled doesn't trigger a hedge
+            limiter.acquire(tokens)
+            result = _hedged(attempt, threshold, lambda: limiter.acquire(tokens)) if threshold else attempt()
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            breaker.record_failure()
+            server_delay = retry_after(e)
+            if n == max_retries or (server_delay or 0) > LLM_BACKOFF_MAX_SECONDS:
+                raise
+            delay = backoff_delay(n, server_delay)
+            stats.record("retries")
+            print(f"  [LLM] {provider} {describe(e)}; retry {n + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def call_with_failover(attempts, tokens=0):
+    """
+    attempts: [(provider, fn)] in preference order. Returns the first
+    provider's result that succeeds; non-transient errors (bad request,
+    invalid output) are raised without trying the next provider.
+    """
+    error = None
+    for provider, fn in attempts:
+        if error is not None:
+            stats.record("failovers")
+            if not isinstance(error, CircuitOpenError):
+                print(f"  [LLM] failing over to {provider} ({describe(error)})")
+        try:
+            return call_with_retries(provider, fn, tokens)
+        except Exception as e:
+            if not should_fail_over(e):
+                raise
+            error = e
+    raise error
+
+
+def snapshot():
+    """Counters plus per-provider latency histograms and circuit state."""
+    with _registry_lock:
+        providers = sorted(set(_histograms) | set(_breakers))
+    return {
+        **stats.snapshot(),
+        "providers": {
+            p: {**get_histogram(p).snapshot(), "circuit": get_breaker(p).state} for p in providers
+        },
+    }
+
+
+def report():
+    snap = snapshot()
+    lines = [f"[LLM] {snap['retries']} retries, {snap['hedges']} hedged ({snap['hedge_wins']} won by the hedge), "
+             f"{snap['failovers']} failovers, {snap['circuit_opens']} circuit opens"]
+    for provider, h in snap["providers"].items():
+        if not h["count"]:
+            continue
+        buckets = " ".join(f"{label}:{count}" for label, count in h["buckets"].items() if count)
+        lines.append(f"[LLM] {provider} latency n={h['count']} mean={h['mean_s']:.2f}s p50={h['p50_s']:.2f}s "
+                     f"p95={h['p95_s']:.2f}s p99={h['p99_s']:.2f}s circuit={h['circuit']} | {buckets}")
+    return "\n".join(lines)
@@ -8,23 +8,49 @@ Two directions:
 Usage:
   python main.py                  # Run full bidirectional cycle
   python main.py push             # Email → Notion only
+  python main.py push --prefilter # Download bodies only for job-related headers
+  python main.py push --batch --backfill --days=365 --limit=0   # Backfill through the provider batch API
+  python main.py push --multi     # Several emails per LLM request
   python main.py pull             # Notion → Email only
   python main.py loop             # Continuous bidirectional loop
   python main.py loop --interval=120
+  python main.py watch            # Push on new mail via IMAP IDLE, pull every interval
+  python main.py watch --interval=120
+  python main.py reclassify --since=2026-01-01   # Re-run LLM on locally cached mail
+  python main.py reclassify --since=2026-01-01 --no-sync
   python main.py excel            # Original Excel-based flow
+  python main.py mirror verify    # Compare the local Notion mirror with Notion (--repair fixes drift)
+  python main.py mirror rebuild   # Re-list the Notion database into the mirror
+  python main.py check-startup    # Verify startup loads no LLM SDK and needs no API key
 """
 
+import os
+import queue
+import subprocess
 import sys
+import threading
 import time
+from itertools import islice
+from pathlib import Path
 import pandas as pd
 from datetime import datetime, timezone
 
 from schema_converter import schema_converter
-from LLM import build_prompt, call_llm_structured
-from notion_sync.runner import sync_excel_rows, sync_dict_rows
+from LLM import LLMResult, classify_email, classify_emails, cache_stats, usage as llm_usage
+from LLM import LLM_MULTI_EMAIL, MULTI_MAX_ITEMS
+import rule_classifier
+import llm_resilience
+from condense import condense, condense_row, stats as condense_stats
+from thread_state import get_thread_state, digest as thread_digest, LLM_THREAD_AWARE, THREAD_WINDOW
+from thread_state import THREAD_WAIT_SECONDS, THREAD_IDLE_SECONDS
+from notion_sync.runner import sync_excel_rows, iter_sync_dict_rows, mirror_command, known_threads
 from notion_sync.excel_io import write_back_excel
-from gmail_source import fetch_recent, fetch_from_contacts
+from notion_sync import writer as notion_writer
+from gmail_source import fetch_sources_iter, fetch_from_contacts, iter_cached_rows, HeaderFilter, get_session, IDLE_TIMEOUT
+from gmail_source import SyncCheckpoint
 from notion_trigger import run_trigger_cycle
+from classify_engine import map_ordered, LLM_CONCURRENCY
+from llm_batch import classify_batch
 
 # Legacy Excel source
 from local_copy_manager import copy_and_merge_to_local, get_local_copy_path
@@ -35,84 +61,509 @@ LOCAL_XLSX = get_local_copy_path(ONEDRIVE_XLSX)
 
 # --- LLM Classification ---
 
-def classify_rows(rows):
-    """Run LLM classification on a list of dict rows. Returns classified rows."""
-    classified = []
-    for i, row in enumerate(rows):
-        if row.get("llm_status", "").upper() not in ("", "NEW"):
-            classified.append(row)
-            continue
+ALLOWED_NEXT_ACTION = {
+    "reply", "schedule", "submit_materials", "complete_assessment",
+    "sign_offer", "follow_up", "archive", "ignore", "escalate",
+}
 
-        try:
-            prompt = build_prompt(
-                from_=row.get("from", ""),
-                subject=row.get("subject", ""),
-                company=row.get("company", ""),
-                received_utc=row.get("received_utc", ""),
-                body=row.get("body", ""),
-            )
-
-            llm_output = call_llm_structured(prompt)
-
-            allowed_next_action = {
-                "reply", "schedule", "submit_materials", "complete_assessment",
-                "sign_offer", "follow_up", "archive", "ignore", "escalate",
-            }
-            if llm_output.get("next_action") not in allowed_next_action:
-                raise ValueError(f"next_action invalid: {llm_output.get('next_action')}")
-
-            row_copy = dict(row)
-            for k, v in llm_output.items():
-                row_copy[k] = v
-            row_copy["llm_status"] = "DONE"
-            row_copy["llm_processed_utc"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
-            row_copy["error_msg"] = ""
-            classified.append(row_copy)
-
-            print(f"  [{i+1}] {row.get('company', '?')} → stage={llm_output.get('stage')}, action={llm_output.get('next_action')}")
 
+def _needs_llm(row):
+    return str(row.get("llm_status", "") or "").strip().upper() in ("", "NEW")
+
+
+def _email_fields(row):
+    body = row.get("prompt_body")
+    if body is None:
+        body = condense(row.get("body", "")).text
+    return {
+        "from_": row.get("from", ""),
+        "subject": row.get("subject", ""),
+        "company": row.get("company", ""),
+        "received_utc": row.get("received_utc", ""),
+        "body": body,
+        "thread": row.get("thread_digest", ""),
+    }
+
+
+def _rule_result(fields):
+    """
+    Run the rule fast path. Returns (result, match): result is the rule's
+    LLMResult when it can replace the LLM call, match is kept for shadow mode.
+    """
+    if rule_classifier.RULES_MODE == "off":
+        return None, None
+    match = rule_classifier.classify(fields["from_"], fields["subject"], fields["company"], fields["body"])
+    if match is None:
+        return None, None
+    name, result, confidence = match
+    used = rule_classifier.RULES_MODE == "on" and confidence >= rule_classifier.RULES_MIN_CONFIDENCE
+    rule_classifier.stats.record_hit(name, used)
+    return (LLMResult(**result).model_dump() if used else None), match
+
+
+def _check_shadow(match, llm_output, fields):
+    if match is None or rule_classifier.RULES_MODE != "shadow":
+        return
+    name, result, confidence = match
+    if not rule_classifier.stats.record_shadow(name, result, llm_output):
+        print(f"  [RULES] shadow mismatch {name} ({confidence:.2f}) on {fields['subject'][:60]!r}: "
+              f"rule={result['stage']}/{result['next_action']} llm={llm_output.get('stage')}/{llm_output.get('next_action')}")
+
+
+def _classify_one(row):
+    """Classify one row (rules, then the cache, then the LLM) and validate the result."""
+    fields = _email_fields(row)
+    rule_output, match = _rule_result(fields)
+    if rule_output is not None:
+        return rule_output
+
+    llm_output = classify_email(**fields)
+    _check_shadow(match, llm_output, fields)
+    if llm_output.get("next_action") not in ALLOWED_NEXT_ACTION:
+        raise ValueError(f"next_action invalid: {llm_output.get('next_action')}")
+    return llm_output
+
+
+def _finish_row(i, row, llm_output, error):
+    """Copy a row with its classification (or error) applied and log it."""
+    row_copy = dict(row)
+    row_copy.pop("prompt_body", None)
+    row_copy.pop("thread_digest", None)
+    row_copy["llm_processed_utc"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    if error is not None:
+        row_copy["llm_status"] = "ERROR"
+        row_copy["error_msg"] = str(error)
+        print(f"  [{i+1}] {row.get('company', '?')} → ERROR: {error}")
+        return row_copy
+
+    for k, v in llm_output.items():
+        row_copy[k] = v
+    row_copy["llm_status"] = "DONE"
+    row_copy["error_msg"] = ""
+    store = get_thread_state() if LLM_THREAD_AWARE else None
+    if store is not None:
+        store.record(row_copy, covered=row.get("thread_covers", 1))
+
+    saved = f", {row['body_tokens_saved']} body tokens saved" if row.get("body_tokens_saved") else ""
+    thread = f", latest of {row['thread_covers']} in thread" if row.get("thread_covers", 1) > 1 else ""
+    print(f"  [{i+1}] {row.get('company', '?')} → stage={llm_output.get('stage')}, "
+          f"action={llm_output.get('next_action')}{saved}{thread}")
+    return row_copy
+
+
+def _earlier_entries(rows):
+    """thread_earlier entries: what the page needs of each superseded message."""
+    return [{k: r.get(k, "") for k in ("received_utc", "from", "subject", "message_id", "body")} for r in rows]
+
+
+def _windows(rows):
+    """
+    Group rows into lists for _collapse_threads. A window closes at
+    THREAD_WINDOW rows, THREAD_WAIT_SECONDS after its first row, or when no
+    row arrives for THREAD_IDLE_SECONDS. A reader thread pulls from rows so
+    the timeouts hold while the source is blocked.
+    """
+    ready = queue.Queue(maxsize=max(THREAD_WINDOW, 1))
+    stop = threading.Event()
+    end = object()
+    failure = []
+
+    def read():
+        try:
+            for row in rows:
+                ready.put(row)
+                if stop.is_set():
+                    return
         except Exception as e:
-            row_copy = dict(row)
-            row_copy["llm_status"] = "ERROR"
-            row_copy["llm_processed_utc"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
-            row_copy["error_msg"] = str(e)
-            classified.append(row_copy)
-            print(f"  [{i+1}] {row.get('company', '?')} → ERROR: {e}")
+            failure.append(e)
+        finally:
+            close = getattr(rows, "close", None)
+            if close is not None:
+                close()
+            ready.put(end)
+
+    reader = threading.Thread(target=read, name="thread-window", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is end:
+                break
+            window = [item]
+            deadline = time.monotonic() + THREAD_WAIT_SECONDS
+            while len(window) < THREAD_WINDOW:
+                timeout = min(THREAD_IDLE_SECONDS, deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+                try:
+                    item = ready.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is end:
+                    break
+                window.append(item)
+            yield window
+            if item is end:
+                break
+        if failure:
+            raise failure[0]
+    finally:
+        stop.set()
+        # Unblock the reader if the consumer stopped early
+        while reader.is_alive():
+            try:
+                ready.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def _collapse_threads(rows):
+    """
+    Leave only the latest message of each conversation_id for the LLM.
+
+    Rows are grouped into windows (see _windows). Within a window, older
+    messages of a thread come out as SUPERSEDED (kept, but neither
+    classified nor synced themselves), right after the thread's latest;
+    the latest carries thread_digest, built from the thread's stored state
+    and the skipped messages, and thread_earlier, whose bodies are
+    appended to its Notion page with its own.
+    """
+    store = get_thread_state()
+    for chunk in _windows(rows):
+        threads = {}
+        for j, row in enumerate(chunk):
+            if _needs_llm(row) and row.get("conversation_id"):
+                threads.setdefault(row["conversation_id"], []).append(j)
+        followers = {}
+        for conversation_id, members in threads.items():
+            members.sort(key=lambda j: str(chunk[j].get("received_utc") or ""))
+            *older, latest = members
+            earlier = [chunk[j] for j in older]
+            previous = store.get(conversation_id) if store is not None else None
+            if previous and previous["last_message_id"] == chunk[latest].get("message_id"):
+                # Reclassifying the message the state came from: don't feed it its own old answer
+                previous = None
+            row = dict(chunk[latest])
+            row["thread_digest"] = thread_digest(previous, earlier)
+            if older:
+                row["thread_covers"] = len(members)
+                row["thread_earlier"] = _earlier_entries(earlier)
+            chunk[latest] = row
+            for j in older:
+                chunk[j] = dict(chunk[j], llm_status="SUPERSEDED", superseded_by=row.get("message_id", ""))
+            followers[latest] = older
+        skipped = {j for older in followers.values() for j in older}
+        for j, row in enumerate(chunk):
+            if j in skipped:
+                continue
+            yield row
+            for k in followers.get(j, ()):
+                yield chunk[k]
+
+
+def _fall_back_on_errors(rows):
+    """
+    When the latest message of a collapsed thread fails to classify,
+    classify the next newest one instead, so the thread still gets a
+    result (and its page the earlier bodies) this run.
+
+    Expects _collapse_threads order: the superseded messages follow their
+    latest. The fallback comes out first, then the failed latest without
+    thread_earlier (retried next run), then the older messages, now
+    superseded by the fallback. A failed fallback is not retried here.
+    """
+    store = get_thread_state()
+    rows = iter(rows)
+    i = 0
+    for row in rows:
+        covers = row.get("thread_covers", 1)
+        if row.get("llm_status") != "ERROR" or covers <= 1:
+            yield row
+            i += 1
+            continue
+        siblings = list(islice(rows, covers - 1))
+        if len(siblings) != covers - 1 or any(s.get("superseded_by") != row.get("message_id") for s in siblings):
+            yield row
+            yield from siblings
+            i += 1 + len(siblings)
+            continue
+        *older, fallback = siblings
+        conversation_id = row.get("conversation_id")
+        previous = store.get(conversation_id) if store is not None else None
+        if previous and previous["last_message_id"] == fallback.get("message_id"):
+            previous = None
+        candidate = {k: v for k, v in fallback.items() if k not in ("llm_status", "superseded_by")}
+        candidate["thread_digest"] = thread_digest(previous, older)
+        if older:
+            candidate["thread_covers"] = len(siblings)
+            candidate["thread_earlier"] = _earlier_entries(older)
+        candidate = condense_row(candidate)
+        print(f"  [THREAD] latest message of {conversation_id} failed; classifying the one before it")
+        try:
+            output, error = _classify_one(candidate), None
+        except Exception as e:
+            output, error = None, e
+        done = _finish_row(i + covers - 1, candidate, output, error)
+        yield done
+        yield {k: v for k, v in row.items() if k not in ("thread_covers", "thread_earlier")}
+        for earlier in older:
+            yield dict(earlier, superseded_by=done.get("message_id", ""))
+        i += covers
+
+
+def iter_classify_rows(rows, concurrency=None, multi=None):
+    """
+    Run LLM classification over any iterable of dict rows, yielding each row
+    as it is classified.
+
+    Up to `concurrency` (LLM_CONCURRENCY) calls run in parallel; rows still
+    come out in input order. multi=True (default LLM_MULTI_EMAIL) packs
+    several emails into each LLM request. With LLM_THREAD_AWARE only the
+    latest message of each thread is classified (see _collapse_threads),
+    or the one before it when the latest fails (_fall_back_on_errors).
+    """
+    if LLM_THREAD_AWARE:
+        rows = _collapse_threads(rows)
+    rows = (condense_row(row) if _needs_llm(row) else row for row in rows)
+    if LLM_MULTI_EMAIL if multi is None else multi:
+        classified = _iter_classify_multi(rows, concurrency)
+    else:
+        work = lambda row: _classify_one(row) if _needs_llm(row) else None
+        classified = (_finish_row(i, row, llm_output, error) if _needs_llm(row) else row
+                      for i, (row, llm_output, error) in enumerate(map_ordered(work, rows, concurrency)))
+    yield from _fall_back_on_errors(classified) if LLM_THREAD_AWARE else classified
+
 
-    return classified
+def _iter_classify_multi(rows, concurrency=None):
+    """Multi-email variant: rows are read in windows so each window can fill several requests."""
+    rows = iter(rows)
+    window = MULTI_MAX_ITEMS * (concurrency or LLM_CONCURRENCY)
+    offset = 0
+    while True:
+        chunk = list(islice(rows, window))
+        if not chunk:
+            return
+        outputs = {}
+        todo = []
+        for j, row in enumerate(chunk):
+            if not _needs_llm(row):
+                continue
+            fields = _email_fields(row)
+            rule_output, match = _rule_result(fields)
+            if rule_output is not None:
+                outputs[j] = (rule_output, None)
+            else:
+                todo.append((j, fields, match))
+
+        results = classify_emails([fields for _, fields, _ in todo], concurrency)
+        for (j, fields, match), result in zip(todo, results):
+            if isinstance(result, Exception):
+                outputs[j] = (None, result)
+                continue
+            _check_shadow(match, result, fields)
+            if result.get("next_action") not in ALLOWED_NEXT_ACTION:
+                outputs[j] = (None, ValueError(f"next_action invalid: {result.get('next_action')}"))
+            else:
+                outputs[j] = (result, None)
+
+        for j, row in enumerate(chunk):
+            yield _finish_row(offset + j, row, *outputs[j]) if _needs_llm(row) else row
+        offset += len(chunk)
+
+
+def classify_rows(rows, multi=None):
+    """Run LLM classification on a list of dict rows. Returns classified rows."""
+    return list(iter_classify_rows(rows, multi=multi))
+
+
+def classify_rows_batch(rows):
+    """
+    Classify rows through the provider's batch API (see llm_batch). Waits
+    for the whole batch, so it suits backfills rather than the live loop.
+    """
+    if LLM_THREAD_AWARE:
+        rows = _collapse_threads(rows)
+    rows = [condense_row(row) if _needs_llm(row) else row for row in rows]
+    pending = []
+    matches = {}
+    for i, row in enumerate(rows):
+        if not _needs_llm(row):
+            continue
+        rule_output, matches[i] = _rule_result(_email_fields(row))
+        if rule_output is not None:
+            rows[i] = _finish_row(i, row, rule_output, None)
+        else:
+            pending.append(i)
+
+    results = classify_batch([_email_fields(rows[i]) for i in pending])
+    for i, result in zip(pending, results):
+        error = result if isinstance(result, Exception) else None
+        if error is None:
+            _check_shadow(matches[i], result, _email_fields(rows[i]))
+            if result.get("next_action") not in ALLOWED_NEXT_ACTION:
+                error = ValueError(f"next_action invalid: {result.get('next_action')}")
+        rows[i] = _finish_row(i, rows[i], result, error)
+    return list(_fall_back_on_errors(rows)) if LLM_THREAD_AWARE else rows
 
 
 # --- PUSH: Email → Notion ---
 
-def run_push(days=7, limit=50):
+def _prefilter():
+    """
+    HeaderFilter for push --prefilter: job keywords in the subject, plus
+    any thread or sender domain already in Notion or the thread state, so
+    a reply with a neutral subject in a tracked thread still gets through.
+    """
+    conversation_ids, domains = known_threads()
+    store = get_thread_state()
+    if store is not None:
+        conversation_ids |= store.conversation_ids()
+    print(f"[PUSH] Prefilter: {len(conversation_ids)} known thread(s), {len(domains)} sender domain(s)")
+    return HeaderFilter(sender_domains=domains, conversation_ids=conversation_ids)
+
+
+def run_push(days=7, limit=50, header_filter=None, batch=False, multi=None, backfill=False):
     """
     PUSH direction: Gmail → LLM → Notion
 
-    1. Fetch recent emails from Gmail IMAP
+    header_filter enables the header-first fetch: only messages it accepts
+    have their text part downloaded (see gmail_source.HeaderFilter).
+    batch=True classifies everything fetched in one provider batch instead
+    of streaming rows through synchronous calls; multi=True sends several
+    emails per synchronous request. backfill=True fetches the whole `days`
+    window even when the sources already have a high-water mark.
+
+    1. Fetch new emails from every IMAP source in IMAP_SOURCES, in
+       parallel (since the last seen UID, or the last `days` days on
+       first run), de-duplicated by Message-ID
     2. Classify with LLM
     3. Sync to Notion database
-    """
-    print("[PUSH] Fetching emails from Gmail IMAP...")
-    rows = fetch_recent(days=days, limit=limit)
 
-    if not rows:
+    The IMAP high-water mark only moves past messages that were classified
+    and synced, and is saved after each row, so an interrupted run resumes
+    after the last synced row; failed ones are fetched again next run
+    (SyncCheckpoint).
+    """
+    print("[PUSH] Streaming Gmail IMAP → LLM → Notion...")
+    stats = {"fetched": 0, "done": 0, "errors": 0, "superseded": 0, "synced": 0}
+    cache_before = cache_stats()
+    usage_before = llm_usage.snapshot()
+    condense_before = condense_stats.snapshot()
+    updates_before = notion_writer.snapshot().get("pages.update", {})
+    checkpoint = SyncCheckpoint()
+    # Rows whose classification failed; the sync overwrites llm_status, so note them here
+    failed = set()
+    # Outcome of each thread's latest message, and SUPERSEDED rows waiting for it
+    outcomes = {}
+    held = {}
+
+    def counted_fetch():
+        for row in fetch_sources_iter(days=days, limit=limit, header_filter=header_filter,
+                                      checkpoint=checkpoint, backfill=backfill):
+            stats["fetched"] += 1
+            yield row
+
+    def counted_classify(rows):
+        classified = classify_rows_batch(rows) if batch else iter_classify_rows(rows, multi=multi)
+        for row in classified:
+            if row.get("llm_status") == "DONE":
+                stats["done"] += 1
+            elif row.get("llm_status") == "ERROR":
+                stats["errors"] += 1
+                failed.add((row.get("imap_key"), row.get("imap_uid")))
+            elif row.get("llm_status") == "SUPERSEDED":
+                stats["superseded"] += 1
+            yield row
+
+    def settle(row):
+        """Tell the checkpoint whether a row made it to Notion; superseded rows share their latest's fate."""
+        if row.get("llm_status") == "SUPERSEDED":
+            latest = row.get("superseded_by")
+            if latest in outcomes:
+                checkpoint.settle(row, outcomes[latest])
+            else:
+                held.setdefault(latest, []).append(row)
+            return
+        ok = row.get("llm_status") == "DONE" and (row.get("imap_key"), row.get("imap_uid")) not in failed
+        outcomes[row.get("message_id")] = ok
+        checkpoint.settle(row, ok)
+        for earlier in held.pop(row.get("message_id"), []):
+            checkpoint.settle(earlier, ok)
+
+    # Rows flow through one at a time; nothing holds the whole batch
+    try:
+        for result in iter_sync_dict_rows(counted_classify(counted_fetch()), debug=True):
+            if result.get("llm_status") == "DONE":
+                stats["synced"] += 1
+            settle(result)
+            # Commit from this side: fetch reads ahead of classification and sync
+            checkpoint.save()
+    finally:
+        checkpoint.save()
+
+    if not stats["fetched"]:
         print("[PUSH] No new emails found.")
         return None
 
-    print(f"[PUSH] Found {len(rows)} email(s)")
-
-    print("[PUSH] Running LLM classification...")
-    classified = classify_rows(rows)
-    done = sum(1 for r in classified if r.get("llm_status") == "DONE")
-    errors = sum(1 for r in classified if r.get("llm_status") == "ERROR")
-    print(f"[PUSH] LLM done: {done} classified, {errors} errors")
+    print(f"[PUSH] Found {stats['fetched']} email(s)")
+    print(f"[PUSH] LLM done: {stats['done']} classified, {stats['errors']} errors, "
+          f"{stats['superseded']} superseded by a later message in their thread")
+    if rule_classifier.stats.evaluated:
+        print(rule_classifier.stats.report())
+    if cache_before is not None:
+        cache_after = cache_stats()
+        stats["cache_hits"] = cache_after["hits"] - cache_before["hits"]
+        stats["cache_misses"] = cache_after["misses"] - cache_before["misses"]
+        print(f"[PUSH] LLM cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses")
+    condense_after = condense_stats.snapshot()
+    before = condense_after["tokens_before"] - condense_before["tokens_before"]
+    after = condense_after["tokens_after"] - condense_before["tokens_after"]
+    if before:
+        stats["body_tokens_saved"] = before - after
+        print(f"[PUSH] Bodies condensed: {before} → {after} tokens ({before - after} saved)")
+    usage_after = llm_usage.snapshot()
+    stats["usage"] = {k: usage_after[k] - usage_before[k] for k in usage_after}
+    if stats["usage"]["calls"]:
+        print(f"[PUSH] LLM usage: {llm_usage.summary(stats['usage'])}")
+        # Cumulative for the process, so loop/watch show the long-run latency distribution
+        print(llm_resilience.report())
+    stats["llm_resilience"] = llm_resilience.snapshot()
+    print(f"[PUSH] Notion sync done: {stats['synced']} synced")
+    stats["notion_api"] = notion_writer.snapshot()
+    updates_after = stats["notion_api"].get("pages.update", {})
+    stats["notion_updates"] = {
+        "sent": int(updates_after.get("calls", 0) - updates_after.get("retries", 0)
+                    - updates_before.get("calls", 0) + updates_before.get("retries", 0)),
+        "skipped": int(updates_after.get("skipped", 0) - updates_before.get("skipped", 0)),
+    }
+    if any(stats["notion_updates"].values()):
+        print(f"[PUSH] Notion page updates: {stats['notion_updates']['sent']} sent, "
+              f"{stats['notion_updates']['skipped']} skipped (no property changes)")
+    if stats["synced"] and stats["notion_api"]:
+        # Cumulative for the process, like the LLM latency report
+        print(notion_writer.report())
+
+    return stats
+
+
+def run_reclassify(since=None, sync=True):
+    """
+    Replay messages from the local raw store through the classifier, e.g.
+    after a prompt or schema change. Makes no IMAP connection; with
+    sync=True the new results are written to Notion as usual.
+    """
+    print(f"[RECLASSIFY] Replaying cached emails since {since or 'the beginning'}...")
+    classified = iter_classify_rows(iter_cached_rows(since))
+    results = iter_sync_dict_rows(classified, debug=True) if sync else classified
 
-    print("[PUSH] Syncing to Notion...")
-    results = sync_dict_rows(classified, debug=True)
-    synced = sum(1 for r in results if r.get("llm_status") == "DONE")
-    print(f"[PUSH] Notion sync done: {synced} synced")
+    total = done = 0
+    for row in results:
+        total += 1
+        if row.get("llm_status") == "DONE":
+            done += 1
 
-    return results
+    print(f"[RECLASSIFY] Done: {done}/{total} row(s) {'synced' if sync else 'classified'}")
+    return {"total": total, "done": done}
 
 
 # --- PULL: Notion → Email ---
@@ -176,6 +627,43 @@ def run_loop(interval=120):
         time.sleep(interval)
 
 
+def run_watch(interval=120, folder="INBOX"):
+    """
+    Event-driven loop: hold an IMAP IDLE connection and run PUSH as soon as
+    the server reports new mail. PULL still runs at least every `interval`
+    seconds, and IDLE is re-issued at that cadence (always below the
+    server's ~30 min IDLE timeout). Falls back to run_loop polling when the
+    server does not advertise IDLE.
+    """
+    session = get_session()
+    if not session.has_capability("IDLE"):
+        print("[WATCH] Server does not support IDLE, falling back to polling")
+        return run_loop(interval)
+
+    print(f"[WATCH] Watching {folder} via IMAP IDLE (pull interval: {interval}s)")
+    print(f"[WATCH] Press Ctrl+C to stop")
+
+    run_full()
+    last_pull = time.monotonic()
+    while True:
+        try:
+            wait = max(1, min(interval - (time.monotonic() - last_pull), IDLE_TIMEOUT))
+            events = session.idle(folder, timeout=wait)
+            if events:
+                print(f"\n[WATCH] New mail @ {datetime.now().strftime('%H:%M:%S')}")
+                run_push()
+            if time.monotonic() - last_pull >= interval:
+                run_pull()
+                last_pull = time.monotonic()
+        except KeyboardInterrupt:
+            print("\n[WATCH] Stopped by user")
+            break
+        except Exception as e:
+            print(f"[WATCH] Error: {e}; reconnecting")
+            session.close()
+            time.sleep(5)
+
+
 # --- LEGACY: Excel-based flow ---
 
 def run_llm_excel(path: str):
@@ -186,34 +674,17 @@ def run_llm_excel(path: str):
     mask = (status_col == "NEW") | (status_col == "")
     indices = df[mask].index.tolist()
 
-    for i in indices:
-        try:
-            row = df.loc[i].fillna("")
-            prompt = build_prompt(
-                from_=row["from"],
-                subject=row["subject"],
-                company=row["company"],
-                received_utc=row["received_utc"],
-                body=row["body"],
-            )
-            llm_output = call_llm_structured(prompt)
-
-            allowed_next_action = {
-                "reply", "schedule", "submit_materials", "complete_assessment",
-                "sign_offer", "follow_up", "archive", "ignore", "escalate",
-            }
-            if llm_output.get("next_action") not in allowed_next_action:
-                raise ValueError(f"next_action invalid: {llm_output.get('next_action')}")
-
-            for k, v in llm_output.items():
-                df.at[i, k] = v
-            df.at[i, "llm_status"] = "DONE"
-            df.at[i, "llm_processed_utc"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
-            df.at[i, "error_msg"] = ""
-        except Exception as e:
+    rows = ((i, df.loc[i].fillna("")) for i in indices)
+    for (i, _), llm_output, error in map_ordered(lambda item: _classify_one(item[1]), rows):
+        df.at[i, "llm_processed_utc"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+        if error is not None:
             df.at[i, "llm_status"] = "ERROR"
-            df.at[i, "llm_processed_utc"] = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
-            df.at[i, "error_msg"] = str(e)
+            df.at[i, "error_msg"] = str(error)
+            continue
+        for k, v in llm_output.items():
+            df.at[i, k] = v
+        df.at[i, "llm_status"] = "DONE"
+        df.at[i, "error_msg"] = ""
 
     write_back_excel(df, path)
     return df
@@ -248,11 +719,54 @@ def run_excel(onedrive_path: str = ONEDRIVE_XLSX, force_refresh: bool = False):
     return df_sync
 
 
+# --- Startup check ---
+
+LLM_SDK_MODULES = ("anthropic", "openai")
+
+
+def run_startup_check():
+    """
+    Import this module in a fresh interpreter with no LLM API keys and fail
+    if that loads an LLM SDK. pull and excel startup only pay for what they use;
+    the provider client is created on the first classification.
+    """
+    code = (
+        "import sys, time; start = time.perf_counter(); import main; "
+        "print(f'{time.perf_counter() - start:.3f}'); "
+        f"print(','.join(m for m in {LLM_SDK_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ, ANTHROPIC_API_KEY="", OPENAI_API_KEY="")
+    proc = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent,
+                          env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"[STARTUP] import main failed without API keys:\n{proc.stderr.strip()}")
+        return False
+    seconds, loaded = (proc.stdout.strip().splitlines() + ["", ""])[:2]
+    if loaded:
+        print(f"[STARTUP] FAIL: importing main loaded {loaded} ({seconds}s)")
+        return False
+    print(f"[STARTUP] OK: import main took {seconds}s, no LLM SDK loaded")
+    return True
+
+
 if __name__ == "__main__":
     cmd = sys.argv[1] if len(sys.argv) > 1 else "full"
 
     if cmd == "push":
-        run_push()
+        days, limit = 7, 50
+        for arg in sys.argv[2:]:
+            if arg.startswith("--days="):
+                days = int(arg.split("=")[1])
+            elif arg.startswith("--limit="):
+                limit = int(arg.split("=")[1])
+        run_push(
+            days=days,
+            limit=limit,
+            header_filter=_prefilter() if "--prefilter" in sys.argv[2:] else None,
+            batch="--batch" in sys.argv[2:],
+            multi=True if "--multi" in sys.argv[2:] else None,
+            backfill="--backfill" in sys.argv[2:],
+        )
     elif cmd == "pull":
         run_pull()
     elif cmd == "loop":
@@ -261,7 +775,24 @@ if __name__ == "__main__":
             if arg.startswith("--interval="):
                 interval = int(arg.split("=")[1])
         run_loop(interval)
+    elif cmd == "watch":
+        interval = 120
+        for arg in sys.argv[2:]:
+            if arg.startswith("--interval="):
+                interval = int(arg.split("=")[1])
+        run_watch(interval)
+    elif cmd == "reclassify":
+        since = None
+        for arg in sys.argv[2:]:
+            if arg.startswith("--since="):
+                since = arg.split("=", 1)[1]
+        run_reclassify(since, sync="--no-sync" not in sys.argv[2:])
     elif cmd == "excel":
         run_excel()
+    elif cmd == "mirror":
+        action = sys.argv[2] if len(sys.argv) > 2 else "verify"
+        mirror_command(action, repair="--repair" in sys.argv[3:])
+    elif cmd == "check-startup":
+        sys.exit(0 if run_startup_check() else 1)
     else:
         run_full()
@@ -0,0 +1,184 @@
+"""
+MIME text extraction — turns an email.message.Message into a bounded
+plain-text body for classification.
+
+One walk over the MIME tree: the first inline text/plain part wins, the
+first inline text/html part is kept as a fallback, and attachments are
+never decoded. Payloads are decoded incrementally and decoding stops as
+soon as max_chars of text have been produced.
+"""
+
+import base64
+import codecs
+import quopri
+import html
+import re
+
+# Encoded bytes decoded per step; small enough that a huge part costs
+# little more than the budget itself
+CHUNK_BYTES = 16384
+
+_SKIP_TAGS = "script|style|head|title|noscript|template|svg"
+_SKIP_BLOCK = re.compile(rf"<({_SKIP_TAGS})\b.*?</\1\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+# Start of a skipped block whose end is not in the buffer yet
+_SKIP_OPEN = re.compile(rf"<(?:{_SKIP_TAGS})\b|<!--", re.IGNORECASE)
+_BLOCK_TAG = re.compile(
+    r"<\s*/?\s*(?:p|div|br|tr|li|ul|ol|table|section|article|h[1-6]|blockquote|pre|hr)\b[^>]*>",
+    re.IGNORECASE,
+)
+_ANY_TAG = re.compile(r"<[^>]*>")
+# Line breaks, stray characters and padding; padding is re-added per quantum
+_NOT_BASE64 = re.compile(rb"[^A-Za-z0-9+/]")
+
+
+def _normalize_ws(text):
+    text = text.replace("\xa0", " ")
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _html_chunks_to_text(chunks, max_chars=None):
+    """
+    Convert streamed HTML to text, consuming only as much markup as the
+    budget needs.
+
+    Each chunk is converted once: complete script/style/comment blocks are
+    dropped, and anything from an unfinished tag or skipped block onward
+    is held back until the next chunk completes it.
+    """
+    buf = ""
+    parts = []
+    raw_len = 0
+    for chunk in chunks:
+        buf = _SKIP_BLOCK.sub("", buf + chunk)
+        cut = len(buf)
+        lt = buf.rfind("<")
+        if lt >= 0 and buf.find(">", lt) < 0:
+            cut = lt
+        pending = _SKIP_OPEN.search(buf, 0, cut)
+        if pending:
+            cut = pending.start()
+        if cut:
+            piece = _ANY_TAG.sub("", _BLOCK_TAG.sub("\n", buf[:cut]))
+            parts.append(html.unescape(piece))
+            raw_len += len(parts[-1])
+            buf = buf[cut:]
+        if max_chars and raw_len >= max_chars:
+            text = _normalize_ws("".join(parts))
+            if len(text) >= max_chars:
+                return text[:max_chars]
+    # Input ended: drop any unterminated skipped block, keep the rest
+    buf = _SKIP_BLOCK.sub("", buf)
+    pending = _SKIP_OPEN.search(buf)
+    if pending:
+        buf = buf[:pending.start()]
+    parts.append(html.unescape(_ANY_TAG.sub("", _BLOCK_TAG.sub("\n", buf))))
+    text = _normalize_ws("".join(parts))
+    return text[:max_chars] if max_chars else text
+
+
+def html_to_text(markup, max_chars=None):
+    """Convert HTML to readable text, dropping script/style and decoding entities."""
+    return _html_chunks_to_text(
+        (markup[i:i + CHUNK_BYTES] for i in range(0, len(markup), CHUNK_BYTES)), max_chars
+    )
+
+
+def _to_bytes(piece):
+    if isinstance(piece, bytes):
+        return piece
+    try:
+        return piece.encode("ascii", "surrogateescape")
+    except UnicodeEncodeError:
+        return piece.encode("utf-8", "surrogateescape")
+
+
+def _iter_decoded(raw, encoding):
+    """
+    Yield decoded byte chunks of a transfer-encoded payload, CHUNK_BYTES at
+    a time. raw may be the str payload the email parser keeps; it is only
+    converted to bytes slice by slice.
+    """
+    encoding = (encoding or "7bit").lower()
+    newline = b"\n" if isinstance(raw, bytes) else "\n"
+    pos = 0
+    carry = b""
+    while pos < len(raw):
+        end = min(len(raw), pos + CHUNK_BYTES)
+        if encoding == "quoted-printable" and end < len(raw):
+            # Never split a soft line break or =XX escape
+            nl = raw.find(newline, end)
+            end = len(raw) if nl < 0 else nl + 1
+        piece = _to_bytes(raw[pos:end])
+        pos = end
+        if encoding == "base64":
+            # Whole quanta only; a part cut off mid-quantum (a capped IMAP
+            # fetch) loses just its last incomplete quantum, never the chunk
+            piece = carry + _NOT_BASE64.sub(b"", piece)
+            cut = len(piece) - len(piece) % 4
+            piece, carry = piece[:cut], piece[cut:]
+            if pos >= len(raw) and len(carry) > 1:
+                piece, carry = piece + carry + b"=" * (4 - len(carry)), b""
+            yield base64.b64decode(piece)
+        elif encoding == "quoted-printable":
+            yield quopri.decodestring(piece)
+        else:
+            yield piece
+
+
+def _decode_text(part_or_raw, max_chars, encoding=None, charset=None, html=False):
+    if isinstance(part_or_raw, bytes):
+        raw = part_or_raw
+    else:
+        raw = part_or_raw.get_payload(decode=False)
+        if not isinstance(raw, (str, bytes)):
+            return ""
+        encoding = part_or_raw.get("Content-Transfer-Encoding")
+        charset = part_or_raw.get_content_charset()
+    try:
+        decoder = codecs.getincrementaldecoder(charset or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    if html:
+        return _html_chunks_to_text((decoder.decode(c) for c in _iter_decoded(raw, encoding)), max_chars)
+
+    out = []
+    length = 0
+    for chunk in _iter_decoded(raw, encoding):
+        text = decoder.decode(chunk)
+        out.append(text)
+        length += len(text)
+        if max_chars and length >= max_chars:
+            break
+    text = "".join(out)
+    return text[:max_chars] if max_chars else text
+
+
+def decode_section(data, encoding, charset, subtype="plain", max_chars=None):
+    """Decode a separately fetched body section (IMAP BODY[n]) to text."""
+    return _decode_text(data, max_chars, encoding, charset, html=(subtype == "html"))
+
+
+def _is_attachment(part):
+    disposition = str(part.get("Content-Disposition", "")).lower()
+    return disposition.startswith("attachment") or bool(part.get_filename())
+
+
+def extract_body(msg, max_chars=None):
+    """Extract a plain-text body of at most max_chars from an email message."""
+    html_part = None
+    for part in msg.walk():
+        if part.is_multipart() or _is_attachment(part):
+            continue
+        ctype = part.get_content_type()
+        if ctype == "text/plain":
+            text = _decode_text(part, max_chars)
+            if text.strip():
+                return text
+        if ctype == "text/html" and html_part is None:
+            html_part = part
+    if html_part is not None:
+        return _decode_text(html_part, max_chars, html=True)
+    return ""
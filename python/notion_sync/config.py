@@ -6,3 +6,22 @@ load_dotenv(Path(__file__).parent.parent.parent / ".env")
 
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
+
+# Resolve pages from the local mirror of the database instead of one query per row
+NOTION_INDEX = os.getenv("NOTION_INDEX", "1") == "1"
+# Full reload after this long, to drop archived pages incremental refreshes can't see
+NOTION_INDEX_MAX_AGE_SECONDS = float(os.getenv("NOTION_INDEX_MAX_AGE_SECONDS", "3600"))
+# A lookup miss re-checks Notion only if the last pull is older than this
+NOTION_INDEX_MISS_REFRESH_SECONDS = float(os.getenv("NOTION_INDEX_MISS_REFRESH_SECONDS", "60"))
+# SQLite mirror of the database's pages; empty keeps it in memory for the run
+NOTION_MIRROR_PATH = os.getenv("NOTION_MIRROR_PATH", str(Path(__file__).parent.parent / ".notion_mirror.sqlite3"))
+
+# Notion allows ~3 requests/second on average per integration
+NOTION_RATE_PER_SECOND = float(os.getenv("NOTION_RATE_PER_SECOND", "3"))
+NOTION_BURST = int(os.getenv("NOTION_BURST", "3"))
+# Rows synced at once; 1 restores the old serial behaviour
+NOTION_CONCURRENCY = int(os.getenv("NOTION_CONCURRENCY", "3"))
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+NOTION_BACKOFF_BASE_SECONDS = float(os.getenv("NOTION_BACKOFF_BASE_SECONDS", "1"))
+NOTION_BACKOFF_MAX_SECONDS = float(os.getenv("NOTION_BACKOFF_MAX_SECONDS", "30"))
+NOTION_TIMEOUT_SECONDS = float(os.getenv("NOTION_TIMEOUT_SECONDS", "30"))
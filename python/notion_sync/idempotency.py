@@ -1,7 +1,9 @@
 from typing import Optional
 import math
 from .mapping import map_properties
-from .page_template import build_page_content
+from .page_template import build_page_content, thread_messages
+from .page_index import get_page_index
+from .mirror import ALL_RECORDED, content_hash
 
 
 FORWARD_STAGES = [
@@ -51,6 +53,48 @@ def allowed_stage_update(current: Optional[str], candidate: Optional[str]) -> bo
     return FORWARD_STAGES.index(candidate) >= FORWARD_STAGES.index(current)
 
 
+def _content_to_append(row, client, index, page_id) -> Optional[str]:
+    """
+    Content for the row's messages (see thread_messages) that are not on
+    the page yet, or None when all are. Answered from the body hashes in
+    the mirror; the page's blocks are only read for pages created before
+    hashes were recorded (or with NOTION_INDEX=0).
+    """
+    hashes = index.mirror.appended(page_id) if index is not None else set()
+    page_text = None
+    missing = []
+    for message in thread_messages(row):
+        body_text = (message.get("body") or "").strip()
+        if body_text and content_hash(body_text) in hashes:
+            continue
+        if not body_text or ALL_RECORDED in hashes:
+            missing.append(message)
+            continue
+        if page_text is None:
+            try:
+                page_text = client.get_page_plaintext(page_id) or ""
+            except Exception:
+                page_text = ""
+        if body_text not in page_text:
+            missing.append(message)
+    return build_page_content(row, missing) if missing else None
+
+
+def _record_body(row, index, page_id, created=False):
+    """Remember the row's message bodies as appended to the page (and, for a new page, that the record is complete)."""
+    if index is None or not page_id:
+        return
+    hashes = []
+    for message in thread_messages(row):
+        body_text = (message.get("body") or "").strip()
+        if body_text:
+            hashes.append(content_hash(body_text))
+    if created:
+        hashes.append(ALL_RECORDED)
+    if hashes:
+        index.mirror.record_appended(page_id, *hashes)
+
+
 def sync_row(row, client, database_id: str):
     thread_key = choose_thread_key(row)
     if not thread_key:
@@ -60,43 +104,39 @@ def sync_row(row, client, database_id: str):
     props["Action Confirm"] = False
     content = build_page_content(row)
 
+    index = get_page_index(client)
     page_id = row.get("notion_page_id")
     if page_id is not None and not (isinstance(page_id, float) and math.isnan(page_id)) and str(page_id) != "":
-        current_props = client.get_page_properties(page_id)
+        entry = index.get(page_id) if index is not None else None
+        current_props = entry["properties"] if entry else client.get_page_properties(page_id)
         current_stage = current_props.get("Stage")
         candidate_stage = props.get("Stage")
         if not allowed_stage_update(current_stage, candidate_stage):
             props.pop("Stage", None)
         props["Status Updated"] = True
-        append_content = content
-        try:
-            page_text = client.get_page_plaintext(page_id)
-            body_text = (row.get("body") or "").strip()
-            if body_text and body_text in (page_text or ""):
-                append_content = None
-        except Exception:
-            append_content = content
-        client.update_page(page_id, props, content_append=append_content)
+        append_content = _content_to_append(row, client, index, page_id)
+        client.update_page(page_id, props, content_append=append_content, current=current_props)
+        _record_body(row, index, page_id)
         return "DONE", page_id, None
 
-    found = client.query_by_conversation_id(thread_key)
+    find = index.find if index is not None else client.query_by_conversation_id
+    found = find(thread_key)
+    if not found and row.get("legacy_conversation_id"):
+        # A page from before Gmail thread IDs; the update moves its Conversation ID over
+        found = find(row["legacy_conversation_id"])
     if len(found) == 0:
         page_id = client.create_page(props, content)
+        _record_body(row, index, page_id, created=True)
         return "DONE", page_id, None
     if len(found) == 1:
         page_id = found[0]["id"]
-        current_stage = found[0].get("properties", {}).get("Stage")
+        current_props = found[0].get("properties", {})
+        current_stage = current_props.get("Stage")
         if not allowed_stage_update(current_stage, props.get("Stage")):
             props.pop("Stage", None)
         props["Status Updated"] = True
-        append_content = content
-        try:
-            page_text = client.get_page_plaintext(page_id)
-            body_text = (row.get("body") or "").strip()
-            if body_text and body_text in (page_text or ""):
-                append_content = None
-        except Exception:
-            append_content = content
-        client.update_page(page_id, props, content_append=append_content)
+        append_content = _content_to_append(row, client, index, page_id)
+        client.update_page(page_id, props, content_append=append_content, current=current_props)
+        _record_body(row, index, page_id)
         return "DONE", page_id, None
     return "ERROR", None, f"multiple pages found for {thread_key}"
@@ -0,0 +1,307 @@
+"""
+Local SQLite mirror of the Notion tracking database.
+
+Holds every page's properties (as Notion returns them) plus the columns
+lookups need: Conversation ID, Message ID, Stage, Action Confirm and
+Importance Score. It is kept current three ways:
+  - pull(): pages edited since the newest last_edited_time seen, or the
+    whole database with full=True
+  - upsert_page(): every page object returned by a write we make
+  - verify(repair=True) / rebuild(): drift repair (`main.py mirror ...`)
+
+It also records a hash of every email body appended to a page, so
+sync_row can tell whether a body is already there without reading the
+page's blocks. Notion has no copy of these, so rebuild() keeps them.
+
+The cursor only moves on pulls, so our own writes never hide someone
+else's edits. WAL mode lets the push and the trigger read while the
+other writes. Empty NOTION_MIRROR_PATH keeps the mirror in memory.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .config import NOTION_MIRROR_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    page_id          TEXT PRIMARY KEY,
+    database_id      TEXT NOT NULL,
+    conversation_id  TEXT,
+    message_id       TEXT,
+    stage            TEXT,
+    action_confirm   INTEGER NOT NULL DEFAULT 0,
+    importance_score REAL,
+    last_edited_time TEXT,
+    properties       TEXT NOT NULL,
+    mirrored_utc     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_conversation ON pages (database_id, conversation_id);
+CREATE INDEX IF NOT EXISTS idx_pages_message ON pages (database_id, message_id);
+CREATE INDEX IF NOT EXISTS idx_pages_action ON pages (database_id, action_confirm);
+CREATE TABLE IF NOT EXISTS appended (
+    page_id      TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    appended_utc TEXT NOT NULL,
+    PRIMARY KEY (page_id, content_hash)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+# Recorded for pages created with hashing on: every body they hold has a hash here
+ALL_RECORDED = "*"
+
+
+def content_hash(text: str) -> str:
+    """Hash of an email body, ignoring whitespace differences."""
+    return hashlib.sha256(" ".join(str(text or "").split()).encode("utf-8")).hexdigest()
+
+
+def plain(prop: Optional[Dict[str, Any]]):
+    """Value of a Notion property: text for title/rich_text/select/url/date, else the raw value."""
+    if not prop:
+        return ""
+    ptype = prop.get("type")
+    value = prop.get(ptype) if ptype else None
+    if isinstance(value, list):
+        if ptype == "multi_select":
+            return ", ".join(v.get("name", "") for v in value)
+        return "".join(rt.get("plain_text") or rt.get("text", {}).get("content", "") for rt in value)
+    if isinstance(value, dict):
+        return value.get("name") or value.get("start") or ""
+    return "" if value is None else value
+
+
+class NotionMirror:
+    def __init__(self, database_id: str, path: Optional[str] = None):
+        self.database_id = database_id
+        self.path = path or NOTION_MIRROR_PATH or ":memory:"
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        if self.path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # --- meta ---
+
+    def _meta(self, name):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (f"{name}:{self.database_id}",)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f"{name}:{self.database_id}", value))
+
+    @property
+    def cursor(self) -> Optional[str]:
+        with self.lock:
+            return self._meta("cursor")
+
+    @property
+    def loaded_utc(self) -> Optional[str]:
+        with self.lock:
+            return self._meta("loaded_utc")
+
+    # --- pages ---
+
+    def _upsert(self, page):
+        if page.get("archived") or page.get("in_trash"):
+            self.db.execute("DELETE FROM pages WHERE page_id = ?", (page["id"],))
+            return
+        edited = page.get("last_edited_time") or ""
+        current = self.db.execute("SELECT last_edited_time FROM pages WHERE page_id = ?", (page["id"],)).fetchone()
+        if current and current[0] and edited and edited < current[0]:
+            # An older copy (a pull that raced one of our writes)
+            return
+        props = page.get("properties", {})
+        score = plain(props.get("Importance Score"))
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages (page_id, database_id, conversation_id, message_id, stage, action_confirm, "
+            "importance_score, last_edited_time, properties, mirrored_utc) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (page["id"], self.database_id, plain(props.get("Conversation ID")) or None,
+             plain(props.get("Message ID")) or None, plain(props.get("Stage")) or None,
+             int(bool(plain(props.get("Action Confirm")))), score if isinstance(score, (int, float)) else None,
+             edited, json.dumps(props, sort_keys=True), _now()),
+        )
+
+    def upsert_page(self, page: Dict[str, Any]):
+        """Store a page object from the API (query result or write response)."""
+        if not page or "id" not in page:
+            return
+        with self.lock:
+            self._upsert(page)
+            self.db.commit()
+
+    def _row(self, row) -> Dict[str, Any]:
+        page_id, stage, edited, props = row
+        return {"id": page_id, "properties": json.loads(props), "stage": stage, "last_edited_time": edited}
+
+    def get(self, page_id) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.db.execute("SELECT page_id, stage, last_edited_time, properties FROM pages "
+                                  "WHERE page_id = ? AND database_id = ?", (page_id, self.database_id)).fetchone()
+        return self._row(row) if row else None
+
+    def find(self, key) -> List[Dict[str, Any]]:
+        """Pages whose Conversation ID (or, failing that, Message ID) equals key."""
+        key = str(key)
+        with self.lock:
+            for column in ("conversation_id", "message_id"):
+                rows = self.db.execute(f"SELECT page_id, stage, last_edited_time, properties FROM pages "
+                                       f"WHERE database_id = ? AND {column} = ? ORDER BY page_id",
+                                       (self.database_id, key)).fetchall()
+                if rows:
+                    return [self._row(r) for r in rows]
+        return []
+
+    def actionable(self) -> List[Dict[str, Any]]:
+        """Pages with Action Confirm checked, highest Importance Score first."""
+        with self.lock:
+            rows = self.db.execute("SELECT page_id, stage, last_edited_time, properties FROM pages "
+                                   "WHERE database_id = ? AND action_confirm = 1 "
+                                   "ORDER BY importance_score IS NULL, importance_score DESC",
+                                   (self.database_id,)).fetchall()
+        return [self._row(r) for r in rows]
+
+    def conversation_ids(self) -> set:
+        """Every Conversation ID on the database's pages."""
+        with self.lock:
+            rows = self.db.execute("SELECT DISTINCT conversation_id FROM pages WHERE database_id = ? "
+                                   "AND conversation_id IS NOT NULL", (self.database_id,)).fetchall()
+        return {r[0] for r in rows}
+
+    def sender_domains(self) -> set:
+        """Domains of the From addresses on the database's pages."""
+        with self.lock:
+            rows = self.db.execute("SELECT properties FROM pages WHERE database_id = ?", (self.database_id,)).fetchall()
+        domains = set()
+        for (props,) in rows:
+            match = re.search(r"@([\w.-]+)", str(plain(json.loads(props).get("From")) or ""))
+            if match:
+                domains.add(match.group(1).lower().rstrip("."))
+        return domains
+
+    def count(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM pages WHERE database_id = ?", (self.database_id,)).fetchone()[0]
+
+    # --- appended bodies ---
+
+    def appended(self, page_id) -> set:
+        """Content hashes recorded for a page (ALL_RECORDED among them if the set is complete)."""
+        with self.lock:
+            rows = self.db.execute("SELECT content_hash FROM appended WHERE page_id = ?", (page_id,)).fetchall()
+        return {r[0] for r in rows}
+
+    def record_appended(self, page_id, *hashes):
+        with self.lock:
+            self.db.executemany("INSERT OR IGNORE INTO appended (page_id, content_hash, appended_utc) VALUES (?, ?, ?)",
+                                ((page_id, h, _now()) for h in hashes))
+            self.db.commit()
+
+    # --- syncing with Notion ---
+
+    def pull(self, client, full: bool = False) -> int:
+        """
+        Fetch pages from Notion into the mirror. Incremental from the cursor
+        unless full=True (or there is no cursor yet); a full pull also drops
+        pages Notion no longer returns. Returns the number of pages read.
+        """
+        cursor = None if full else self.cursor
+        filter_body = None
+        if cursor:
+            # last_edited_time is minute-granular, so on_or_after re-reads the cursor's minute
+            filter_body = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": cursor}}
+        pages = list(client.iter_database_pages(filter_body))
+        newest = cursor
+        with self.lock:
+            for page in pages:
+                self._upsert(page)
+                edited = page.get("last_edited_time")
+                if edited and (newest is None or edited > newest):
+                    newest = edited
+            if filter_body is None:
+                seen = [p["id"] for p in pages]
+                self.db.execute("CREATE TEMP TABLE IF NOT EXISTS seen (page_id TEXT PRIMARY KEY)")
+                self.db.execute("DELETE FROM seen")
+                self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((i,) for i in seen))
+                self.db.execute("DELETE FROM pages WHERE database_id = ? AND page_id NOT IN (SELECT page_id FROM seen)",
+                                (self.database_id,))
+                self._set_meta("loaded_utc", _now())
+            if newest:
+                self._set_meta("cursor", newest)
+            self.db.commit()
+        return len(pages)
+
+    def rebuild(self, client) -> int:
+        """Drop this database's pages and cursor, then pull everything."""
+        with self.lock:
+            self.db.execute("DELETE FROM pages WHERE database_id = ?", (self.database_id,))
+            self.db.execute("DELETE FROM meta WHERE key LIKE ?", (f"%:{self.database_id}",))
+            self.db.commit()
+        return self.pull(client, full=True)
+
+    def verify(self, client, repair: bool = False) -> Dict[str, List[str]]:
+        """
+        Compare the mirror with a full listing of the database. Returns page
+        ids that are missing from the mirror, stale (other properties or
+        last_edited_time), or extra (archived/deleted in Notion). With
+        repair=True the differences are fixed in place.
+        """
+        remote = {p["id"]: p for p in client.iter_database_pages(None)
+                  if not (p.get("archived") or p.get("in_trash"))}
+        with self.lock:
+            local = {
+                page_id: (edited, props)
+                for page_id, edited, props in self.db.execute(
+                    "SELECT page_id, last_edited_time, properties FROM pages WHERE database_id = ?",
+                    (self.database_id,))
+            }
+        report = {"missing": [], "stale": [], "extra": sorted(set(local) - set(remote))}
+        for page_id, page in remote.items():
+            if page_id not in local:
+                report["missing"].append(page_id)
+                continue
+            edited, props = local[page_id]
+            if edited != page.get("last_edited_time") or json.loads(props) != page.get("properties", {}):
+                report["stale"].append(page_id)
+        if repair:
+            with self.lock:
+                for page_id in report["missing"] + report["stale"]:
+                    self.db.execute("DELETE FROM pages WHERE page_id = ?", (page_id,))
+                    self._upsert(remote[page_id])
+                self.db.executemany("DELETE FROM pages WHERE page_id = ?", ((i,) for i in report["extra"]))
+                self.db.commit()
+        return report
+
+
+_mirrors: Dict[str, NotionMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(database_id: str) -> Optional[NotionMirror]:
+    """Process-wide mirror for a database (None without a database id)."""
+    if not database_id:
+        return None
+    with _mirrors_lock:
+        mirror = _mirrors.get(database_id)
+        if mirror is None:
+            mirror = _mirrors[database_id] = NotionMirror(database_id)
+        return mirror
+
@@ -1,6 +1,15 @@
-from typing import List, Dict, Any, Optional, Sequence
+from typing import List, Dict, Any, Iterator, Optional, Sequence
+from datetime import datetime
 import requests
 
+from .config import NOTION_INDEX
+from .mirror import get_mirror
+from .writer import send, stats as request_stats
+
+# Notion's request limits: blocks per create/append, characters per rich_text object
+MAX_CHILDREN = 100
+MAX_TEXT_CHARS = 2000
+
 PROPERTY_TYPES = {
     "Name": "title",
     "Company": "rich_text",
@@ -26,6 +35,47 @@ PROPERTY_TYPES = {
 }
 
 
+def _comparable(ptype: str, prop: Optional[Dict[str, Any]]):
+    """A property value (as sent or as returned by Notion) reduced to something == can compare."""
+    value = (prop or {}).get(ptype)
+    if ptype in ("title", "rich_text"):
+        return "".join(rt.get("plain_text") or rt.get("text", {}).get("content", "") for rt in value or [])
+    if ptype == "number":
+        return None if value is None else float(value)
+    if ptype == "checkbox":
+        return bool(value)
+    if ptype == "select":
+        return (value or {}).get("name") or None
+    if ptype == "multi_select":
+        return sorted(v.get("name", "") for v in value or [])
+    if ptype == "date":
+        start = (value or {}).get("start")
+        try:
+            # Notion echoes "2026-01-05 09:00:00+00:00" back as "2026-01-05T09:00:00.000+00:00"
+            return datetime.fromisoformat(start).isoformat() if start else None
+        except ValueError:
+            return start
+    return value or None
+
+
+def _rich_text(text: str) -> List[Dict[str, Any]]:
+    """rich_text objects for text, split into pieces Notion accepts."""
+    text = str(text)
+    return [{"type": "text", "text": {"content": text[i:i + MAX_TEXT_CHARS]}}
+            for i in range(0, len(text), MAX_TEXT_CHARS)] or [{"type": "text", "text": {"content": ""}}]
+
+
+def changed_properties(payload: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """The entries of a properties payload whose value differs from the page's current properties."""
+    changed = {}
+    for name, value in payload.items():
+        ptype = next(iter(value))
+        prop = current.get(name)
+        if prop is None or prop.get("type", ptype) != ptype or _comparable(ptype, value) != _comparable(ptype, prop):
+            changed[name] = value
+    return changed
+
+
 class NotionClient:
     def __init__(self, token: str = None, database_id: str = None):
         self.token = token
@@ -34,13 +84,16 @@ class NotionClient:
     def query_by_conversation_id(self, conversation_id: str) -> List[Dict[str, Any]]:
         raise NotImplementedError()
 
+    def iter_database_pages(self, filter_body: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError()
+
     def get_page_properties(self, page_id: str) -> Dict[str, Any]:
         raise NotImplementedError()
 
     def create_page(self, properties: Dict[str, Any], content: str) -> str:
         raise NotImplementedError()
 
-    def update_page(self, page_id: str, properties: Dict[str, Any], content_append: str = None) -> None:
+    def update_page(self, page_id: str, properties: Dict[str, Any], content_append: str = None, current: Optional[Dict[str, Any]] = None) -> None:
         raise NotImplementedError()
 
     def append_page_content(self, page_id: str, content: str) -> None:
@@ -72,6 +125,9 @@ class HttpNotionClient(NotionClient):
             "Content-Type": "application/json",
         }
 
+    def _send(self, method: str, url: str, endpoint: str, idempotent: bool = True, **kwargs) -> requests.Response:
+        return send(self.session, method, url, endpoint, idempotent=idempotent, headers=self._headers(), **kwargs)
+
     def _handle_response(self, resp: requests.Response):
         try:
             resp.raise_for_status()
@@ -95,7 +151,7 @@ class HttpNotionClient(NotionClient):
                 except Exception:
                     pass
             if ptype == "title":
-                payload[key] = {"title": [{"type": "text", "text": {"content": str(value)}}]}
+                payload[key] = {"title": _rich_text(value)}
             elif ptype == "url":
                 payload[key] = {"url": str(value)}
             elif ptype == "date":
@@ -111,7 +167,7 @@ class HttpNotionClient(NotionClient):
                     names = [str(value)]
                 payload[key] = {"multi_select": [{"name": n} for n in names if str(n).strip()]}
             else:
-                payload[key] = {"rich_text": [{"type": "text", "text": {"content": str(value)}}]}
+                payload[key] = {"rich_text": _rich_text(value)}
         return payload
 
     def _children_from_content(self, content: str):
@@ -120,20 +176,23 @@ class HttpNotionClient(NotionClient):
             return []
         children = []
         for p in parts:
-            children.append(
-                {
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {"rich_text": [{"type": "text", "text": {"content": p}}]},
-                }
-            )
+            rich_text = _rich_text(p)
+            # A block holds at most 100 rich_text objects; longer paragraphs continue in the next block
+            for i in range(0, len(rich_text), MAX_CHILDREN):
+                children.append(
+                    {
+                        "object": "block",
+                        "type": "paragraph",
+                        "paragraph": {"rich_text": rich_text[i:i + MAX_CHILDREN]},
+                    }
+                )
         return children
 
     def query_by_conversation_id(self, conversation_id: str) -> List[Dict[str, Any]]:
         url = f"{self.api_base}/databases/{self.database_id}/query"
 
         def do_query(prop: str, filter_body):
-            resp = self.session.post(url, headers=self._headers(), json={"filter": filter_body})
+            resp = self._send("POST", url, "databases.query", json={"filter": filter_body})
             return self._handle_response(resp)
 
         last_error = None
@@ -160,9 +219,29 @@ class HttpNotionClient(NotionClient):
             raise last_error
         return []
 
+    def iter_database_pages(self, filter_body: Optional[Dict[str, Any]] = None, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """Every page of the database (matching filter_body), following next_cursor."""
+        url = f"{self.api_base}/databases/{self.database_id}/query"
+        start_cursor = None
+        while True:
+            payload = {"page_size": page_size}
+            if filter_body:
+                payload["filter"] = filter_body
+            if start_cursor:
+                payload["start_cursor"] = start_cursor
+            resp = self._send("POST", url, "databases.query", json=payload)
+            self._handle_response(resp)
+            data = resp.json()
+            yield from data.get("results", [])
+            if not data.get("has_more"):
+                break
+            start_cursor = data.get("next_cursor")
+            if not start_cursor:
+                break
+
     def get_database(self) -> Dict[str, Any]:
         url = f"{self.api_base}/databases/{self.database_id}"
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._send("GET", url, "databases.retrieve")
         self._handle_response(resp)
         return resp.json()
 
@@ -193,7 +272,7 @@ class HttpNotionClient(NotionClient):
         if to_add:
             url = f"{self.api_base}/databases/{self.database_id}"
             payload = {"properties": to_add}
-            resp = self.session.patch(url, headers=self._headers(), json=payload)
+            resp = self._send("PATCH", url, "databases.update", json=payload)
             self._handle_response(resp)
             for name, typ in required.items():
                 if name in to_add:
@@ -201,9 +280,16 @@ class HttpNotionClient(NotionClient):
 
         return self.property_types
 
+    def _mirror_page(self, page: Dict[str, Any]):
+        # Create/update responses carry the whole page, so the mirror stays current without a query
+        if NOTION_INDEX:
+            mirror = get_mirror(self.database_id)
+            if mirror is not None:
+                mirror.upsert_page(page)
+
     def get_page_properties(self, page_id: str) -> Dict[str, Any]:
         url = f"{self.api_base}/pages/{page_id}"
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._send("GET", url, "pages.retrieve")
         self._handle_response(resp)
         return resp.json().get("properties", {})
 
@@ -212,28 +298,44 @@ class HttpNotionClient(NotionClient):
         payload = {
             "parent": {"database_id": self.database_id},
             "properties": self._properties_payload(properties),
-            "children": self._children_from_content(content),
         }
-        resp = self.session.post(url, headers=self._headers(), json=payload)
+        children = self._children_from_content(content)
+        payload["children"] = children[:MAX_CHILDREN]
+        resp = self._send("POST", url, "pages.create", idempotent=False, json=payload)
         self._handle_response(resp)
-        return resp.json().get("id")
+        page = resp.json()
+        self._mirror_page(page)
+        self._append_children(page.get("id"), children[MAX_CHILDREN:])
+        return page.get("id")
 
-    def update_page(self, page_id: str, properties: Dict[str, Any], content_append: str = None) -> None:
+    def update_page(self, page_id: str, properties: Dict[str, Any], content_append: str = None, current: Optional[Dict[str, Any]] = None) -> None:
+        """
+        PATCH the page's properties. With `current` (the page's properties as
+        Notion returned them) only changed ones are sent, and nothing at all
+        when none changed, so last_edited_time only moves on real edits.
+        """
         url = f"{self.api_base}/pages/{page_id}"
         payload = {"properties": self._properties_payload(properties)}
-        resp = self.session.patch(url, headers=self._headers(), json=payload)
-        self._handle_response(resp)
+        if current is not None:
+            payload["properties"] = changed_properties(payload["properties"], current)
+        if payload["properties"]:
+            resp = self._send("PATCH", url, "pages.update", json=payload)
+            self._handle_response(resp)
+            self._mirror_page(resp.json())
+        else:
+            request_stats.record("pages.update", skipped=1)
         if content_append:
             self.append_page_content(page_id, content_append)
 
     def append_page_content(self, page_id: str, content: str) -> None:
-        children = self._children_from_content(content)
-        if not children:
-            return
+        self._append_children(page_id, self._children_from_content(content))
+
+    def _append_children(self, page_id: str, children: List[Dict[str, Any]]) -> None:
         url = f"{self.api_base}/blocks/{page_id}/children"
-        payload = {"children": children}
-        resp = self.session.patch(url, headers=self._headers(), json=payload)
-        self._handle_response(resp)
+        for i in range(0, len(children), MAX_CHILDREN):
+            payload = {"children": children[i:i + MAX_CHILDREN]}
+            resp = self._send("PATCH", url, "blocks.children.append", idempotent=False, json=payload)
+            self._handle_response(resp)
 
     def _extract_text(self, block: Dict[str, Any]) -> str:
         btype = block.get("type")
@@ -253,7 +355,7 @@ class HttpNotionClient(NotionClient):
             params = {"page_size": page_size}
             if start_cursor:
                 params["start_cursor"] = start_cursor
-            resp = self.session.get(url, headers=self._headers(), params=params)
+            resp = self._send("GET", url, "blocks.children.list", params=params)
             self._handle_response(resp)
             data = resp.json()
             for block in data.get("results", []):
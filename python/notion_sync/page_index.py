@@ -0,0 +1,111 @@
+"""
+Page lookups for sync_row, served from the local Notion mirror.
+
+sync_row used to run query_by_conversation_id for every row, which is up
+to two queries per configured property. PageIndex answers from the
+SQLite mirror (mirror.py) instead and decides when to pull from Notion:
+once per sync pass, and on a lookup miss when the last pull is older than
+NOTION_INDEX_MISS_REFRESH_SECONDS, so a page created elsewhere is still
+found before a duplicate is made. Pages this process creates or updates
+reach the mirror from the write responses, so new threads within a pass
+cost no query.
+
+Archived pages never show up in an incremental pull, so the whole
+database is re-listed once the last full pull is older than
+NOTION_INDEX_MAX_AGE_SECONDS.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .config import NOTION_INDEX, NOTION_INDEX_MAX_AGE_SECONDS, NOTION_INDEX_MISS_REFRESH_SECONDS
+from .mirror import get_mirror
+
+
+def _age_seconds(iso: Optional[str]) -> float:
+    if not iso:
+        return float("inf")
+    return (datetime.now(timezone.utc) - datetime.fromisoformat(iso)).total_seconds()
+
+
+class PageIndex:
+    """Conversation ID / Message ID → page entries ({id, properties, stage, last_edited_time})."""
+
+    def __init__(self, client, mirror):
+        self.client = client
+        self.mirror = mirror
+        self.lock = threading.RLock()
+        self.refreshed_at = 0.0
+        self.stats = {"loads": 0, "refreshes": 0, "api_pages": 0, "hits": 0, "misses": 0}
+
+    def load(self):
+        """Page through the whole database."""
+        with self.lock:
+            count = self.mirror.pull(self.client, full=True)
+            self.refreshed_at = time.monotonic()
+            self.stats["loads"] += 1
+            self.stats["api_pages"] += count
+        print(f"[NOTION] Mirrored {count} page(s)")
+
+    def refresh(self):
+        """Pull pages edited since the mirror's cursor; re-list everything when the last full pull is old."""
+        with self.lock:
+            if self.mirror.cursor is None or _age_seconds(self.mirror.loaded_utc) > NOTION_INDEX_MAX_AGE_SECONDS:
+                self.load()
+                return
+            self.stats["api_pages"] += self.mirror.pull(self.client)
+            self.refreshed_at = time.monotonic()
+            self.stats["refreshes"] += 1
+
+    def find(self, thread_key) -> List[Dict[str, Any]]:
+        """Pages for a thread key, like query_by_conversation_id; a miss may refresh first."""
+        with self.lock:
+            found = self.mirror.find(thread_key)
+            if found:
+                self.stats["hits"] += 1
+                return found
+            self.stats["misses"] += 1
+            if time.monotonic() - self.refreshed_at < NOTION_INDEX_MISS_REFRESH_SECONDS:
+                return []
+            self.refresh()
+            return self.mirror.find(thread_key)
+
+    def get(self, page_id) -> Optional[Dict[str, Any]]:
+        return self.mirror.get(page_id)
+
+
+_indexes: Dict[Any, Optional[PageIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_page_index(client, refresh: bool = False) -> Optional[PageIndex]:
+    """
+    Shared PageIndex for the client's database, brought up to date on first
+    use and again when `refresh` is set (once per sync pass). None when
+    NOTION_INDEX=0 or the client can't list the database (test clients),
+    in which case callers query per row as before.
+    """
+    if not NOTION_INDEX:
+        return None
+    database_id = getattr(client, "database_id", None)
+    key = (type(client), database_id)
+    with _indexes_lock:
+        if key in _indexes:
+            index = _indexes[key]
+            if index is not None:
+                # Same database, possibly a new client object (one per sync pass)
+                index.client = client
+                if refresh:
+                    index.refresh()
+            return index
+        mirror = get_mirror(database_id)
+        index = PageIndex(client, mirror) if mirror is not None else None
+        if index is not None:
+            try:
+                index.refresh()
+            except NotImplementedError:
+                index = None
+        _indexes[key] = index
+        return index
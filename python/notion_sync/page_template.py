@@ -1,15 +1,24 @@
-from typing import Any
+from typing import Any, Dict, List, Optional
 
 
-def build_page_content(row: Any) -> str:
-    sender = row.get("from", "") or ""
-    subject = row.get("subject", "") or ""
-    body = row.get("body", "") or ""
+def thread_messages(row: Any) -> List[Dict[str, Any]]:
+    """The messages a row stands for: the earlier ones it superseded (oldest first), then itself."""
+    return list(row.get("thread_earlier") or []) + [row]
 
-    lines = [
+
+def build_message_content(message: Any) -> str:
+    sender = message.get("from", "") or ""
+    subject = message.get("subject", "") or ""
+    body = message.get("body", "") or ""
+    return "\n".join([
         f"From: {sender}",
         f"Subject: {subject}",
         "",
         body,
-    ]
-    return "\n".join(lines)
+    ])
+
+
+def build_page_content(row: Any, messages: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Page content for the row's messages (default: every message in thread_messages)."""
+    messages = thread_messages(row) if messages is None else messages
+    return "\n\n".join(build_message_content(m) for m in messages)
@@ -1,9 +1,12 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+from classify_engine import map_ordered
 from .excel_io import read_excel, write_back_excel, iter_rows_for_sync
-from .idempotency import sync_row
+from .idempotency import sync_row, choose_thread_key
 from .notion_client import HttpNotionClient, NotionClient, PROPERTY_TYPES
-from .config import NOTION_TOKEN, NOTION_DATABASE_ID
+from .config import NOTION_TOKEN, NOTION_DATABASE_ID, NOTION_CONCURRENCY
 from .mapping import PROPERTY_MAP
+from .page_index import get_page_index
+from .mirror import get_mirror
 
 
 def _get_client(client=None, database_id=None, query_properties=None, debug=False):
@@ -22,15 +25,19 @@ def sync_excel_rows(excel_path: str, client: Optional[NotionClient] = None, data
 
     required_types = {k: PROPERTY_TYPES.get(k, "rich_text") for k in PROPERTY_TYPES.keys()}
     client.ensure_properties(required_types)
+    get_page_index(client, refresh=True)
 
     df = read_excel(excel_path)
-    for idx, row in iter_rows_for_sync(df):
-        try:
-            status, page_id, error = sync_row(row, client, db_id)
-        except Exception as e:
+    items = iter_rows_for_sync(df)
+    synced = map_ordered(lambda item: sync_row(item[1], client, db_id), items, NOTION_CONCURRENCY,
+                         key=lambda item: choose_thread_key(item[1]), name="notion")
+    for (idx, row), result, e in synced:
+        if e is None:
+            status, page_id, error = result
+        else:
             import traceback
             print(f"Row {idx} error: {e}")
-            traceback.print_exc()
+            traceback.print_exception(e)
             status, page_id, error = "ERROR", None, str(e)
         if page_id:
             df.at[idx, "notion_page_id"] = page_id
@@ -41,28 +48,51 @@ def sync_excel_rows(excel_path: str, client: Optional[NotionClient] = None, data
     return df
 
 
-def sync_dict_rows(rows: List[Dict[str, Any]], client: Optional[NotionClient] = None, database_id: Optional[str] = None, debug: bool = False) -> List[Dict[str, Any]]:
+def iter_sync_dict_rows(rows: Iterable[Dict[str, Any]], client: Optional[NotionClient] = None, database_id: Optional[str] = None, debug: bool = False) -> Iterator[Dict[str, Any]]:
     """
-    Sync a list of dict rows (from Gmail IMAP) to Notion.
+    Sync dict rows (from Gmail IMAP) to Notion as they arrive.
     Each row dict should have keys matching the schema:
     message_id, conversation_id, from, subject, company, body, etc.
 
-    Returns the rows with updated notion_page_id and llm_status.
+    Accepts any iterable (e.g. a generator from the classifier) and yields
+    each row, in input order, with updated notion_page_id and llm_status
+    once its page is written; up to NOTION_CONCURRENCY rows are written at
+    once, but rows of one thread run one after another so two messages of a
+    new thread never both create a page. The client and schema check are set up lazily on the
+    first row, so an empty stream makes no Notion calls.
     """
-    client = _get_client(client, database_id, debug=debug)
     db_id = database_id or NOTION_DATABASE_ID
 
-    required_types = {k: PROPERTY_TYPES.get(k, "rich_text") for k in PROPERTY_TYPES.keys()}
-    client.ensure_properties(required_types)
+    def prepared():
+        # Runs on the consumer's thread, before the first row is handed to a worker
+        nonlocal client
+        ensured = False
+        for row in rows:
+            if not ensured and row.get("llm_status") != "SUPERSEDED":
+                client = _get_client(client, database_id, debug=debug)
+                required_types = {k: PROPERTY_TYPES.get(k, "rich_text") for k in PROPERTY_TYPES.keys()}
+                client.ensure_properties(required_types)
+                get_page_index(client, refresh=True)
+                ensured = True
+            yield row
+
+    def sync(row):
+        if row.get("llm_status") == "SUPERSEDED":
+            # A later message of the same thread carries the update
+            return None
+        return sync_row(row, client, db_id)
 
-    results = []
-    for i, row in enumerate(rows):
-        try:
-            status, page_id, error = sync_row(row, client, db_id)
-        except Exception as e:
+    synced = map_ordered(sync, prepared(), NOTION_CONCURRENCY, key=choose_thread_key, name="notion")
+    for i, (row, result, e) in enumerate(synced):
+        if row.get("llm_status") == "SUPERSEDED":
+            yield row
+            continue
+        if e is None:
+            status, page_id, error = result
+        else:
             import traceback
             print(f"Row {i} error: {e}")
-            traceback.print_exc()
+            traceback.print_exception(e)
             status, page_id, error = "ERROR", None, str(e)
 
         row_copy = dict(row)
@@ -70,6 +100,54 @@ def sync_dict_rows(rows: List[Dict[str, Any]], client: Optional[NotionClient] =
             row_copy["notion_page_id"] = page_id
         row_copy["llm_status"] = status
         row_copy["error_msg"] = error
-        results.append(row_copy)
+        yield row_copy
+
+
+def sync_dict_rows(rows: Iterable[Dict[str, Any]], client: Optional[NotionClient] = None, database_id: Optional[str] = None, debug: bool = False) -> List[Dict[str, Any]]:
+    """
+    Sync a list of dict rows (from Gmail IMAP) to Notion.
+    Each row dict should have keys matching the schema:
+    message_id, conversation_id, from, subject, company, body, etc.
 
-    return results
+    Returns the rows with updated notion_page_id and llm_status.
+    """
+    return list(iter_sync_dict_rows(rows, client, database_id, debug))
+
+
+def known_threads(client: Optional[NotionClient] = None, database_id: Optional[str] = None) -> Tuple[set, set]:
+    """
+    (Conversation IDs, sender domains) of the database's pages, read from
+    the mirror after bringing it up to date. Empty without Notion settings.
+    """
+    db_id = database_id or NOTION_DATABASE_ID
+    if not db_id or not (client or NOTION_TOKEN):
+        return set(), set()
+    client = _get_client(client, db_id)
+    get_page_index(client, refresh=True)
+    mirror = get_mirror(db_id)
+    return mirror.conversation_ids(), mirror.sender_domains()
+
+
+def mirror_command(action: str, repair: bool = False, client: Optional[NotionClient] = None, database_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Maintain the local mirror: "rebuild" re-lists the database from scratch,
+    "verify" compares it with a full listing (and fixes drift with repair=True).
+    """
+    client = _get_client(client, database_id)
+    mirror = get_mirror(getattr(client, "database_id", None))
+    if mirror is None:
+        raise ValueError("NOTION_DATABASE_ID required in .env")
+    if action == "rebuild":
+        count = mirror.rebuild(client)
+        print(f"[MIRROR] Rebuilt: {count} page(s) at {mirror.path}")
+        return {"pages": count}
+    if action == "verify":
+        report = mirror.verify(client, repair=repair)
+        drift = {k: len(v) for k, v in report.items()}
+        print(f"[MIRROR] {mirror.count()} page(s); missing={drift['missing']} stale={drift['stale']} "
+              f"extra={drift['extra']}" + (" (repaired)" if repair and any(drift.values()) else ""))
+        for kind, page_ids in report.items():
+            for page_id in page_ids[:10]:
+                print(f"  [{kind}] {page_id}")
+        return report
+    raise ValueError(f"Unknown mirror action: {action}")
@@ -0,0 +1,129 @@
+"""
+Notion request engine — rate limiting and retries.
+
+Every HttpNotionClient request goes through send():
+  - a process-wide classify_engine.TokenBucket holds the average to
+    NOTION_RATE_PER_SECOND (Notion allows ~3 requests/second per integration)
+  - 429 and 5xx are retried with jittered exponential backoff; a 429's
+    Retry-After pauses the bucket, so every worker waits, not just this one
+  - creates and block appends are only retried on 429/503, which Notion
+    returns before doing anything, so a retry can't write twice
+  - latency, throttle and retry counters are kept per endpoint, plus
+    updates skipped because nothing changed
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+from classify_engine import TokenBucket
+from .config import (
+    NOTION_RATE_PER_SECOND, NOTION_BURST, NOTION_MAX_RETRIES,
+    NOTION_BACKOFF_BASE_SECONDS, NOTION_BACKOFF_MAX_SECONDS, NOTION_TIMEOUT_SECONDS,
+)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Rejected before the request is processed, so safe to retry even for writes
+RETRYABLE_STATUS_UNSAFE = {429, 503}
+
+
+class EndpointStats:
+    """Per-endpoint counters; errors are requests that failed after any retries, skipped ones never sent (no changes)."""
+
+    FIELDS = ("calls", "errors", "throttled", "retries", "skipped", "seconds", "max_seconds", "waited_seconds")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, Dict[str, float]] = {}
+
+    def record(self, endpoint, **values):
+        with self.lock:
+            entry = self.endpoints.setdefault(endpoint, dict.fromkeys(self.FIELDS, 0))
+            for field, value in values.items():
+                if field == "max_seconds":
+                    entry[field] = max(entry[field], value)
+                else:
+                    entry[field] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: dict(entry) for endpoint, entry in sorted(self.endpoints.items())}
+
+
+stats = EndpointStats()
+bucket = TokenBucket(NOTION_RATE_PER_SECOND * 60, capacity=NOTION_BURST)
+
+
+def retry_after(resp) -> Optional[float]:
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, server_delay=None):
+    """Full-jitter exponential backoff, but never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(NOTION_BACKOFF_MAX_SECONDS, NOTION_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if server_delay is not None:
+        delay = max(delay, server_delay)
+    return delay
+
+
+def send(session, method: str, url: str, endpoint: str, idempotent: bool = True, **kwargs) -> requests.Response:
+    """
+    One Notion request with rate limiting and retries. Returns the last
+    response (the caller raises on error status) or raises the last
+    connection error.
+    """
+    retryable = RETRYABLE_STATUS if idempotent else RETRYABLE_STATUS_UNSAFE
+    kwargs.setdefault("timeout", NOTION_TIMEOUT_SECONDS)
+    for attempt in range(NOTION_MAX_RETRIES + 1):
+        waited = bucket.acquire()
+        start = time.monotonic()
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            elapsed = time.monotonic() - start
+            stats.record(endpoint, calls=1, seconds=elapsed, max_seconds=elapsed, waited_seconds=waited)
+            # A read timeout may have reached Notion; only connect failures are safe for writes
+            if attempt == NOTION_MAX_RETRIES or not (idempotent or isinstance(e, requests.ConnectTimeout)):
+                stats.record(endpoint, errors=1)
+                raise
+            delay = backoff_delay(attempt)
+            stats.record(endpoint, retries=1)
+            print(f"  [NOTION] {endpoint} {type(e).__name__}; retry {attempt + 1}/{NOTION_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        elapsed = time.monotonic() - start
+        status = resp.status_code
+        stats.record(endpoint, calls=1, throttled=int(status == 429),
+                     seconds=elapsed, max_seconds=elapsed, waited_seconds=waited)
+        if status not in retryable or attempt == NOTION_MAX_RETRIES:
+            stats.record(endpoint, errors=int(status >= 400))
+            return resp
+        server_delay = retry_after(resp)
+        delay = backoff_delay(attempt, server_delay)
+        if status == 429:
+            bucket.pause(delay)
+        stats.record(endpoint, retries=1)
+        print(f"  [NOTION] {endpoint} {status}; retry {attempt + 1}/{NOTION_MAX_RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
+    return resp
+
+
+def snapshot():
+    return stats.snapshot()
+
+
+def report():
+    lines = []
+    for endpoint, s in snapshot().items():
+        mean = s["seconds"] / s["calls"] if s["calls"] else 0.0
+        lines.append(f"[NOTION] {endpoint} n={s['calls']:.0f} mean={mean:.2f}s max={s['max_seconds']:.2f}s "
+                     f"waited={s['waited_seconds']:.1f}s throttled={s['throttled']:.0f} "
+                     f"retries={s['retries']:.0f} errors={s['errors']:.0f}"
+                     + (f" skipped={s['skipped']:.0f}" if s["skipped"] else ""))
+    return "\n".join(lines)
@@ -8,6 +8,12 @@ Bidirectional flow:
   - PULL: Read rows where "Action Confirm" is checked → execute the "Next Action"
   - PUSH: After execution, update status/stage back in Notion
 
+Rows are read from the local mirror of the database (notion_sync/mirror.py),
+brought up to date with one incremental query per cycle; NOTION_INDEX=0
+queries Notion directly instead. Each page is re-read right before its
+action runs, since the mirror can miss archived pages for up to an hour.
+All requests share notion_sync's rate limit and retries with the push.
+
 Supported actions (triggered via "Next Action" column in Notion):
   - reply          → schedule a followup email
   - follow_up      → schedule a followup email
@@ -24,6 +30,12 @@ from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 
+from notion_sync.config import NOTION_INDEX
+from notion_sync.mirror import get_mirror
+from notion_sync.notion_client import HttpNotionClient
+from notion_sync.page_index import get_page_index
+from notion_sync.writer import send
+
 load_dotenv(Path(__file__).parent.parent / ".env")
 
 NOTION_TOKEN = os.getenv("NOTION_TOKEN", "")
@@ -35,6 +47,8 @@ NOTION_VERSION = "2022-06-28"
 SEND_ACTIONS = {"reply", "follow_up", "send_cold", "schedule"}
 # Actions that update status only
 STATUS_ACTIONS = {"archive", "ignore"}
+# Fields execute_action acts on; a row is skipped if any changed since it was read
+ACTION_FIELDS = ("next_action", "from", "company", "name")
 
 
 def _headers():
@@ -76,45 +90,86 @@ def query_actionable_rows():
     if not NOTION_TOKEN or not NOTION_DATABASE_ID:
         raise ValueError("NOTION_TOKEN and NOTION_DATABASE_ID required in .env")
 
-    url = f"{NOTION_API_BASE}/databases/{NOTION_DATABASE_ID}/query"
-    payload = {
-        "filter": {
-            "and": [
-                {"property": "Action Confirm", "checkbox": {"equals": True}},
-            ]
-        },
-        "sorts": [
-            {"property": "Importance Score", "direction": "descending"}
-        ],
-    }
-
-    resp = requests.post(url, headers=_headers(), json=payload)
-    resp.raise_for_status()
-    data = resp.json()
+    index = get_page_index(HttpNotionClient(NOTION_TOKEN, NOTION_DATABASE_ID), refresh=True)
+    if index is not None:
+        pages = index.mirror.actionable()
+    else:
+        url = f"{NOTION_API_BASE}/databases/{NOTION_DATABASE_ID}/query"
+        payload = {
+            "filter": {
+                "and": [
+                    {"property": "Action Confirm", "checkbox": {"equals": True}},
+                ]
+            },
+            "sorts": [
+                {"property": "Importance Score", "direction": "descending"}
+            ],
+        }
+        resp = send(requests, "POST", url, "databases.query", headers=_headers(), json=payload)
+        resp.raise_for_status()
+        pages = resp.json().get("results", [])
 
     rows = []
-    for page in data.get("results", []):
-        props = page.get("properties", {})
-        row = {
-            "notion_page_id": page["id"],
-            "name": _extract_text(props.get("Name", {})),
-            "company": _extract_text(props.get("Company", {})),
-            "from": _extract_text(props.get("From", {})),
-            "subject": _extract_text(props.get("Subject", {})),
-            "stage": _extract_text(props.get("Stage", {})),
-            "priority": _extract_text(props.get("Priority", {})),
-            "next_action": _extract_text(props.get("Next Action", {})),
-            "summary": _extract_text(props.get("Summary", {})),
-            "email_link": _extract_text(props.get("Email Link", {})),
-            "conversation_id": _extract_text(props.get("Conversation ID", {})),
-            "importance_score": _extract_text(props.get("Importance Score", {})),
-        }
+    for page in pages:
+        row = _page_row(page)
         if row["next_action"]:
             rows.append(row)
 
     return rows
 
 
+def _page_row(page):
+    props = page.get("properties", {})
+    return {
+        "notion_page_id": page["id"],
+        "name": _extract_text(props.get("Name", {})),
+        "company": _extract_text(props.get("Company", {})),
+        "from": _extract_text(props.get("From", {})),
+        "subject": _extract_text(props.get("Subject", {})),
+        "stage": _extract_text(props.get("Stage", {})),
+        "priority": _extract_text(props.get("Priority", {})),
+        "next_action": _extract_text(props.get("Next Action", {})),
+        "summary": _extract_text(props.get("Summary", {})),
+        "email_link": _extract_text(props.get("Email Link", {})),
+        "conversation_id": _extract_text(props.get("Conversation ID", {})),
+        "importance_score": _extract_text(props.get("Importance Score", {})),
+        "action_confirm": _extract_text(props.get("Action Confirm", {})),
+    }
+
+
+def confirm_live_row(row):
+    """
+    Re-read a row's page just before acting on it. Returns the live row,
+    or None when the page was archived, Action Confirm was unchecked, or
+    a field the action uses changed since the row was read (the mirror
+    is updated, so a changed row is picked up next cycle).
+    """
+    page_id = row["notion_page_id"]
+    resp = send(requests, "GET", f"{NOTION_API_BASE}/pages/{page_id}", "pages.retrieve", headers=_headers())
+    if resp.status_code == 404:
+        page = {"id": page_id, "archived": True}
+    else:
+        resp.raise_for_status()
+        page = resp.json()
+    mirror = get_mirror(NOTION_DATABASE_ID) if NOTION_INDEX else None
+    if mirror is not None:
+        mirror.upsert_page(page)
+
+    if page.get("archived") or page.get("in_trash"):
+        reason = "page archived"
+    else:
+        live = _page_row(page)
+        changed = [f for f in ACTION_FIELDS if str(live[f] or "").strip() != str(row[f] or "").strip()]
+        if not live["action_confirm"]:
+            reason = "Action Confirm unchecked"
+        elif changed:
+            reason = f"{', '.join(changed)} changed"
+        else:
+            return live
+    print(f"  [SKIP] {row['next_action']} for {row['company'] or row['from']} (page: {page_id[:8]}...): {reason}")
+    return None
+
+
 def update_notion_status(page_id, updates):
     """Update a Notion page's properties after action execution."""
     url = f"{NOTION_API_BASE}/pages/{page_id}"
@@ -145,9 +200,14 @@ def update_notion_status(page_id, updates):
     # Mark status as updated
     properties["Status Updated"] = {"checkbox": True}
 
-    resp = requests.patch(url, headers=_headers(), json={"properties": properties})
+    resp = send(requests, "PATCH", url, "pages.update", headers=_headers(), json={"properties": properties})
     resp.raise_for_status()
-    return resp.json()
+    page = resp.json()
+    mirror = get_mirror(NOTION_DATABASE_ID) if NOTION_INDEX else None
+    if mirror is not None:
+        # Unchecked Action Confirm must leave the mirror now, not on the next pull
+        mirror.upsert_page(page)
+    return page
 
 
 def append_notion_log(page_id, message):
@@ -169,7 +229,7 @@ def append_notion_log(page_id, message):
         ]
     }
 
-    resp = requests.patch(url, headers=_headers(), json=payload)
+    resp = send(requests, "PATCH", url, "blocks.children.append", idempotent=False, headers=_headers(), json=payload)
     resp.raise_for_status()
 
 
@@ -261,6 +321,14 @@ def run_trigger_cycle():
     results = []
     for row in rows:
         page_id = row["notion_page_id"]
+        try:
+            row = confirm_live_row(row)
+        except Exception as e:
+            print(f"  [ERROR] Could not re-read page {page_id[:8]}...: {e}")
+            row = None
+        if row is None:
+            results.append({"page_id": page_id, "status": "skipped"})
+            continue
         try:
             updates = execute_action(row)
             update_notion_status(page_id, updates)
@@ -285,9 +353,10 @@ def run_trigger_cycle():
 
     done = sum(1 for r in results if r["status"] == "done")
     errors = sum(1 for r in results if r["status"] == "error")
-    print(f"[TRIGGER] Cycle complete: {done} done, {errors} errors")
+    skipped = sum(1 for r in results if r["status"] == "skipped")
+    print(f"[TRIGGER] Cycle complete: {done} done, {errors} errors, {skipped} skipped")
 
-    return {"processed": len(results), "done": done, "errors": errors, "results": results}
+    return {"processed": len(results), "done": done, "errors": errors, "skipped": skipped, "results": results}
 
 
 def run_trigger_loop(interval_seconds=60):
@@ -0,0 +1,180 @@
+"""
+Raw Message Store — local, compressed cache of downloaded emails.
+
+Keeps the original RFC822 bytes (zlib-compressed in SQLite) keyed by
+Message-ID, or by content hash when a message has none, so classification
+can be re-run after a prompt or schema change without touching IMAP and
+without the body truncation applied to pipeline rows.
+
+The store is size-capped: once the compressed total exceeds
+RAW_STORE_MAX_MB, least recently used messages are evicted.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+# Empty RAW_STORE_PATH disables the store
+RAW_STORE_PATH = os.getenv("RAW_STORE_PATH", str(Path(__file__).parent / ".raw_store.sqlite3"))
+RAW_STORE_MAX_MB = int(os.getenv("RAW_STORE_MAX_MB", "500"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    key          TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    source       TEXT,
+    uidvalidity  INTEGER,
+    uid          INTEGER,
+    thread_id    TEXT,
+    gm_msgid     TEXT,
+    received_utc TEXT,
+    stored_utc   TEXT NOT NULL,
+    accessed_utc TEXT NOT NULL,
+    raw_size     INTEGER NOT NULL,
+    data         BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_uid ON messages (source, uidvalidity, uid);
+CREATE INDEX IF NOT EXISTS idx_messages_received ON messages (received_utc);
+CREATE INDEX IF NOT EXISTS idx_messages_accessed ON messages (accessed_utc);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def message_key(raw, message_id=None):
+    """Message-ID when present, else a sha256 of the raw bytes."""
+    message_id = (message_id or "").strip()
+    if message_id:
+        return message_id
+    return "sha256:" + hashlib.sha256(raw).hexdigest()
+
+
+class RawStore:
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or RAW_STORE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else RAW_STORE_MAX_MB * 1024 * 1024
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.total = self.db.execute("SELECT COALESCE(SUM(length(data)), 0) FROM messages").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def _touch(self, key):
+        self.db.execute("UPDATE messages SET accessed_utc = ? WHERE key = ?", (_now(), key))
+        self.db.commit()
+
+    def get(self, message_id):
+        """Raw bytes for a Message-ID (or sha256: key), or None."""
+        with self.lock:
+            row = self.db.execute("SELECT key, data FROM messages WHERE key = ?", (message_id.strip(),)).fetchone()
+            if not row:
+                return None
+            self._touch(row[0])
+            return zlib.decompress(row[1])
+
+    def get_by_uid(self, source, uidvalidity, uids):
+        """Map uid -> (raw, meta) for the UIDs of one folder already in the store."""
+        uids = [int(u) for u in uids]
+        if not uids:
+            return {}
+        out = {}
+        with self.lock:
+            for start in range(0, len(uids), 500):
+                part = uids[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self.db.execute(
+                    f"SELECT uid, key, thread_id, gm_msgid, data FROM messages "
+                    f"WHERE source = ? AND uidvalidity = ? AND uid IN ({marks})",
+                    [source, uidvalidity] + part,
+                ).fetchall()
+                for uid, key, thread_id, gm_msgid, data in rows:
+                    out[uid] = (zlib.decompress(data), {"key": key, "thread_id": thread_id, "gm_msgid": gm_msgid})
+            if out:
+                now = _now()
+                self.db.executemany(
+                    "UPDATE messages SET accessed_utc = ? WHERE key = ?",
+                    [(now, meta["key"]) for _, meta in out.values()],
+                )
+                self.db.commit()
+        return out
+
+    def put(self, raw, message_id=None, source=None, uidvalidity=None, uid=None,
+            thread_id=None, gm_msgid=None, received_utc=None):
+        key = message_key(raw, message_id)
+        data = zlib.compress(raw, 6)
+        now = _now()
+        with self.lock:
+            old = self.db.execute("SELECT length(data) FROM messages WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO messages (key, content_hash, source, uidvalidity, uid, thread_id, "
+                "gm_msgid, received_utc, stored_utc, accessed_utc, raw_size, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, hashlib.sha256(raw).hexdigest(), source, uidvalidity, uid, thread_id,
+                 gm_msgid, received_utc, now, now, len(raw), data),
+            )
+            self.total += len(data) - (old[0] if old else 0)
+            self._evict()
+            self.db.commit()
+        return key
+
+    def _evict(self):
+        while self.max_bytes and self.total > self.max_bytes:
+            victims = self.db.execute(
+                "SELECT key, length(data) FROM messages ORDER BY accessed_utc LIMIT 100"
+            ).fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                self.db.execute("DELETE FROM messages WHERE key = ?", (key,))
+                self.total -= size
+                if self.total <= self.max_bytes:
+                    break
+
+    def iter_since(self, since_utc=None):
+        """Yield (raw, meta) for stored messages received at or after since_utc (ISO string), oldest first."""
+        query = "SELECT key FROM messages"
+        params = []
+        if since_utc:
+            query += " WHERE received_utc >= ?"
+            params.append(since_utc)
+        query += " ORDER BY received_utc"
+        with self.lock:
+            keys = [r[0] for r in self.db.execute(query, params).fetchall()]
+        # One message in memory at a time
+        for key in keys:
+            with self.lock:
+                row = self.db.execute(
+                    "SELECT thread_id, gm_msgid, data FROM messages WHERE key = ?", (key,)
+                ).fetchone()
+            if row:
+                yield zlib.decompress(row[2]), {"key": key, "thread_id": row[0], "gm_msgid": row[1]}
+
+    def stats(self):
+        with self.lock:
+            count = self.db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {"messages": count, "compressed_bytes": self.total, "max_bytes": self.max_bytes}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_raw_store():
+    """Process-wide RawStore, or None when RAW_STORE_PATH is empty."""
+    global _store
+    # Parallel mail sources call this from worker threads
+    with _store_lock:
+        if _store is None and RAW_STORE_PATH:
+            _store = RawStore()
+    return _store
@@ -0,0 +1,197 @@
+"""
+Rule Classifier — deterministic fast path ahead of the LLM.
+
+Much of the inbox is boilerplate: ATS "we received your application"
+confirmations, templated rejections and calendar invites. Compiled
+regex rules over sender domain, subject and body recognise these and emit
+a complete LLMResult with a confidence. Only emails no rule matches with
+at least RULES_MIN_CONFIDENCE go to the LLM.
+
+RULES_MODE:
+  on      rule results at or above the threshold replace the LLM call
+  shadow  the LLM is always called; rule output is compared against it
+  off     rules are not evaluated
+"""
+
+import os
+import re
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+RULES_MODE = os.getenv("RULES_MODE", "on").lower()
+RULES_MIN_CONFIDENCE = float(os.getenv("RULES_MIN_CONFIDENCE", "0.9"))
+
+ATS_DOMAINS = re.compile(
+    r"@(?:[\w-]+\.)*(?:greenhouse(?:-mail)?\.io|lever\.co|hire\.lever\.co|myworkday(?:jobs)?\.com|workday\.com|"
+    r"icims\.com|smartrecruiters\.com|ashbyhq\.com|jobvite\.com|taleo\.net|successfactors\.(?:com|eu)|"
+    r"bamboohr\.com|workablemail\.com|workable\.com|recruitee\.com|breezy\.hr|jazzhr\.com|applytojob\.com)\b",
+    re.IGNORECASE,
+)
+NO_REPLY_SENDER = re.compile(r"\b(?:no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?|careers|talent|recruiting)@", re.IGNORECASE)
+
+# Anything asking the candidate to act disqualifies the "no action" rules
+ACTION_REQUEST = re.compile(
+    r"\b(?:schedule|reschedule|your availability|book a time|calendly|assessment|coding (?:test|challenge)|"
+    r"take[- ]home|complete the|next steps? (?:is|are|will be) to|please (?:reply|respond|confirm|submit|complete|provide)|"
+    r"deadline|by (?:end of day|eod|tomorrow)|offer letter|background check)\b",
+    re.IGNORECASE,
+)
+# Shared by the rejection rule and, as an exclusion, the application-received rule
+REJECTION = (r"\b(?:unfortunately,? (?:we|after careful)|(?:will|would) not be (?:moving|proceeding) forward|"
+             r"decided (?:not to|to (?:move|proceed) forward with other|to pursue other)|"
+             r"(?:move|moving) forward with other candidates|position has (?:been|now been) filled|"
+             r"not (?:been )?selected (?:to|for))\b")
+
+
+class Rule:
+    """One compiled rule: a subject/body pattern, optional sender pattern, and the result it emits."""
+
+    def __init__(self, name, text, result, summary, confidence, sender=None, subject=None,
+                 sender_bonus=0.0, blocked_by=ACTION_REQUEST, unless=None):
+        self.name = name
+        self.text = re.compile(text, re.IGNORECASE) if text else None
+        self.unless = re.compile(unless, re.IGNORECASE) if unless else None
+        self.subject = re.compile(subject, re.IGNORECASE) if subject else None
+        self.sender = sender
+        self.result = result
+        self.summary = summary
+        self.confidence = confidence
+        self.sender_bonus = sender_bonus
+        self.blocked_by = blocked_by
+
+    def match(self, from_, subject, body):
+        """Confidence in [0, 1] that this rule applies, or None if it does not match."""
+        if self.subject and not self.subject.search(subject):
+            return None
+        if self.text and not (self.text.search(subject) or self.text.search(body)):
+            return None
+        if self.unless and (self.unless.search(subject) or self.unless.search(body)):
+            return None
+        confidence = self.confidence
+        if self.sender is not None and self.sender.search(from_):
+            confidence += self.sender_bonus
+        if self.blocked_by is not None and self.blocked_by.search(body):
+            # Looks templated but asks for something: leave it to the LLM
+            confidence *= 0.5
+        return min(confidence, 1.0)
+
+
+RULES = [
+    Rule(
+        "ats_application_received",
+        text=(r"\b(?:thank(?:s| you) for (?:your )?(?:applying|application|interest in)|"
+              r"we(?:'ve| have) (?:successfully )?received your application|"
+              r"your application (?:(?:to|for) .{0,80}?)?(?:has been|was) (?:successfully )?(?:received|submitted)|"
+              r"application (?:confirmation|received))\b"),
+        result={"stage": "applied", "priority": "low", "next_action": "archive", "importance_score": 0.2},
+        summary="Application confirmation{company_part}; no action required.",
+        confidence=0.85,
+        sender=re.compile(f"{ATS_DOMAINS.pattern}|{NO_REPLY_SENDER.pattern}", re.IGNORECASE),
+        sender_bonus=0.1,
+        # Rejections open with the same "thank you for your interest in"
+        unless=REJECTION,
+    ),
+    Rule(
+        "templated_rejection",
+        text=REJECTION,
+        result={"stage": "rejected", "priority": "low", "next_action": "archive", "importance_score": 0.1},
+        summary="Rejection{company_part}; no action required.",
+        confidence=0.85,
+        sender=re.compile(f"{ATS_DOMAINS.pattern}|{NO_REPLY_SENDER.pattern}", re.IGNORECASE),
+        sender_bonus=0.1,
+        # Rejections often say "please apply again" or mention the interview
+        blocked_by=re.compile(r"\b(?:schedule|your availability|assessment|offer letter|please (?:reply|respond|confirm))\b",
+                              re.IGNORECASE),
+    ),
+    Rule(
+        "calendar_invite",
+        text=r"\b(?:interview|phone screen|technical screen|onsite|hiring manager|recruiter (?:call|chat|screen))\b",
+        subject=r"^\s*(?:updated )?invitation:",
+        result={"stage": "interview_scheduled", "priority": "high", "next_action": "reply", "importance_score": 0.8},
+        summary="Calendar invite: {subject}. Accept or decline the invitation.",
+        confidence=0.9,
+        blocked_by=None,
+    ),
+]
+
+
+class RuleStats:
+    """Per-rule hit counts and, in shadow mode, agreement with the LLM."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rules = {}
+        self.evaluated = 0
+
+    def _entry(self, name):
+        return self.rules.setdefault(name, {"hits": 0, "used": 0, "compared": 0, "agreed": 0})
+
+    def record_eval(self):
+        with self.lock:
+            self.evaluated += 1
+
+    def record_hit(self, name, used):
+        with self.lock:
+            entry = self._entry(name)
+            entry["hits"] += 1
+            entry["used"] += int(used)
+
+    def record_shadow(self, name, rule_result, llm_result):
+        agreed = all(rule_result.get(k) == llm_result.get(k) for k in ("stage", "next_action"))
+        with self.lock:
+            entry = self._entry(name)
+            entry["compared"] += 1
+            entry["agreed"] += int(agreed)
+        return agreed
+
+    def snapshot(self):
+        with self.lock:
+            return {"evaluated": self.evaluated, "rules": {name: dict(e) for name, e in self.rules.items()}}
+
+    def report(self):
+        snap = self.snapshot()
+        lines = [f"[RULES] {snap['evaluated']} email(s) evaluated (mode={RULES_MODE})"]
+        for name, e in sorted(snap["rules"].items()):
+            line = f"[RULES]   {name}: {e['hits']} hit(s), {e['used']} used instead of the LLM"
+            if e["compared"]:
+                line += f", shadow agreement {e['agreed']}/{e['compared']}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+stats = RuleStats()
+
+
+def _company(from_, subject, body, company):
+    if company and not ATS_DOMAINS.search(from_ or ""):
+        return company
+    match = re.search(r"\b(?:applying|application|interest) (?:to|at|with|in) ([A-Z][\w&.'-]*(?: [A-Z][\w&.'-]*){0,3})",
+                      f"{subject}\n{body[:2000]}")
+    return match.group(1).rstrip(".") if match else ("" if ATS_DOMAINS.search(from_ or "") else company or "")
+
+
+def classify(from_, subject, company, body):
+    """
+    Best matching rule for an email as (rule_name, result, confidence), or
+    None. result has every LLMResult field.
+    """
+    stats.record_eval()
+    from_, subject, body = from_ or "", subject or "", body or ""
+    best = None
+    for rule in RULES:
+        confidence = rule.match(from_, subject, body)
+        if confidence is not None and (best is None or confidence > best[1]):
+            best = (rule, confidence)
+    if best is None:
+        return None
+
+    rule, confidence = best
+    name = _company(from_, subject, body, company)
+    result = dict(rule.result)
+    result["company"] = name
+    result["summary"] = rule.summary.format(company_part=f" from {name}" if name else "", subject=subject.strip())
+    result["due_date"] = None
+    return rule.name, result, confidence
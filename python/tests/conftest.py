@@ -0,0 +1,23 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Keep tests off the developer's local stores, and off the network rate limits
+for name in ("RAW_STORE_PATH", "LLM_CACHE_PATH", "THREAD_STATE_PATH", "NOTION_MIRROR_PATH"):
+    os.environ[name] = ""
+os.environ["NOTION_RATE_PER_SECOND"] = "0"
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture(autouse=True)
+def imap_state_path(monkeypatch, tmp_path):
+    """Per-test sync state file; save_sync_state replaces it in place."""
+    import gmail_source
+
+    path = str(tmp_path / "imap_state.json")
+    monkeypatch.setenv("IMAP_STATE_PATH", path)
+    monkeypatch.setattr(gmail_source, "IMAP_STATE_PATH", path)
+    return path
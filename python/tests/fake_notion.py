@@ -0,0 +1,135 @@
+"""In-memory stand-in for the parts of the Notion API HttpNotionClient uses; pass it as the client's session."""
+
+import json
+import re
+import threading
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+
+class Response:
+    def __init__(self, status_code, data, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.text = json.dumps(data)
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} {self.text}", response=self)
+
+
+def _plain(prop):
+    value = prop.get(prop.get("type"))
+    if isinstance(value, list):
+        return "".join(t.get("plain_text") or t["text"]["content"] for t in value)
+    if isinstance(value, dict):
+        return value.get("name") or value.get("start") or ""
+    return value
+
+
+def _with_plain_text(rich_text):
+    return [dict(t, plain_text=t["text"]["content"]) for t in rich_text]
+
+
+class FakeNotion:
+    """Pages, blocks, a call counter per "METHOD /path" (ids replaced by {id}) and a log of (method, path, body)."""
+
+    def __init__(self):
+        self.pages = {}
+        self.blocks = defaultdict(list)
+        self.schema = {}
+        self.calls = Counter()
+        self.log = []
+        self.clock = 0
+        self.lock = threading.Lock()
+
+    def _timestamp(self):
+        self.clock += 1
+        return datetime.fromtimestamp(1_800_000_000 + self.clock * 60, timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+    def _properties(self, payload):
+        out = {}
+        for name, value in payload.items():
+            ptype = next(iter(value))
+            data = value[ptype]
+            if ptype in ("title", "rich_text"):
+                data = _with_plain_text(data)
+            out[name] = {"type": ptype, ptype: data}
+        return out
+
+    def add_page(self, properties):
+        """Create a page as another client would (bypassing HttpNotionClient)."""
+        return self.request("POST", "https://api.notion.com/v1/pages", json={"properties": properties}).json()["id"]
+
+    def text(self, page_id):
+        """The page's content, paragraphs joined like HttpNotionClient splits them."""
+        return "\n\n".join("".join(t["text"]["content"] for t in b["paragraph"]["rich_text"]) for b in self.blocks[page_id])
+
+    def request(self, method, url, json=None, params=None, headers=None, timeout=None):
+        with self.lock:
+            path = url.split("/v1", 1)[1]
+            self.calls[f"{method} {re.sub(r'[0-9a-f-]{8,}', '{id}', path)}"] += 1
+            self.log.append((method, path, json))
+            return self._handle(method, path, json or {})
+
+    def _over_limits(self, body):
+        """Notion's 400 for more than 100 children or a rich_text object over 2000 characters."""
+        children = body.get("children", [])
+        texts = [t for b in children for t in b[b["type"]].get("rich_text", [])]
+        for prop in body.get("properties", {}).values():
+            value = next(iter(prop.values()), None)
+            if isinstance(value, list):
+                texts += [t for t in value if "text" in t]
+        if len(children) > 100 or any(len(t["text"]["content"]) > 2000 for t in texts):
+            return Response(400, {"object": "error", "code": "validation_error", "message": "body failed validation"})
+        return None
+
+    def _handle(self, method, path, body):
+        rejected = self._over_limits(body) if method in ("POST", "PATCH") else None
+        if rejected:
+            return rejected
+        m = re.fullmatch(r"/databases/([^/]+)/query", path)
+        if m:
+            found = [p for p in self.pages.values() if not p["archived"]]
+            flt = body.get("filter")
+            if flt and "timestamp" in flt:
+                found = [p for p in found if p["last_edited_time"] >= flt["last_edited_time"]["on_or_after"]]
+            elif flt:
+                expected = [v for k, v in flt.items() if k != "property"][0]["equals"]
+                found = [p for p in found if flt["property"] in p["properties"]
+                         and _plain(p["properties"][flt["property"]]) == expected]
+            return Response(200, {"object": "list", "results": found, "has_more": False, "next_cursor": None})
+        if re.fullmatch(r"/databases/([^/]+)", path):
+            if method == "PATCH":
+                self.schema.update(body["properties"])
+            return Response(200, {"properties": {k: {"type": next(iter(v))} for k, v in self.schema.items()}})
+        if path == "/pages" and method == "POST":
+            page_id = str(uuid.uuid4())
+            self.pages[page_id] = {"id": page_id, "archived": False, "last_edited_time": self._timestamp(),
+                                   "properties": self._properties(body["properties"])}
+            self.blocks[page_id] += body.get("children", [])
+            return Response(200, dict(self.pages[page_id]))
+        m = re.fullmatch(r"/pages/([^/]+)", path)
+        if m:
+            page = self.pages[m.group(1)]
+            if method == "PATCH":
+                page["properties"].update(self._properties(body.get("properties", {})))
+                page["archived"] = body.get("archived", page["archived"])
+                page["last_edited_time"] = self._timestamp()
+            return Response(200, dict(page))
+        m = re.fullmatch(r"/blocks/([^/]+)/children", path)
+        if m:
+            if method == "PATCH":
+                self.blocks[m.group(1)] += body["children"]
+                return Response(200, {"results": body["children"]})
+            blocks = [dict(b, paragraph={"rich_text": _with_plain_text(b["paragraph"]["rich_text"])})
+                      for b in self.blocks[m.group(1)]]
+            return Response(200, {"results": blocks, "has_more": False, "next_cursor": None})
+        return Response(404, {"object": "error", "message": f"unknown path {path}"})
@@ -0,0 +1,29 @@
+import threading
+import time
+
+from classify_engine import TokenBucket, map_ordered
+
+
+def test_map_ordered_runs_items_with_the_same_key_one_at_a_time():
+    running, overlaps, lock = {}, [], threading.Lock()
+
+    def work(item):
+        key, n = item
+        with lock:
+            running[key] = running.get(key, 0) + 1
+            overlaps.append(running[key])
+        time.sleep(0.02)
+        with lock:
+            running[key] -= 1
+        return n
+
+    items = [(n % 2, n) for n in range(8)]
+    results = list(map_ordered(work, items, concurrency=4, key=lambda item: item[0]))
+    assert [r for _, r, _ in results] == list(range(8))
+    assert max(overlaps) == 1
+
+
+def test_pause_blocks_acquire():
+    bucket = TokenBucket(per_minute=6000, capacity=1)
+    bucket.pause(0.1)
+    assert bucket.acquire() >= 0.09
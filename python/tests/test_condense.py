@@ -0,0 +1,32 @@
+from condense import condense
+
+OFFER = (
+    "Hi Sam,\n\n"
+    "Great news: we'd like to offer you the Backend Engineer role at a base salary of $150,000.\n\n"
+    "Please keep these terms confidential and sign the offer letter by Friday.\n\n"
+    "Best,\nDana"
+)
+
+
+def test_content_mentioning_footer_words_is_kept():
+    text = condense(OFFER).text
+    assert "keep these terms confidential and sign the offer letter by Friday" in text
+    assert "$150,000" in text
+    assert "Best,\nDana" in text
+
+
+def test_trailing_footers_are_stripped():
+    body = OFFER + (
+        "\n\nCONFIDENTIALITY NOTICE: This email and any attachments are confidential and intended solely "
+        "for the named recipient.\n\n"
+        "To unsubscribe, visit https://acme.example/prefs. Acme Inc. All rights reserved."
+    )
+    text = condense(body).text
+    assert "by Friday" in text and "Best,\nDana" in text
+    assert "CONFIDENTIALITY NOTICE" not in text
+    assert "unsubscribe" not in text
+
+
+def test_footer_before_more_content_is_kept():
+    body = "Hi,\n\nView this email in your browser\n\nYour interview is on Monday at 10am."
+    assert "View this email" in condense(body).text
@@ -0,0 +1,196 @@
+import json
+import threading
+import time
+
+import pytest
+
+import gmail_source
+from fake_imap_server import Mailbox, make_message, serve
+from gmail_source import HeaderFilter, ImapSession, SyncCheckpoint, close_source_sessions, fetch_new, fetch_new_iter, fetch_sources
+
+
+@pytest.fixture
+def mailbox():
+    mailbox = Mailbox()
+    server, port = serve(mailbox)
+    mailbox.port = port
+    yield mailbox
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session(mailbox):
+    session = ImapSession("127.0.0.1", mailbox.port, "me@example.com", "fake", ssl=False)
+    yield session
+    session.close()
+
+
+def _add(mailbox, count):
+    start = len(mailbox.messages("INBOX"))
+    for n in range(start + 1, start + count + 1):
+        mailbox.add(make_message(n))
+
+
+def _state(path):
+    return json.loads(path.read_text())["me@example.com:INBOX"]
+
+
+def test_mark_stops_below_unsettled_rows(mailbox, session, tmp_path):
+    _add(mailbox, 5)
+    path = tmp_path / "state.json"
+    checkpoint = SyncCheckpoint(path)
+    rows = list(fetch_new_iter(session=session, state_path=path, checkpoint=checkpoint))
+    assert [row["imap_uid"] for row in rows] == [1, 2, 3, 4, 5]
+
+    checkpoint.settle(rows[0])
+    checkpoint.settle(rows[1])
+    checkpoint.settle(rows[2], ok=False)
+    checkpoint.save()
+    assert _state(path) == {"uidvalidity": 1, "last_uid": 3, "retry": {"3": 1}}
+
+    checkpoint.settle(rows[3])
+    checkpoint.settle(rows[4])
+    checkpoint.save()
+    assert _state(path) == {"uidvalidity": 1, "last_uid": 5, "retry": {"3": 1}}
+
+
+def test_failed_rows_are_fetched_again_first(mailbox, session, tmp_path):
+    _add(mailbox, 3)
+    path = tmp_path / "state.json"
+    checkpoint = SyncCheckpoint(path)
+    for row in fetch_new_iter(session=session, state_path=path, checkpoint=checkpoint):
+        checkpoint.settle(row, ok=row["imap_uid"] != 2)
+    checkpoint.save()
+
+    _add(mailbox, 1)
+    checkpoint = SyncCheckpoint(path)
+    rows = list(fetch_new_iter(session=session, state_path=path, checkpoint=checkpoint))
+    assert [row["imap_uid"] for row in rows] == [2, 4]
+    assert rows[0]["message_id"] == "<m2@example.com>"
+    for row in rows:
+        checkpoint.settle(row)
+    checkpoint.save()
+    assert _state(path) == {"uidvalidity": 1, "last_uid": 4}
+
+
+def test_retries_give_up_after_max_attempts(mailbox, session, tmp_path, monkeypatch):
+    monkeypatch.setattr(gmail_source, "IMAP_RETRY_MAX_ATTEMPTS", 2)
+    _add(mailbox, 1)
+    path = tmp_path / "state.json"
+    for expected in ({"1": 1}, {}):
+        checkpoint = SyncCheckpoint(path)
+        for row in fetch_new_iter(session=session, state_path=path, checkpoint=checkpoint):
+            checkpoint.settle(row, ok=False)
+        checkpoint.save()
+        assert _state(path).get("retry", {}) == expected
+
+
+def test_without_checkpoint_mark_is_saved_when_exhausted(mailbox, session, tmp_path):
+    _add(mailbox, 2)
+    path = tmp_path / "state.json"
+    assert len(fetch_new(session=session, state_path=path)) == 2
+    assert _state(path) == {"uidvalidity": 1, "last_uid": 2}
+    _add(mailbox, 1)
+    assert [row["imap_uid"] for row in fetch_new(session=session, state_path=path)] == [3]
+
+
+def test_idle_sees_exists_sent_with_the_continuation(mailbox, session):
+    _add(mailbox, 1)
+    session.select("INBOX")
+    _add(mailbox, 1)
+    start = time.monotonic()
+    events = session.idle("INBOX", timeout=5)
+    assert events == [b"* 2 EXISTS"]
+    assert time.monotonic() - start < 1
+
+
+def test_idle_wakes_on_new_mail(mailbox, session):
+    _add(mailbox, 1)
+    session.select("INBOX")
+    threading.Timer(0.2, _add, (mailbox, 1)).start()
+    assert session.idle("INBOX", timeout=5) == [b"* 2 EXISTS"]
+    # The session is usable again after DONE
+    assert session.search("INBOX", "ALL") == [b"1", b"2"]
+
+
+def test_read_ahead_commits_nothing_until_rows_are_settled(mailbox, tmp_path):
+    _add(mailbox, 3)
+    path = tmp_path / "state.json"
+    source = {"name": "me@example.com:INBOX", "host": "127.0.0.1", "port": mailbox.port,
+              "user": "me@example.com", "password": "fake", "folder": "INBOX", "ssl": False}
+    checkpoint = SyncCheckpoint(path)
+    try:
+        rows = fetch_sources(sources=[source], state_path=path, checkpoint=checkpoint)
+    finally:
+        close_source_sessions()
+    assert len(rows) == 3
+    checkpoint.save()
+    assert _state(path)["last_uid"] == 0
+
+    checkpoint.settle(rows[0])
+    checkpoint.save()
+    assert _state(path)["last_uid"] == 1
+
+
+def test_backfill_searches_the_window_without_moving_the_mark_back(mailbox, session, tmp_path):
+    _add(mailbox, 3)
+    path = tmp_path / "state.json"
+    fetch_new(session=session, state_path=path)
+    assert fetch_new(session=session, state_path=path) == []
+
+    checkpoint = SyncCheckpoint(path)
+    rows = list(fetch_new_iter(days=365, limit=0, session=session, state_path=path,
+                               checkpoint=checkpoint, backfill=True))
+    assert [row["imap_uid"] for row in rows] == [1, 2, 3]
+    checkpoint.settle(rows[0], ok=False)
+    checkpoint.save()
+    assert _state(path) == {"uidvalidity": 1, "last_uid": 3, "retry": {"1": 1}}
+
+
+@pytest.mark.parametrize("header_echo", ["same", "quoted", "none"])
+def test_two_phase_fetch_keeps_mail_whatever_the_header_item_looks_like(mailbox, session, tmp_path, header_echo):
+    mailbox.header_echo = header_echo
+    mailbox.add(make_message(1, subject="Interview with Acme", body="Are you free on Monday?"))
+    mailbox.add(make_message(2, subject="Weekly newsletter"))
+    rows = fetch_new(session=session, state_path=tmp_path / "state.json", header_filter=HeaderFilter())
+    if header_echo == "none":
+        # No headers to filter on: both are kept, fetched whole
+        assert [row["message_id"] for row in rows] == ["<m1@example.com>", "<m2@example.com>"]
+    else:
+        assert [row["message_id"] for row in rows] == ["<m1@example.com>"]
+    assert rows[0]["subject"] == "Interview with Acme"
+    assert "Are you free on Monday?" in rows[0]["body"]
+
+
+def test_prefilter_keeps_tracked_threads_and_senders_and_stores_them(mailbox, session, tmp_path, monkeypatch):
+    import main
+    from raw_store import RawStore
+    from thread_state import ThreadState
+
+    mailbox.add(make_message(1, subject="Re: quick chat", body="Does Tuesday work?"), thread_id=77)
+    mailbox.add(make_message(2, sender="hr@globex.com", subject="Lunch?", body="Free on Friday?"))
+    mailbox.add(make_message(3, sender="news@shop.com", subject="Weekly deals"))
+    (tracked,) = [row for row in fetch_new(session=session, state_path=tmp_path / "first.json")
+                  if row["message_id"] == "<m1@example.com>"]
+    store = ThreadState(str(tmp_path / "threads.sqlite3"))
+    store.record(dict(tracked, stage="interviewing"))
+    monkeypatch.setattr(main, "get_thread_state", lambda: store)
+    monkeypatch.setattr(main, "known_threads", lambda: (set(), {"globex.com"}))
+    raw_store = RawStore(str(tmp_path / "raw.sqlite3"))
+    monkeypatch.setattr(gmail_source, "get_raw_store", lambda: raw_store)
+
+    rows = fetch_new(session=session, state_path=tmp_path / "state.json", header_filter=main._prefilter())
+    assert [row["message_id"] for row in rows] == ["<m1@example.com>", "<m2@example.com>"]
+    cached = {row["message_id"]: row for row in gmail_source.iter_cached_rows()}
+    assert set(cached) == {"<m1@example.com>", "<m2@example.com>"}
+    assert cached["<m1@example.com>"]["subject"] == "Re: quick chat"
+    assert "Does Tuesday work?" in cached["<m1@example.com>"]["body"]
+
+
+def test_gmail_thread_id_keeps_the_references_hash_as_legacy_id(mailbox, session, tmp_path):
+    mailbox.add(make_message(1), thread_id=0x18c2f0a9)
+    (row,) = fetch_new(session=session, state_path=tmp_path / "state.json")
+    assert row["conversation_id"] == "18c2f0a9"
+    assert row["legacy_conversation_id"] == gmail_source._make_conversation_id(
+        gmail_source.email.message_from_bytes(make_message(1)))
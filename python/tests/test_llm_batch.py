@@ -0,0 +1,40 @@
+import pytest
+
+import LLM
+import llm_batch
+from fake_batch_server import serve
+
+EMAILS = [
+    {"from_": "jobs@acme.com", "subject": "Your offer", "company": "Acme", "received_utc": "2026-10-01T10:00:00+00:00",
+     "body": "We are pleased to offer you the Backend Engineer role."},
+    {"from_": "jobs@globex.com", "subject": "Update", "company": "Globex", "received_utc": "2026-10-02T10:00:00+00:00",
+     "body": "Unfortunately, we are moving forward with other candidates."},
+    {"from_": "jobs@initech.com", "subject": "Broken [fake-error]", "company": "Initech",
+     "received_utc": "2026-10-03T10:00:00+00:00", "body": "Hello."},
+]
+
+
+@pytest.mark.parametrize("provider, base_url_env, path", [
+    ("anthropic", "ANTHROPIC_BASE_URL", ""),
+    ("openai", "OPENAI_BASE_URL", "/v1"),
+])
+def test_batch_round_trip(monkeypatch, capsys, provider, base_url_env, path):
+    server, port = serve(delay=0.3)
+    try:
+        monkeypatch.setenv(LLM.API_KEY_ENV[provider], "fake")
+        monkeypatch.setenv(base_url_env, f"http://127.0.0.1:{port}{path}")
+        monkeypatch.setattr(LLM, "LLM_PROVIDER", provider)
+        monkeypatch.setattr(LLM, "_clients", {})
+
+        results = llm_batch.classify_batch(EMAILS, poll_interval=0.1, timeout=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [r["stage"] for r in results[:2]] == ["offer", "rejected"]
+    assert results[0]["next_action"] == "sign_offer"
+    assert isinstance(results[2], Exception)
+    out = capsys.readouterr().out
+    assert "[BATCH] Submitted" in out
+    # Polled while the batch was still running, then read the results once it ended
+    assert "in_progress" in out
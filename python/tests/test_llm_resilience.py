@@ -0,0 +1,74 @@
+import time
+
+import LLM
+import llm_resilience
+from llm_cache import LLMCache
+
+
+class SlowLimiter:
+    """Throttled: every acquire waits a while."""
+
+    def __init__(self, wait):
+        self.wait = wait
+
+    def acquire(self, tokens=0):
+        time.sleep(self.wait)
+        return self.wait
+
+
+def test_rate_limiter_wait_does_not_trigger_a_hedge(monkeypatch):
+    provider = "hedge-test"
+    monkeypatch.setattr(llm_resilience, "LLM_HEDGE", True)
+    monkeypatch.setattr(llm_resilience, "get_limiter", lambda name: SlowLimiter(0.3))
+    histogram = llm_resilience.get_histogram(provider)
+    for _ in range(llm_resilience.LLM_HEDGE_MIN_SAMPLES):
+        histogram.observe(0.02)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.01)
+        return "ok"
+
+    before = llm_resilience.stats.snapshot()["hedges"]
+    assert llm_resilience.call_with_retries(provider, fn) == "ok"
+    assert llm_resilience.stats.snapshot()["hedges"] == before
+    assert len(calls) == 1
+
+
+def test_missing_primary_key_fails_over(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.setattr(LLM, "_clients", {})
+    result = llm_resilience.call_with_failover([
+        ("anthropic", lambda: LLM.get_client("anthropic")),
+        ("openai", lambda: "answered by openai"),
+    ])
+    assert result == "answered by openai"
+
+
+def test_failover_answers_are_cached_under_the_provider_that_answered(monkeypatch, tmp_path):
+    cache = LLMCache(LLM.PROMPT_VERSION, path=str(tmp_path / "cache.sqlite"))
+    result = {"stage": "applied", "priority": "low", "next_action": "wait", "importance_score": 0.2,
+              "summary": "Application received", "company": "Acme", "due_date": None}
+
+    def unavailable(*args):
+        raise LLM.ProviderUnavailableError("ANTHROPIC_API_KEY not set")
+
+    monkeypatch.setattr(LLM, "LLM_PROVIDER", "anthropic")
+    monkeypatch.setattr(LLM, "providers", lambda: ["anthropic", "openai"])
+    monkeypatch.setattr(LLM, "get_llm_cache", lambda version: cache)
+    monkeypatch.setattr(LLM, "_SINGLE_CALLS", {"anthropic": unavailable, "openai": lambda prompt: dict(result)})
+    monkeypatch.setattr(LLM, "_call_anthropic_multi", unavailable)
+    monkeypatch.setattr(LLM, "_call_openai_multi",
+                        lambda prompt, n: [dict(result, index=i) for i in range(n)])
+
+    emails = [{"from_": "jobs@acme.com", "subject": f"Application {n}", "company": "Acme",
+               "received_utc": "2026-10-01T10:00:00+00:00", "body": f"Thanks for applying ({n})."} for n in range(3)]
+    assert LLM.classify_email(**emails[0])["stage"] == "applied"
+    assert [r["stage"] for r in LLM.classify_emails(emails[1:])] == ["applied", "applied"]
+
+    for email in emails:
+        assert cache.get(LLM.email_cache_key(**email)) is None
+        assert cache.get(LLM.email_cache_key(**email, provider="openai"))["stage"] == "applied"
+    rows = cache.db.execute("SELECT DISTINCT provider, model FROM results").fetchall()
+    assert rows == [("openai", LLM.current_model("openai"))]
@@ -0,0 +1,44 @@
+import base64
+from email.message import EmailMessage
+
+from mime_text import decode_section, extract_body
+
+TEXT = "".join(f"Line {n}: thanks for applying to the platform team.\n" for n in range(2000))
+
+
+def _encoded(text):
+    return base64.encodebytes(text.encode()).replace(b"\n", b"\r\n")
+
+
+def _cut(data, remainder):
+    """Truncate near 64 KiB (like a capped BODY.PEEK) so remainder base64 chars follow the last full quantum."""
+    end = 65536
+    while len(data[:end].replace(b"\r\n", b"")) % 4 != remainder or data[end - 1:end] in (b"\r", b"\n"):
+        end -= 1
+    return data[:end], len(data[:end].replace(b"\r\n", b""))
+
+
+def test_base64_section_cut_mid_quantum_keeps_the_decodable_prefix():
+    data, clean = _cut(_encoded(TEXT), 1)
+    text = decode_section(data, "base64", "utf-8")
+    assert TEXT.startswith(text)
+    assert len(text) == clean // 4 * 3
+
+
+def test_base64_section_with_partial_last_quantum_decodes_its_bytes():
+    data, clean = _cut(_encoded(TEXT), 3)
+    text = decode_section(data, "base64", "utf-8")
+    assert TEXT.startswith(text)
+    assert len(text) == clean // 4 * 3 + 2
+
+
+def test_base64_ignores_stray_characters():
+    data = _encoded("Interview on Monday?")
+    assert decode_section(b"!" + data[:8] + b" *\r\n" + data[8:], "base64", "utf-8") == "Interview on Monday?"
+
+
+def test_extract_body_decodes_base64_plain_part():
+    msg = EmailMessage()
+    msg.set_content(TEXT, cte="base64")
+    assert extract_body(msg, max_chars=500) == TEXT[:500]
+    assert extract_body(msg) == TEXT
@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+
+from fake_notion import FakeNotion
+from notion_sync import writer
+from notion_sync.idempotency import sync_row
+from notion_sync.notion_client import HttpNotionClient
+from notion_sync.page_index import get_page_index
+
+ROW = {"message_id": "<m1@example.com>", "conversation_id": "thread-1", "from": "recruiter@acme.com",
+       "subject": "Backend Engineer", "company": "Acme", "body": "Can you do a call on Thursday?",
+       "stage": "interview_scheduled", "priority": "high", "next_action": "reply", "summary": "Call request",
+       "llm_status": "DONE"}
+
+
+@pytest.fixture
+def notion():
+    fake = FakeNotion()
+    fake.client = HttpNotionClient("token", f"db-{uuid.uuid4().hex}", session=fake)
+    get_page_index(fake.client, refresh=True)
+    return fake
+
+
+def _sync(notion, **changes):
+    status, page_id, error = sync_row(dict(ROW, **changes), notion.client, notion.client.database_id)
+    assert (status, error) == ("DONE", None)
+    return page_id
+
+
+def test_known_body_is_not_appended_again_and_blocks_are_not_read(notion):
+    page_id = _sync(notion)
+    _sync(notion)
+    assert notion.text(page_id).count(ROW["body"]) == 1
+    assert notion.calls["PATCH /blocks/{id}/children"] == 0
+
+    _sync(notion, message_id="<m2@example.com>", body="Thursday works, 3pm?")
+    assert notion.calls["PATCH /blocks/{id}/children"] == 1
+    assert "Thursday works, 3pm?" in notion.text(page_id)
+    # Answered from the hashes in the mirror, never from the page's blocks
+    assert notion.calls["GET /blocks/{id}/children"] == 0
+
+
+def test_page_without_recorded_hashes_falls_back_to_its_text(notion):
+    page_id = notion.add_page({"Conversation ID": {"rich_text": [{"type": "text", "text": {"content": "thread-1"}}]}})
+    notion.blocks[page_id].append({"object": "block", "type": "paragraph", "paragraph": {
+        "rich_text": [{"type": "text", "text": {"content": ROW["body"]}}]}})
+    get_page_index(notion.client, refresh=True)
+
+    assert _sync(notion) == page_id
+    assert notion.calls["GET /blocks/{id}/children"] == 1
+    assert notion.calls["PATCH /blocks/{id}/children"] == 0
+
+
+def test_update_sends_only_changed_properties(notion):
+    page_id = _sync(notion)
+    before = writer.snapshot().get("pages.update", {}).get("skipped", 0)
+    _sync(notion)
+    assert notion.calls["PATCH /pages/{id}"] == 1  # Status Updated flips on the first update only
+    _sync(notion)
+    assert notion.calls["PATCH /pages/{id}"] == 1
+    assert writer.snapshot()["pages.update"]["skipped"] - before == 1
+
+    _sync(notion, summary="Call moved to Friday")
+    body = [body for method, path, body in notion.log if (method, path) == ("PATCH", f"/pages/{page_id}")][-1]
+    assert set(body["properties"]) == {"Summary", "Description"}
+
+
+def test_page_keyed_by_the_legacy_hash_is_updated_not_duplicated(notion):
+    page_id = _sync(notion, conversation_id="5e8a1b2c3d4e5f60")
+    get_page_index(notion.client, refresh=True)
+    assert _sync(notion, conversation_id="18c2f0a9", legacy_conversation_id="5e8a1b2c3d4e5f60",
+                 message_id="<m2@example.com>", body="Following up.") == page_id
+    assert len(notion.pages) == 1
+    assert notion.pages[page_id]["properties"]["Conversation ID"]["rich_text"][0]["plain_text"] == "18c2f0a9"
+    # Found under the new ID from now on
+    assert _sync(notion, conversation_id="18c2f0a9", message_id="<m3@example.com>", body="Any news?") == page_id
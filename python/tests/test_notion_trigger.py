@@ -0,0 +1,51 @@
+import uuid
+
+import pytest
+
+import notion_trigger
+from fake_notion import FakeNotion
+from notion_sync.notion_client import HttpNotionClient
+
+
+def _text(value):
+    return [{"type": "text", "text": {"content": value}}]
+
+
+def _page(fake, company, action="archive"):
+    return fake.add_page({
+        "Name": {"title": _text(f"Application at {company}")},
+        "Company": {"rich_text": _text(company)},
+        "From": {"rich_text": _text(f"jobs@{company.lower()}.com")},
+        "Next Action": {"rich_text": _text(action)},
+        "Action Confirm": {"checkbox": True},
+    })
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeNotion()
+    database_id = f"db-{uuid.uuid4().hex}"
+    monkeypatch.setattr(notion_trigger, "NOTION_TOKEN", "token")
+    monkeypatch.setattr(notion_trigger, "NOTION_DATABASE_ID", database_id)
+    monkeypatch.setattr(notion_trigger, "requests", fake)
+    monkeypatch.setattr(notion_trigger, "HttpNotionClient",
+                        lambda token, database_id: HttpNotionClient(token, database_id, session=fake))
+    return fake
+
+
+def test_stale_mirror_rows_are_rechecked_before_acting(fake, monkeypatch):
+    kept, archived, edited, unchecked = (_page(fake, name) for name in ("Acme", "Globex", "Initech", "Hooli"))
+    rows = notion_trigger.query_actionable_rows()
+    assert len(rows) == 4
+
+    # Edits the mirror hasn't pulled yet (no last_edited_time bump)
+    fake.pages[archived]["archived"] = True
+    fake.pages[edited]["properties"]["Next Action"]["rich_text"] = [
+        {"type": "text", "text": {"content": "send_cold"}, "plain_text": "send_cold"}]
+    fake.pages[unchecked]["properties"]["Action Confirm"]["checkbox"] = False
+    monkeypatch.setattr(notion_trigger, "query_actionable_rows", lambda: rows)
+    result = notion_trigger.run_trigger_cycle()
+    assert (result["done"], result["skipped"]) == (1, 3)
+    assert [r["page_id"] for r in result["results"] if r["status"] == "done"] == [kept]
+    assert fake.calls["PATCH /pages/{id}"] == 1
+    assert fake.pages[kept]["properties"]["Stage"]["select"]["name"] == "withdrawn"
@@ -0,0 +1,43 @@
+import pytest
+
+import rule_classifier
+
+GREENHOUSE = "no-reply@us.greenhouse-mail.io"
+
+
+@pytest.mark.parametrize("subject, body, expected", [
+    (
+        "Thank you for applying to Acme",
+        "Hi Sam,\n\nThank you for your interest in Acme! We have received your application for "
+        "Backend Engineer and our team will review it.",
+        ("ats_application_received", "applied"),
+    ),
+    (
+        "Your application to Acme",
+        "Hi Sam,\n\nThank you for your interest in Acme. Unfortunately, we have decided to move forward "
+        "with other candidates for the Backend Engineer role.",
+        ("templated_rejection", "rejected"),
+    ),
+    (
+        "Application received: Backend Engineer",
+        "We have received your application and appreciate the time you took. After careful review we "
+        "will not be moving forward with your candidacy at this time.",
+        ("templated_rejection", "rejected"),
+    ),
+])
+def test_ats_mail_is_classified_by_the_right_rule(subject, body, expected):
+    name, result, confidence = rule_classifier.classify(GREENHOUSE, subject, "", body)
+    assert (name, result["stage"]) == expected
+    assert result["next_action"] == "archive"
+    assert confidence >= rule_classifier.RULES_MIN_CONFIDENCE
+
+
+def test_rejection_asking_for_a_reply_goes_to_the_llm():
+    name, result, confidence = rule_classifier.classify(
+        GREENHOUSE, "Your application to Acme", "",
+        "Thank you for your interest in Acme. Unfortunately, we will not be moving forward. "
+        "Please reply if you would like feedback.")
+    assert (name, result["stage"]) == ("templated_rejection", "rejected")
+    # Asks for a reply: blocked down to half its confidence, below the threshold
+    assert confidence == pytest.approx(0.475)
+    assert confidence < rule_classifier.RULES_MIN_CONFIDENCE
@@ -0,0 +1,113 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import main
+from fake_notion import FakeNotion
+from notion_sync.notion_client import HttpNotionClient
+from notion_sync.runner import iter_sync_dict_rows
+
+RESULT = {"stage": "interviewed", "priority": "high", "next_action": "reply", "importance_score": 0.8,
+          "summary": "Recruiter follow-up", "company": "Acme", "due_date": None}
+
+
+def _row(n, conversation_id="thread-1"):
+    return {"message_id": f"<m{n}@example.com>", "conversation_id": conversation_id, "from": "recruiter@acme.com",
+            "subject": f"Re: Backend Engineer ({n})", "body": f"Body of message {n}.",
+            "received_utc": f"2026-10-0{n}T10:00:00+00:00", "llm_status": "NEW"}
+
+
+@pytest.fixture
+def classify(monkeypatch):
+    failing = set()
+
+    def fake(row):
+        if row["message_id"] in failing:
+            raise RuntimeError("LLM unavailable")
+        return dict(RESULT)
+
+    monkeypatch.setattr(main, "_classify_one", fake)
+    return failing
+
+
+@pytest.fixture
+def notion():
+    fake = FakeNotion()
+    fake.client = HttpNotionClient("token", f"db-{uuid.uuid4().hex}", session=fake)
+    return fake
+
+
+def _push(rows, notion):
+    return list(iter_sync_dict_rows(main.iter_classify_rows(rows, multi=False), client=notion.client))
+
+
+def test_superseded_bodies_reach_the_page(classify, notion):
+    results = _push([_row(1), _row(2), _row(3)], notion)
+    assert [r["llm_status"] for r in results] == ["DONE", "SUPERSEDED", "SUPERSEDED"]
+    (page_id,) = notion.pages
+    text = notion.text(page_id)
+    assert [text.find(f"Body of message {n}.") >= 0 for n in (1, 2, 3)] == [True] * 3
+    assert text.index("message 1") < text.index("message 2") < text.index("message 3")
+
+    # A later run appends only what the page lacks
+    _push([_row(3), _row(4)], notion)
+    text = notion.text(page_id)
+    assert text.count("Body of message 3.") == 1
+    assert "Body of message 4." in text
+
+
+def test_failed_latest_falls_back_to_the_previous_message(classify, notion):
+    classify.add("<m3@example.com>")
+    rows = list(main.iter_classify_rows([_row(1), _row(2), _row(3)], multi=False))
+    assert [(r["message_id"], r["llm_status"]) for r in rows] == [
+        ("<m2@example.com>", "DONE"), ("<m3@example.com>", "ERROR"), ("<m1@example.com>", "SUPERSEDED"),
+    ]
+    assert rows[0]["stage"] == "interviewed"
+    assert [m["message_id"] for m in rows[0]["thread_earlier"]] == ["<m1@example.com>"]
+    assert "thread_earlier" not in rows[1]
+    assert rows[2]["superseded_by"] == "<m2@example.com>"
+
+    list(iter_sync_dict_rows(rows, client=notion.client))
+    (page_id,) = notion.pages
+    text = notion.text(page_id)
+    assert all(f"Body of message {n}." in text for n in (1, 2, 3))
+
+
+def test_failed_fallback_is_reported_as_error(classify):
+    classify.update({"<m2@example.com>", "<m3@example.com>"})
+    rows = list(main.iter_classify_rows([_row(1), _row(2), _row(3)], multi=False))
+    assert [r["llm_status"] for r in rows] == ["ERROR", "ERROR", "SUPERSEDED"]
+
+
+def test_long_thread_is_written_within_notion_limits(classify, notion):
+    rows = [dict(_row(n), body="\n\n".join(f"Message {n}, paragraph {p}." for p in range(40))) for n in (1, 2, 3)]
+    rows[2]["body"] += "\n\n" + "x" * 4500
+    results = _push(rows, notion)
+    assert [r["llm_status"] for r in results] == ["DONE", "SUPERSEDED", "SUPERSEDED"]
+    (page_id,) = notion.pages
+    assert len(notion.blocks[page_id]) > 100
+    assert notion.calls["PATCH /blocks/{id}/children"] >= 1
+    text = notion.text(page_id)
+    assert all(f"Message {n}, paragraph 39." in text for n in (1, 2, 3))
+    assert "x" * 4500 in text
+
+
+def test_rows_are_classified_while_the_source_is_still_fetching(classify):
+    resume = threading.Event()
+
+    def source():
+        yield _row(1, "thread-1")
+        yield _row(2, "thread-2")
+        resume.wait(timeout=10)
+        yield _row(3, "thread-3")
+
+    start = time.monotonic()
+    # concurrency=1: only the thread window may hold rows back here
+    rows = main.iter_classify_rows(source(), concurrency=1, multi=False)
+    first = next(rows)
+    assert time.monotonic() - start < 3
+    assert first["llm_status"] == "DONE"
+    resume.set()
+    assert [r["message_id"] for r in rows] == ["<m2@example.com>", "<m3@example.com>"]
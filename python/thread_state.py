@@ -0,0 +1,155 @@
+"""
+Thread State — last classified state of each conversation.
+
+A recruiter thread fetched in one window used to cost one LLM call and one
+Notion update per message, though only the newest decides stage and
+next_action. main.py now classifies only the latest message of each
+conversation_id; the older ones are marked SUPERSEDED and skip the LLM.
+
+This store keeps, per conversation_id, the result applied last and how
+many messages it covered. digest() turns that plus the skipped earlier
+messages into a few lines of context for the latest message's prompt.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+# 0 classifies every message on its own, as before
+LLM_THREAD_AWARE = os.getenv("LLM_THREAD_AWARE", "1") == "1"
+# Rows read ahead to group a thread's messages. A window also closes
+# THREAD_WAIT_SECONDS after its first row, or once the source has had nothing
+# new for THREAD_IDLE_SECONDS, so a slow source doesn't hold back classification.
+# A thread split across two windows gets one classification per window.
+THREAD_WINDOW = int(os.getenv("LLM_THREAD_WINDOW", "200"))
+THREAD_WAIT_SECONDS = float(os.getenv("LLM_THREAD_WAIT_SECONDS", "3"))
+THREAD_IDLE_SECONDS = 0.5
+# Empty THREAD_STATE_PATH disables the store (the digest then only covers the current window)
+THREAD_STATE_PATH = os.getenv("THREAD_STATE_PATH", str(Path(__file__).parent / ".thread_state.sqlite3"))
+# Earlier messages listed in a digest; the rest are only counted
+DIGEST_MAX_MESSAGES = 5
+DIGEST_SUMMARY_CHARS = 240
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    conversation_id   TEXT PRIMARY KEY,
+    stage             TEXT,
+    priority          TEXT,
+    next_action       TEXT,
+    due_date          TEXT,
+    company           TEXT,
+    summary           TEXT,
+    last_message_id   TEXT,
+    last_subject      TEXT,
+    last_received_utc TEXT,
+    messages          INTEGER NOT NULL DEFAULT 0,
+    updated_utc       TEXT NOT NULL
+);
+"""
+
+FIELDS = ("stage", "priority", "next_action", "due_date", "company", "summary",
+          "last_message_id", "last_subject", "last_received_utc", "messages")
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def _clip(text, limit):
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class ThreadState:
+    def __init__(self, path=None):
+        self.path = path or THREAD_STATE_PATH
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def get(self, conversation_id):
+        """Last recorded state as a dict, or None."""
+        with self.lock:
+            row = self.db.execute(f"SELECT {', '.join(FIELDS)} FROM threads WHERE conversation_id = ?",
+                                  (conversation_id,)).fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    def conversation_ids(self):
+        with self.lock:
+            return {r[0] for r in self.db.execute("SELECT conversation_id FROM threads").fetchall()}
+
+    def record(self, row, covered=1):
+        """Store a classified row as its thread's state; covered = messages it stands for."""
+        conversation_id = row.get("conversation_id")
+        if not conversation_id:
+            return
+        with self.lock:
+            previous = self.db.execute(
+                "SELECT last_received_utc, messages, last_message_id FROM threads WHERE conversation_id = ?",
+                (conversation_id,)).fetchone()
+            received = str(row.get("received_utc") or "")
+            if previous and previous[2] and previous[2] == row.get("message_id"):
+                # Reclassified: same message, so the count doesn't grow
+                messages = max(previous[1], covered)
+            else:
+                messages = (previous[1] if previous else 0) + covered
+            if previous and previous[0] and received and received < previous[0]:
+                # A late-arriving older message doesn't replace the newer state
+                self.db.execute("UPDATE threads SET messages = ?, updated_utc = ? WHERE conversation_id = ?",
+                                (messages, _now(), conversation_id))
+            else:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO threads (conversation_id, stage, priority, next_action, due_date, company, "
+                    "summary, last_message_id, last_subject, last_received_utc, messages, updated_utc) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (conversation_id, row.get("stage"), row.get("priority"), row.get("next_action"),
+                     row.get("due_date"), row.get("company"), row.get("summary"), row.get("message_id"),
+                     row.get("subject"), received, messages, _now()),
+                )
+            self.db.commit()
+
+
+def digest(previous, earlier):
+    """
+    Compact context for the latest message of a thread.
+
+    previous: ThreadState.get() result or None. earlier: rows of this
+    thread's older messages in the current window, oldest first.
+    Returns "" when there is nothing to say.
+    """
+    lines = []
+    if previous:
+        state = f"stage={previous['stage']}, next_action={previous['next_action']}, priority={previous['priority']}"
+        if previous.get("due_date"):
+            state += f", due_date={previous['due_date']}"
+        lines.append(f"Previously classified ({previous['messages']} message(s), last {previous['last_received_utc']}): "
+                     f"{state}")
+        if previous.get("summary"):
+            lines.append(f"Previous summary: {_clip(previous['summary'], DIGEST_SUMMARY_CHARS)}")
+    if earlier:
+        lines.append(f"Earlier unclassified message(s) in this thread: {len(earlier)}")
+        for row in earlier[-DIGEST_MAX_MESSAGES:]:
+            lines.append(f"- {row.get('received_utc', '')} from {_clip(row.get('from'), 80)}: "
+                         f"{_clip(row.get('subject'), 120)}")
+    return "\n".join(lines)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_thread_state():
+    """Process-wide ThreadState, or None when THREAD_STATE_PATH is empty."""
+    global _state
+    with _state_lock:
+        if _state is None and THREAD_STATE_PATH:
+            _state = ThreadState()
+    return _state